@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+"""
+Grouping and aggregate functions (GROUP BY, COUNT, SUM, MIN, MAX, AVG) and SELECT DISTINCT for the OdhQL interpreter.
+The group keys are factorized into integer codes, the aggregates are computed for all groups at once: Counts and sums
+using bincount, MIN and MAX by reducing the rows sorted by group (ufunc.reduceat).
+"""
+
+import numpy as np
+import pandas as pd
+from shapely.geometry.base import BaseGeometry
+
+from hub.odhql.exceptions import OdhQLExecutionException
+from hub.structures.frame import OdhSeries
+
+
+class Grouping(object):
+    """ Assignment of the rows of a frame to groups. Groups are numbered in the order of their first row. """
+
+    def __init__(self, codes, size):
+        """
+        :param codes: Group of each row
+        :type codes: numpy.ndarray
+        :param size: Number of groups
+        """
+        self.codes = codes
+        self.size = size
+        self._order = None
+
+    @classmethod
+    def of(cls, keys, n):
+        """
+        Groups rows by the values of the key columns. NULL values form a group of their own.
+        :param keys: Values of the key columns, no keys put all rows into a single group
+        :type keys: list of numpy.ndarray
+        :param n: Number of rows
+        :rtype: Grouping
+        """
+        if not keys:
+            return cls(np.zeros(n, dtype=np.int64), 1)
+
+        codes = np.zeros(n, dtype=np.int64)
+        for i, values in enumerate(keys):
+            try:
+                key_codes, uniques = factorize(values)
+            except TypeError:
+                raise OdhQLExecutionException('GROUP BY: Expression #{} can not be grouped'.format(i + 1))
+            key_codes[key_codes < 0] = len(uniques)
+            # combine with the previous columns, re-factorize to keep the codes small
+            codes = pd.factorize(codes * (len(uniques) + 1) + key_codes)[0]
+
+        return cls(codes, codes.max() + 1 if n else 0)
+
+    @property
+    def first(self):
+        """ :return: Position of the first row of each group """
+        # for repeated positions, the last assignment wins: assign in reverse to keep the first row
+        first = np.zeros(self.size, dtype=np.int64)
+        first[self.codes[::-1]] = np.arange(len(self.codes) - 1, -1, -1, dtype=np.int64)
+        return first
+
+    @property
+    def order(self):
+        """ :return: Positions of the rows ordered by group (not stable, computed once) """
+        if self._order is None:
+            self._order = np.argsort(self.codes, kind='quicksort')
+        return self._order
+
+    def count(self, mask=None):
+        """
+        :param mask: Rows to count, all if omitted
+        :return: Number of rows of each group
+        :rtype: numpy.ndarray
+        """
+        codes = self.codes if mask is None else self.codes[mask]
+        return self._bincount(codes).astype(np.int64)
+
+    def sum(self, values, mask):
+        """
+        :param values: Numbers (float64 or int64)
+        :param mask: Rows to include
+        :return: Sums for the groups containing at least one of the rows and a mask of these groups
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        codes, values = self.codes[mask], values[mask]
+        found = self._bincount(codes) > 0
+        if values.dtype.kind == 'i':
+            # bincount adds up floats, which only represent integers exactly up to 2 ** 53
+            if len(values) and max(-int(values.min()), int(values.max())) * len(values) >= 2 ** 53:
+                return self.reduce(np.add, values, mask)
+            return self._bincount(codes, values).astype(np.int64)[found], found
+        return self._bincount(codes, values)[found], found
+
+    def _bincount(self, codes, weights=None):
+        """ :return: np.bincount for all groups, numpy requires minlength > 0 even if there are no groups """
+        return np.bincount(codes, weights=weights, minlength=max(self.size, 1))[:self.size]
+
+    def reduce(self, ufunc, values, mask):
+        """
+        Reduces the values of each group using a ufunc (e.g. np.add)
+        :param mask: Rows to include
+        :return: Results for the groups containing at least one of the rows and a mask of these groups
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        order = self.order
+        rows = order[mask[order]]
+        counts = self.count(mask)
+        found = counts > 0
+        starts = (np.cumsum(counts) - counts)[found]
+        if not len(rows):
+            return values[:0], found
+        return ufunc.reduceat(values[rows], starts), found
+
+    def distinct(self, values, mask):
+        """
+        :return: Mask of the rows whose value is the first of its group with this value (among the rows in mask)
+        :rtype: numpy.ndarray
+        """
+        value_codes, uniques = factorize(values)
+        pairs, distinct = pd.factorize(np.where(mask, self.codes * (len(uniques) + 1) + value_codes + 1, -1))
+        # for repeated positions, the last assignment wins: assign in reverse to keep the first row
+        first = np.zeros(len(distinct), dtype=np.int64)
+        first[pairs[::-1]] = np.arange(len(pairs) - 1, -1, -1, dtype=np.int64)
+        result = np.zeros(len(values), dtype=np.bool_)
+        result[first] = True
+        return result & mask
+
+
+def factorize(values):
+    """
+    Encodes values as integer codes, like pandas.factorize. Geometries can not be hashed, they are compared by their
+    WKB representation instead (empty geometries are NULL).
+    :type values: numpy.ndarray
+    :return: Code of each value (-1 for NULL) and the distinct values
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    try:
+        return pd.factorize(values)
+    except TypeError:
+        if values.dtype != object:
+            raise
+        wkb = np.array([(None if v.is_empty else v.wkb) if isinstance(v, BaseGeometry) else v for v in values],
+                       dtype=object)
+        codes, uniques = pd.factorize(wkb)
+        rows = np.flatnonzero(codes >= 0)
+        # for repeated positions, the last assignment wins: assign in reverse to keep the first geometry
+        first = np.zeros(len(uniques), dtype=np.int64)
+        first[codes[rows[::-1]]] = rows[::-1]
+        return codes, values[first]
+
+
+def distinct_rows(columns, n):
+    """
+    Removes duplicate rows (SELECT DISTINCT), all NULL values are considered equal.
+    :param columns: Values of the columns which are compared
+    :type columns: list of numpy.ndarray
+    :param n: Number of rows
+    :return: Position of the first row of each set of equal rows, in ascending order
+    :rtype: numpy.ndarray
+    """
+    try:
+        return Grouping.of(columns, n).first
+    except OdhQLExecutionException:
+        raise OdhQLExecutionException('DISTINCT: The values of the selected fields can not be compared')
+
+
+class Aggregate(object):
+    """ Aggregate function, computes one value per group. """
+
+    FUNCTIONS = 'COUNT', 'SUM', 'MIN', 'MAX', 'AVG'
+
+    def __init__(self, name, distinct=False):
+        """
+        :param name: COUNT, SUM, MIN, MAX or AVG
+        :param distinct: Whether only distinct values are aggregated
+        """
+        assert name in self.FUNCTIONS, 'Unknown aggregate function "{}"'.format(name)
+        self.name = name
+        self.distinct = distinct
+
+    def compute(self, grouping, series=None):
+        """
+        :type grouping: Grouping
+        :param series: Aggregated values, None for COUNT(*)
+        :type series: OdhSeries
+        :return: Result for each group. NULL values are ignored, the result is NULL for groups without any values
+                 (except for COUNT, which is 0).
+        :rtype: OdhSeries
+        """
+        if series is None:
+            return OdhSeries(grouping.count())
+
+        values = series.values
+        mask = pd.notnull(values)
+        if self.distinct:
+            try:
+                mask = grouping.distinct(values, mask)
+            except TypeError:
+                raise OdhQLExecutionException('{}: DISTINCT is not supported for this type'.format(self.name))
+
+        if self.name == 'COUNT':
+            return OdhSeries(grouping.count(mask))
+
+        kind = values.dtype.kind
+        if self.name in ('SUM', 'AVG'):
+            if kind not in 'iufb':
+                raise OdhQLExecutionException('{}: Only numbers can be added up'.format(self.name))
+            if self.name == 'AVG':
+                totals, found = grouping.sum(values.astype(np.float64), mask)
+                return self._result(totals / grouping.count(mask)[found], found, grouping.size)
+            values = values.astype(np.float64 if kind == 'f' else np.int64)
+            return self._result(*grouping.sum(values, mask), size=grouping.size)
+
+        ufunc = np.minimum if self.name == 'MIN' else np.maximum
+        if kind in 'iufbM':
+            return self._result(*grouping.reduce(ufunc, values, mask), size=grouping.size)
+
+        # other types (e.g. TEXT): compare the positions in the sorted distinct values
+        try:
+            codes, uniques = pd.factorize(values, sort=True)
+        except TypeError:
+            raise OdhQLExecutionException('{}: Values of this type can not be compared'.format(self.name))
+        positions, found = grouping.reduce(ufunc, codes, mask)
+        return self._result(np.asarray(uniques, dtype=values.dtype)[positions], found, grouping.size)
+
+    @staticmethod
+    def _result(values, found, size):
+        """
+        :param values: Results for the groups in found
+        :param found: Mask of the groups with a result
+        :return: Results for all groups, NULL for the others
+        :rtype: OdhSeries
+        """
+        if found.all():
+            return OdhSeries(values)
+
+        kind = values.dtype.kind
+        if kind == 'M':
+            result = np.full(size, np.datetime64('NaT'), dtype=values.dtype)
+        else:
+            result = np.full(size, np.nan, dtype=np.float64 if kind in 'iufb' else object)
+        result[found] = values
+        return OdhSeries(result)
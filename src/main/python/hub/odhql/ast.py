@@ -14,17 +14,32 @@ class ASTBase(object):
         """ Basic support for the visitor pattern. """
         visitor.visit(self)
 
+    def key(self):
+        """
+        Structural key of the (sub-)tree: Expressions and conditions with equal keys yield the same result when
+        evaluated on the same data. Nodes without a structural key are only equal to themselves, i.e. their results
+        are never shared.
+        :rtype: tuple
+        """
+        return self.__class__.__name__, id(self)
+
 
 class Union(ASTBase):
     """Result for union queries."""
 
-    def __init__(self, queries, order):
+    def __init__(self, queries, order, limit=None, offset=0):
         """
         :type queries: list
         :type order: list
+        :param limit: Maximum number of rows (LIMIT) or None for all rows
+        :type limit: int
+        :param offset: Number of rows to skip (OFFSET)
+        :type offset: int
         """
         self.queries = queries
         self.order = order
+        self.limit = limit
+        self.offset = offset
 
     @classmethod
     def parse(cls, tokens):
@@ -37,11 +52,14 @@ class Union(ASTBase):
 
         queries = list(tokens.get('queries'))
         order = list(tokens.get('sort')[0]) if 'sort' in tokens else []
+        limit = int(tokens.get('limit')) if 'limit' in tokens else None
+        offset = int(tokens.get('offset')) if 'offset' in tokens else 0
 
-        return cls(queries, order)
+        return cls(queries, order, limit, offset)
 
     def __repr__(self):
-        return '<Union queries={} order={}>'.format(self.queries, self.order)
+        return '<Union queries={} order={} limit={} offset={}>'.format(self.queries, self.order, self.limit,
+                                                                      self.offset)
 
     def accept(self, visitor):
         """ Basic support for the visitor pattern. """
@@ -55,18 +73,55 @@ class Union(ASTBase):
                 o.accept(visitor)
 
 
+class Explain(ASTBase):
+    """Result for statements prefixed with EXPLAIN (ANALYZE)."""
+
+    def __init__(self, statement, analyze=False):
+        """
+        :param statement: Explained statement
+        :type statement: Union or Query
+        :param analyze: Whether the statement is executed to measure it (EXPLAIN ANALYZE)
+        :type analyze: bool
+        """
+        self.statement = statement
+        self.analyze = analyze
+
+    @classmethod
+    def parse(cls, tokens):
+        """ Convert pyparsings ParseResult into AST classes """
+        if 'statement' not in tokens:
+            raise TokenException('malformed Explain (no statement)')
+
+        # the statement is the last token, a single query is not wrapped in a Union (see Union.parse)
+        return cls(tokens[-1], 'analyze' in tokens)
+
+    def __repr__(self):
+        return '<Explain statement={} analyze={}>'.format(self.statement, self.analyze)
+
+    def accept(self, visitor):
+        """ Basic support for the visitor pattern. """
+        visitor.visit(self)
+        self.statement.accept(visitor)
+
+
 class Query(ASTBase):
     """Result for normal queries."""
 
-    def __init__(self, fields, data_sources, filter_definitions):
+    def __init__(self, fields, data_sources, filter_definitions, group_by=None, distinct=False):
         """
         :type fields: list
         :type data_sources: list
         :type filter_definitions: list
+        :param group_by: Expressions to group the rows by (GROUP BY)
+        :type group_by: list
+        :param distinct: Whether duplicate rows are removed from the result (SELECT DISTINCT)
+        :type distinct: bool
         """
         self.fields = fields
         self.data_sources = data_sources
         self.filter_definitions = filter_definitions
+        self.group_by = group_by or []
+        self.distinct = distinct
 
     @classmethod
     def parse(cls, tokens):
@@ -79,8 +134,9 @@ class Query(ASTBase):
         fields = list(tokens.get('fields'))
         data_sources = list(tokens.get('datasources'))
         filter_definitions = tokens.get('filter')[0] if 'filter' in tokens else None
+        group_by = list(tokens.get('group')[0]) if 'group' in tokens else []
 
-        return cls(fields, data_sources, filter_definitions)
+        return cls(fields, data_sources, filter_definitions, group_by, 'distinct' in tokens)
 
     @classmethod
     def parse_order_by(cls, tokens):
@@ -91,8 +147,8 @@ class Query(ASTBase):
         return [tokens.get('fields')]
 
     def __repr__(self):
-        return '<Query fields={} data_sources={} filter_definitions={}>'.format(self.fields, self.data_sources,
-                                                                                self.filter_definitions)
+        return '<Query fields={} data_sources={} filter_definitions={} group_by={} distinct={}>'.format(
+            self.fields, self.data_sources, self.filter_definitions, self.group_by, self.distinct)
 
     def accept(self, visitor):
         """ Basic support for the visitor pattern. """
@@ -108,6 +164,9 @@ class Query(ASTBase):
             for f in self.filter_definitions:
                 f.accept(visitor)
 
+        for g in self.group_by:
+            g.accept(visitor)
+
 
 class Expression(ASTBase):
     """Base class for expression types."""
@@ -123,6 +182,9 @@ class Field(Expression):
     def __repr__(self):
         return '<Field name=\'{}\' prefix=\'{}\'>'.format(self.name, self.prefix)
 
+    def key(self):
+        return 'field', (self.prefix or '').lower(), self.name.lower()
+
     @classmethod
     def parse(cls, tokens):
         """ Convert pyparsings ParseResult into AST classes """
@@ -146,6 +208,14 @@ class LiteralExpression(Expression):
     def __repr__(self):
         return '<LiteralExpression value={}>'.format(self.value)
 
+    def key(self):
+        try:
+            hash(self.value)
+        except TypeError:  # e.g. series passed to the interpreter
+            return 'literal', id(self)
+        # include the type: 1, 1.0 and true are equal in python
+        return 'literal', type(self.value), self.value
+
     @classmethod
     def parse(cls, tokens):
         """ Convert pyparsings ParseResult into AST classes """
@@ -225,6 +295,9 @@ class CaseRule(ASTBase):
     def __repr__(self):
         return '<CaseRule condition={} expression={}>'.format(self.condition, self.expression)
 
+    def key(self):
+        return self.condition.key() if self.condition else None, self.expression.key()
+
     def accept(self, visitor):
         """ Basic support for the visitor pattern. """
         visitor.visit(self)
@@ -265,6 +338,9 @@ class CaseExpression(Expression):
     def __repr__(self):
         return '<CaseExpression rules={}>'.format(self.rules)
 
+    def key(self):
+        return ('case',) + tuple(r.key() for r in self.rules)
+
 
 class AliasedExpression(ASTBase):
     """Expression with an alias"""
@@ -276,6 +352,9 @@ class AliasedExpression(ASTBase):
     def __repr__(self):
         return '<AliasedExpression expression={} alias=\'{}\'>'.format(self.expression, self.alias)
 
+    def key(self):
+        return self.expression.key()
+
     @classmethod
     def parse(cls, tokens):
         """ Convert pyparsings ParseResult into AST classes """
@@ -335,6 +414,9 @@ class Function(Expression):
     def __repr__(self):
         return '<Function name=\'{}\' args={}>'.format(self.name, self.args or '')
 
+    def key(self):
+        return 'function', self.name.lower(), tuple(arg.key() for arg in self.args)
+
     def accept(self, visitor):
         """ Basic support for the visitor pattern. """
         visitor.visit(self)
@@ -343,16 +425,62 @@ class Function(Expression):
             arg.accept(visitor)
 
 
+class AggregateFunction(Expression):
+    """Aggregate function call (COUNT, SUM, MIN, MAX, AVG), evaluated per group of rows."""
+
+    def __init__(self, name, arg=None, distinct=False):
+        """
+        :param name: Name of the aggregate function (upper case)
+        :type name: unicode
+        :param arg: Aggregated expression, None for COUNT(*)
+        :param distinct: Whether only distinct values are aggregated
+        :type distinct: bool
+        """
+        self.name = name
+        self.arg = arg
+        self.distinct = distinct
+
+    @classmethod
+    def parse(cls, tokens):
+        """ Convert pyparsings ParseResult into AST classes """
+        if 'name' not in tokens:
+            raise TokenException('malformed AggregateFunction (no name)')
+        if 'arg' not in tokens and 'star' not in tokens:
+            raise TokenException('malformed AggregateFunction (no argument)')
+
+        name = tokens.get('name').upper()
+        if 'star' in tokens and name != 'COUNT':
+            raise TokenException('{}(*) is not allowed'.format(name))
+
+        return cls(name, tokens.get('arg'), 'distinct' in tokens)
+
+    def __repr__(self):
+        return '<AggregateFunction name=\'{}\' arg={} distinct={}>'.format(self.name, self.arg, self.distinct)
+
+    def key(self):
+        return 'aggregate', self.name, self.distinct, self.arg.key() if self.arg else None
+
+    def accept(self, visitor):
+        """ Basic support for the visitor pattern. """
+        visitor.visit(self)
+
+        if self.arg:
+            self.arg.accept(visitor)
+
+
 class DataSource(ASTBase):
     """Reference to a data source (dataframe)"""
 
-    def __init__(self, name, alias=None):
+    def __init__(self, name, alias=None, sample=None):
         """
         :type name: unicode
         :type alias: unicode
+        :param sample: Only a sample of the rows is used (TABLESAMPLE)
+        :type sample: hub.odhql.ast.TableSample
         """
         self.name = name
         self.alias = alias or name
+        self.sample = sample
 
     @classmethod
     def parse(cls, tokens):
@@ -362,11 +490,52 @@ class DataSource(ASTBase):
 
         name = tokens.get('name')
         alias = tokens.get('alias', None)
+        sample = tokens.get('sample', None)
+
+        return cls(name, alias, sample)
+
+    def __repr__(self):
+        return '<DataSource name=\'{}\' alias=\'{}\' sample={}>'.format(self.name, self.alias, self.sample)
 
-        return cls(name, alias)
+
+class TableSample(ASTBase):
+    """Sample of the rows of a data source (TABLESAMPLE)."""
+
+    class Unit(Enum):
+        """Unit of the sample size."""
+        rows = 1
+        percent = 2
+
+    def __init__(self, size, unit, seed=None):
+        """
+        :param size: Number of rows or percentage of the rows
+        :type size: int or float
+        :type unit: hub.odhql.ast.TableSample.Unit
+        :param seed: Seed of the random selection (REPEATABLE), None for the default seed
+        :type seed: int
+        """
+        self.size = size
+        self.unit = unit
+        self.seed = seed
+
+    @classmethod
+    def parse(cls, tokens):
+        """ Convert pyparsings ParseResult into AST classes """
+        if 'size' not in tokens or 'unit' not in tokens:
+            raise TokenException('malformed TableSample')
+
+        size = tokens.get('size')
+        size = float(size) if '.' in size else int(size)
+        unit = cls.Unit.percent if tokens.get('unit').lower() == 'percent' else cls.Unit.rows
+        seed = int(tokens.get('seed')) if 'seed' in tokens else None
+
+        return cls(size, unit, seed)
 
     def __repr__(self):
-        return '<DataSource name=\'{}\' alias=\'{}\'>'.format(self.name, self.alias)
+        return '<TableSample size={} unit={} seed={}>'.format(self.size, self.unit.name, self.seed)
+
+    def key(self):
+        return 'tablesample', self.size, self.unit.name, self.seed
 
 
 class JoinCondition(ASTBase):
@@ -447,14 +616,15 @@ class JoinedDataSource(DataSource):
         right = 3
         outer = 4
 
-    def __init__(self, name, alias, join_type, condition):
+    def __init__(self, name, alias, join_type, condition, sample=None):
         """
         :param name: Data source name
         :param alias: Alias (may be identical to the name)
         :param join_type: Join type.
         :param condition: hub.odhql.ast.JoinCondition
+        :param sample: hub.odhql.ast.TableSample
         """
-        super(JoinedDataSource, self).__init__(name, alias)
+        super(JoinedDataSource, self).__init__(name, alias, sample)
 
         self.join_type = join_type
         self.condition = condition
@@ -471,7 +641,7 @@ class JoinedDataSource(DataSource):
         join_type = tokens.get('join_type')
         condition = tokens.get('condition')
 
-        return cls(datasource.name, datasource.alias, join_type, condition)
+        return cls(datasource.name, datasource.alias, join_type, condition, datasource.sample)
 
     @classmethod
     def parse_join_type(cls, tokens):
@@ -486,7 +656,8 @@ class JoinedDataSource(DataSource):
         return cls.JoinType.inner
 
     def __repr__(self):
-        return '<JoinedDataSource name=\'{}\' alias=\'{}\' condition={}>'.format(self.name, self.alias, self.condition)
+        return '<JoinedDataSource name=\'{}\' alias=\'{}\' sample={} condition={}>'.format(
+            self.name, self.alias, self.sample, self.condition)
 
     def accept(self, visitor):
         """ Basic support for the visitor pattern. """
@@ -567,6 +738,9 @@ class BinaryCondition(ASTBase):
     def __repr__(self):
         return '<BinaryCondition left={} op={} right={}>'.format(self.left, self.operator, self.right)
 
+    def key(self):
+        return 'binary', self.operator, self.left.key(), self.right.key()
+
     def accept(self, visitor):
         """ Basic support for the visitor pattern. """
         visitor.visit(self)
@@ -606,6 +780,9 @@ class InCondition(ASTBase):
     def __repr__(self):
         return '<InCondition left={} in_list={}>'.format(self.left, self.in_list)
 
+    def key(self):
+        return 'in', self.invert, self.left.key(), tuple(item.key() for item in self.in_list)
+
     def accept(self, visitor):
         """ Basic support for the visitor pattern. """
         visitor.visit(self)
@@ -650,6 +827,9 @@ class IsNullCondition(ASTBase):
     def __repr__(self):
         return '<IsNullCondition field={} invert={}>'.format(self.field, self.invert)
 
+    def key(self):
+        return 'isnull', self.invert, self.field.key()
+
 
 class PredicateCondition(ASTBase):
     """'[not] <predicate()>' condition."""
@@ -682,6 +862,9 @@ class PredicateCondition(ASTBase):
     def __repr__(self):
         return '<PredicateCondition predicate={}>'.format(self.predicate)
 
+    def key(self):
+        return 'predicate', self.invert, self.predicate.key()
+
 
 class FilterListBase(ASTBase, Sequence):
     """Base class for lists of filter conditions."""
@@ -718,6 +901,9 @@ class FilterListBase(ASTBase, Sequence):
     def __repr__(self):
         return '<{} conditions={}>'.format(self.__class__.__name__, self.conditions)
 
+    def key(self):
+        return (self.__class__.__name__,) + tuple(c.key() for c in self.conditions)
+
 
 class FilterCombination(FilterListBase):
     """list of filters joined by AND"""
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+"""
+EXPLAIN (ANALYZE) for the OdhQL interpreter: Reports the steps of a query (loading the sources, joins, filters,
+functions, unions and sorting) as a tree. For EXPLAIN ANALYZE the query is executed and every step reports its wall
+time, the number of rows it received and produced, the size of its result and the number of cache hits.
+"""
+
+import collections
+import contextlib
+import time
+
+import numpy as np
+import pandas as pd
+
+import hub.odhql.ast as ast
+import hub.odhql.plan as plan
+from hub.odhql.selection import Selection
+from hub.structures.frame import OdhFrame, ConstantColumn
+
+
+class ExplainNode(object):
+    """ Step of a query. The figures are None unless the query was executed (EXPLAIN ANALYZE). """
+
+    def __init__(self, operator, detail=None):
+        """
+        :param operator: Kind of step, e.g. Load, Join, Filter, Function, Union or Sort
+        :param detail: Description of the step, e.g. the name of the function
+        """
+        self.operator = operator
+        self.detail = detail
+        self.children = []
+
+        self.time = None  # wall time in seconds, including the children
+        self.rows_in = None
+        self.rows_out = None
+        self.bytes = None  # size of the result (Python 2 does not allow tracing the actual allocations)
+        self.cache_hits = None
+
+    def add(self, operator, detail=None):
+        """
+        :return: New child node
+        :rtype: ExplainNode
+        """
+        node = ExplainNode(operator, detail)
+        self.children.append(node)
+        return node
+
+    def record(self, result, rows_in=None, cache_hits=0):
+        """
+        Records the result of the step
+        :param result: Frame, selection, series or array produced by the step
+        :param rows_in: Number of rows the step received, if not given when the node was created
+        """
+        if rows_in is not None:
+            self.rows_in = rows_in
+        self.rows_out = len(result)
+        self.bytes = size(result)
+        self.cache_hits = cache_hits
+
+    def walk(self, depth=0):
+        """
+        :return: Generator of the nodes of the tree (depth first) with their depth
+        """
+        yield self, depth
+        for child in self.children:
+            for node in child.walk(depth + 1):
+                yield node
+
+    def to_dict(self):
+        """ :return: The tree as nested dicts (e.g. for JSON) """
+        return collections.OrderedDict([
+            ('operator', self.operator),
+            ('detail', self.detail),
+            ('time', self.time),
+            ('rows_in', self.rows_in),
+            ('rows_out', self.rows_out),
+            ('bytes', self.bytes),
+            ('cache_hits', self.cache_hits),
+            ('children', [child.to_dict() for child in self.children]),
+        ])
+
+    def format(self):
+        """
+        :return: The tree as text, one line per node
+        :rtype: unicode
+        """
+        lines = []
+        for node, depth in self.walk():
+            line = '{}{}'.format('  ' * depth, node.operator)
+            if node.detail:
+                line += ' ({})'.format(node.detail)
+            if node.time is not None:
+                line += ' time={:.3f}ms rows={}->{} bytes={} cache_hits={}'.format(
+                    node.time * 1000, '-' if node.rows_in is None else node.rows_in, node.rows_out, node.bytes,
+                    node.cache_hits)
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def to_df(self):
+        """
+        :return: One row per node (depth first), the tree is given by the columns id and parent
+        :rtype: OdhFrame
+        """
+        rows = []
+        parents = {}
+        for i, (node, depth) in enumerate(self.walk()):
+            for child in node.children:
+                parents[id(child)] = i
+            rows.append((i, parents.get(id(node), -1), depth, node.operator, node.detail or '',
+                         np.nan if node.time is None else node.time * 1000,
+                         node.rows_in, node.rows_out, node.bytes, node.cache_hits))
+
+        columns = ['id', 'parent', 'depth', 'operator', 'detail', 'time_ms', 'rows_in', 'rows_out', 'bytes',
+                   'cache_hits']
+        df = OdhFrame.from_records(rows, columns=columns)
+        for c in columns[6:]:
+            df[c] = df[c].astype(np.float64)  # None (not executed) -> NaN
+        df.name = 'explain'
+        return df
+
+    def __repr__(self):
+        return '<ExplainNode operator={} detail={} children={}>'.format(self.operator, self.detail, len(self.children))
+
+
+def size(result):
+    """
+    :return: Number of bytes used by a result (only the references for values which are python objects)
+    :rtype: int
+    """
+    if isinstance(result, Selection):
+        return sum(rows.nbytes for _, rows in result.parts if rows is not None)
+    if isinstance(result, ConstantColumn):
+        return int(result.series.nbytes)
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(index=False).sum())
+    return int(getattr(result, 'nbytes', 0))
+
+
+class Profiler(object):
+    """ Builds the tree of an EXPLAIN ANALYZE while the interpreter executes a query. """
+
+    def __init__(self, root):
+        """
+        :param root: Node to which the steps are added
+        :type root: ExplainNode
+        """
+        self.stack = [root]
+
+    @contextlib.contextmanager
+    def node(self, operator, detail=None, rows_in=None):
+        """
+        Measures a step. Steps started within are added as its children.
+        :return: Context manager yielding the node, use ExplainNode.record to add the result
+        """
+        node = self.stack[-1].add(operator, detail)
+        node.rows_in = rows_in
+        self.stack.append(node)
+        start = time.time()
+        try:
+            yield node
+        finally:
+            node.time = time.time() - start
+            self.stack.pop()
+
+
+class NullProfiler(object):
+    """ Profiler used when a query is executed normally: Nothing is measured. """
+
+    class Step(object):
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+        def record(self, result, rows_in=None, cache_hits=0):
+            pass
+
+    STEP = Step()
+
+    def node(self, operator, detail=None, rows_in=None):
+        return self.STEP
+
+
+class PlanDescriber(object):
+    """ Builds the tree of an EXPLAIN from the plan of a query without executing it. """
+
+    @classmethod
+    def describe(cls, node, parent):
+        """
+        Adds the steps of a plan as children of a node, in the order the interpreter executes them
+        :type node: hub.odhql.plan.UnionPlan or hub.odhql.plan.SelectPlan
+        :type parent: ExplainNode
+        """
+        if isinstance(node, plan.UnionPlan):
+            union = parent.add('Union')
+            for query in node.queries:
+                cls.describe(query, union)
+        else:
+            cls._describe_select(node, parent.add('Select'))
+
+        if node.order:
+            parent.add('Sort', describe_order(node.order))
+        if node.is_windowed and not getattr(node, 'slice_early', False):
+            parent.add('Limit', describe_window(node))
+
+    @classmethod
+    def _describe_select(cls, node, parent):
+        query = node.query
+
+        aliases_by_source = collections.defaultdict(list)
+        for ds in query.data_sources:
+            aliases_by_source[ds.name.lower()].append(ds)
+        for name, data_sources in aliases_by_source.iteritems():
+            load = parent.add('Load', describe_source(name, [ds.alias for ds in data_sources]))
+            for ds in data_sources:
+                if ds.sample:
+                    load.add('Sample', describe_sample(ds.alias, ds.sample))
+
+        for alias, conditions in node.pushed.iteritems():
+            cls._describe_expressions(parent.add('Filter', describe_conditions(alias, conditions)), conditions)
+
+        for ds in query.data_sources[1:]:
+            cls._describe_expressions(parent.add('Join', describe_join(ds)), [ds.condition])
+
+        if node.residual:
+            cls._describe_expressions(parent.add('Filter', describe_conditions(None, node.residual)), node.residual)
+
+        if node.grouped:
+            cls._describe_expressions(parent.add('Aggregate', describe_grouping(node)),
+                                      node.group_by + [a.arg for a in node.aggregates.itervalues()])
+
+        if node.slice_early:
+            parent.add('Limit', describe_window(node))
+
+        cls._describe_expressions(parent.add('Project', describe_fields(query.fields)), query.fields)
+
+        if node.distinct:
+            parent.add('Distinct', describe_fields(query.fields))
+
+    @classmethod
+    def _describe_expressions(cls, parent, nodes):
+        """ Adds a node for each function call in the AST (sub-)trees, nested calls as children. """
+        for node in nodes:
+            if isinstance(node, ast.Function):
+                cls._describe_expressions(parent.add('Function', node.name.upper()), node.args)
+            elif isinstance(node, ast.AggregateFunction):
+                continue  # evaluated when grouping
+            elif isinstance(node, ast.ASTBase):
+                children = []
+                for _, value in sorted(vars(node).iteritems()):
+                    children.extend(value if isinstance(value, list) else [value])
+                cls._describe_expressions(parent, children)
+
+
+def describe_source(name, aliases):
+    return '{} AS {}'.format(name, ', '.join(aliases))
+
+
+def describe_sample(alias, sample):
+    return '{}: {} {}{}'.format(alias, sample.size, sample.unit.name.upper(),
+                                '' if sample.seed is None else ' REPEATABLE ({})'.format(sample.seed))
+
+
+def describe_join(ds):
+    return '{} JOIN {} AS {}'.format(ds.join_type.name.upper(), ds.name, ds.alias)
+
+
+def describe_conditions(alias, conditions):
+    return '{}{} condition(s)'.format('{}: '.format(alias) if alias else '', len(conditions))
+
+
+def describe_grouping(node):
+    return '{} key(s), {} aggregate(s)'.format(len(node.group_by), len(node.aggregates))
+
+
+def describe_fields(fields):
+    return '{} field(s)'.format(len(fields))
+
+
+def describe_order(order):
+    return '{} key(s)'.format(len(order))
+
+
+def describe_window(node):
+    return 'LIMIT {} OFFSET {}'.format('ALL' if node.limit is None else node.limit, node.offset)
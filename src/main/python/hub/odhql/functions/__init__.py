@@ -5,3 +5,4 @@ from . import core, geometry, string, misc  # noqa
 
 execute = core.OdhQLFunction.execute
 create = core.OdhQLFunction.create
+is_positional = core.OdhQLFunction.is_positional
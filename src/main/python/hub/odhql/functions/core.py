@@ -13,10 +13,10 @@ import logging
 import pandas as pd
 import numpy as np
 import sre_constants
-import re
 
 from opendatahub.utils.plugins import RegistrationMixin
 from hub.structures.frame import OdhType, OdhSeries
+from hub.odhql.pattern import Pattern
 from ..exceptions import OdhQLExecutionException
 from opendatahub.utils.doc import DocMixin
 
@@ -33,6 +33,10 @@ class OdhQLFunction(RegistrationMixin, DocMixin):
     functions = {}
     name = ''
 
+    # the result for a row depends on its position in the series (e.g. RANGE) - such functions must always be
+    # executed on the complete set of rows
+    positional = False
+
     def __init__(self, num_rows=1, raw_args=None):
         self.num_rows = num_rows
         self.raw_args = raw_args or []
@@ -94,6 +98,16 @@ class OdhQLFunction(RegistrationMixin, DocMixin):
         fn = OdhQLFunction.create(name, num_rows, args)
         return fn.execute()
 
+    @staticmethod
+    def is_positional(name):
+        """
+        :param name: Function name
+        :return: True if the function's result depends on the position of the rows (see OdhQLFunction.positional).
+        Unknown functions are not considered positional.
+        """
+        cls = OdhQLFunction.functions.get(name.lower())
+        return bool(cls and cls.positional)
+
     def raise_error(self, msg, *args, **kwargs):
         """ Raise a formatted OdhQLExecutionException message
         :param msg: Error message in str.format style
@@ -186,7 +200,7 @@ class OdhQLFunction(RegistrationMixin, DocMixin):
         value = self._get_single_value(value)
         self.assert_str(name, value)
         try:
-            re.compile(value)
+            Pattern.compile(value)
         except sre_constants.error as e:
             self.raise_error('Invalid regular expression for parameter "{}": "{}"{}', name, e.message,
                              (not e.message.endswith('.')) * '.')
@@ -210,8 +224,63 @@ class VectorizedFunction(OdhQLFunction):
     """
     _is_abstract = True
 
+    # the result for a row only depends on the value of the first argument in that row (given that all other
+    # arguments are literals), which allows evaluating the function once per distinct value (see execute)
+    distinct_values = False
+
+    # max. ratio of distinct values to rows for which a function is evaluated once per distinct value
+    DISTINCT_RATIO = 0.5
+
     def execute(self):
-        return self.apply(*self.raw_args)
+        args = self.raw_args
+        if self.distinct_values and args and isinstance(args[0], pd.Series) and \
+                not any(isinstance(arg, pd.Series) for arg in args[1:]):
+            codes, first = self.factorize(args[0])
+            if codes is not None and len(first) <= self.DISTINCT_RATIO * len(codes):
+                return self.execute_distinct(codes, first)
+        return self.apply(*args)
+
+    def execute_distinct(self, codes, first):
+        """
+        Applies the function to the distinct values of the first argument and maps the results back to the rows.
+        :param codes: Number of the distinct value of each row
+        :param first: Position of the first row of each distinct value
+        """
+        values = self.raw_args[0]
+        distinct = values.iloc[first]
+        distinct.index = np.arange(len(first))
+
+        fn = type(self)(len(first), [distinct] + list(self.raw_args[1:]))
+        result = fn.apply(*fn.raw_args)
+        if not isinstance(result, pd.Series):
+            return result
+
+        result = result.iloc[codes]
+        result.index = values.index
+        return result
+
+    @staticmethod
+    def factorize(values):
+        """
+        :type values: pandas.Series
+        :return: Number of the distinct value of each row (NULL being a value of its own) and the position of the first
+                 row of each distinct value, None if the values are not hashable
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        try:
+            codes, uniques = pd.factorize(values.values)
+        except TypeError:  # e.g. geometries
+            return None, None
+
+        n = len(uniques)
+        if (codes < 0).any():
+            codes = np.where(codes < 0, n, codes)
+            n += 1
+
+        # for repeated positions, the last assignment wins: assign in reverse to keep the first row
+        first = np.zeros(n, dtype=np.int64)
+        first[codes[::-1]] = np.arange(len(codes) - 1, -1, -1, dtype=np.int64)
+        return codes, first
 
     def apply(self, *args):
         raise NotImplementedError
@@ -47,6 +47,7 @@ class GeomFromText(VectorizedGeometryFunction):
             ST_GeomFromText(\'POINT(7.2234283 48.8183157)\', 4326) AS hsr
     """
     name = 'ST_GeomFromText'
+    distinct_values = True
 
     def apply(self, wkts, srid=None):
         wkts = self.expand(wkts)
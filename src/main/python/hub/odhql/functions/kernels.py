@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+"""
+Vectorized kernels for the TEXT functions. The values are kept in object arrays and each operation is applied to the
+non-NULL values in a single ufunc call, NULL values are tracked by an explicit mask and only filled in when the result
+is built.
+"""
+
+import operator
+
+import numpy as np
+import pandas as pd
+
+from hub.structures.frame import OdhSeries
+
+
+class TextKernel(object):
+    """
+    Operations on TEXT series. Same semantics as the corresponding methods of Series.str, i.e. the result is NULL
+    wherever an input is NULL.
+    """
+
+    @staticmethod
+    def split(strings):
+        """
+        :type strings: pandas.Series or unicode
+        :return: Values and NULL mask (a scalar for single values)
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        if isinstance(strings, pd.Series):
+            values = strings.values
+            return values, pd.isnull(values)
+        return strings, pd.isnull(strings)
+
+    @staticmethod
+    def combine(values, nulls, like, dtype=object):
+        """
+        Builds the result series. Where `nulls` is set, the result is NaN (with dtype float for numeric results).
+        :param values: Results for the rows which are not NULL
+        :param nulls: NULL mask of all rows
+        :param like: Input series, the index and name are taken from it
+        :rtype: OdhSeries
+        """
+        if not nulls.any():
+            return OdhSeries(np.asarray(values, dtype=dtype), index=like.index, name=like.name)
+
+        result = np.empty(len(nulls), dtype=object if dtype is object else np.float64)
+        result[nulls] = np.nan
+        result[~nulls] = values
+        return OdhSeries(result, index=like.index, name=like.name)
+
+    @classmethod
+    def map(cls, strings, func, dtype=object):
+        """
+        Applies a function to each value which is not NULL. Prefer functions implemented in C (e.g. created using
+        operator.methodcaller) over lambdas, the call overhead dominates for short texts.
+        :type strings: pandas.Series
+        :rtype: OdhSeries
+        """
+        values, nulls = cls.split(strings)
+        ufunc = np.frompyfunc(func, 1, 1)
+        return cls.combine(ufunc(values[~nulls] if nulls.any() else values), nulls, strings, dtype)
+
+    @classmethod
+    def strip(cls, strings):
+        return cls.map(strings, operator.methodcaller('strip'))
+
+    @classmethod
+    def lstrip(cls, strings):
+        return cls.map(strings, operator.methodcaller('lstrip'))
+
+    @classmethod
+    def rstrip(cls, strings):
+        return cls.map(strings, operator.methodcaller('rstrip'))
+
+    @classmethod
+    def upper(cls, strings):
+        return cls.map(strings, operator.methodcaller('upper'))
+
+    @classmethod
+    def lower(cls, strings):
+        return cls.map(strings, operator.methodcaller('lower'))
+
+    @classmethod
+    def length(cls, strings):
+        return cls.map(strings, len, np.int64)
+
+    @classmethod
+    def pad(cls, strings, width, side='left'):
+        """
+        :param side: Side on which the spaces are added: left, right or both
+        """
+        method = {'left': 'rjust', 'right': 'ljust', 'both': 'center'}[side]
+        return cls.map(strings, operator.methodcaller(method, width))
+
+    @classmethod
+    def slice(cls, strings, start=None, stop=None):
+        return cls.map(strings, operator.itemgetter(slice(start, stop)))
+
+    @classmethod
+    def repeat(cls, strings, times):
+        """ :type times: int """
+        values, nulls = cls.split(strings)
+        return cls.combine((values[~nulls] if nulls.any() else values) * times, nulls, strings)
+
+    @classmethod
+    def concat(cls, strings, *others):
+        """
+        :param others: Series (same length as `strings`) or single values
+        :rtype: OdhSeries
+        """
+        result, nulls = cls.split(strings)
+        result = np.where(nulls, '', result)
+        for other in others:
+            values, other_nulls = cls.split(other)
+            if np.any(other_nulls):
+                nulls = nulls | other_nulls
+                values = np.where(other_nulls, '', values) if isinstance(other, pd.Series) else ''
+            result = result + values
+        return cls.combine(result[~nulls] if nulls.any() else result, nulls, strings)
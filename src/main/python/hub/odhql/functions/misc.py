@@ -90,6 +90,7 @@ class ToDate(VectorizedFunction):
             TO_DATE(ODH5.baubeginn, '%d%m%Y') AS baubeginn
     """
     name = 'TO_DATE'
+    distinct_values = True
 
     def apply(self, values, format=None):
         values = self.expand(values)
@@ -112,6 +113,7 @@ class Range(VectorizedFunction):
             RANGE() AS id
     """
     name = 'RANGE'
+    positional = True
 
     def apply(self, start=1, step=1):
         self.assert_value('start', start)
@@ -10,6 +10,8 @@ from defusedxml import lxml
 import types
 
 from hub.odhql.functions.core import VectorizedFunction, OdhQLExecutionException
+from hub.odhql.functions.kernels import TextKernel
+from hub.odhql.pattern import Pattern
 from hub.structures.frame import OdhType
 
 
@@ -28,10 +30,10 @@ class Concat(VectorizedFunction):
     name = 'CONCAT'
 
     def apply(self, a, b, *args):
-        args = [self.expand(arg) for arg in [a, b] + list(args)]
+        args = [self.expand(a)] + [b] + list(args)
         for arg in args:
             self.assert_str('string', arg)
-        return args[0].str.cat(args[1:])
+        return TextKernel.concat(*args)
 
 
 class Trim(VectorizedFunction):
@@ -50,7 +52,7 @@ class Trim(VectorizedFunction):
 
     def apply(self, strings):
         self.assert_str('string', strings)
-        return strings.str.strip()
+        return TextKernel.strip(strings)
 
 
 class RTrim(VectorizedFunction):
@@ -69,7 +71,7 @@ class RTrim(VectorizedFunction):
 
     def apply(self, strings):
         self.assert_str('string', strings)
-        return strings.str.rstrip()
+        return TextKernel.rstrip(strings)
 
 
 class LTrim(VectorizedFunction):
@@ -88,7 +90,7 @@ class LTrim(VectorizedFunction):
 
     def apply(self, strings):
         self.assert_str('string', strings)
-        return strings.str.lstrip()
+        return TextKernel.lstrip(strings)
 
 
 class Upper(VectorizedFunction):
@@ -107,7 +109,7 @@ class Upper(VectorizedFunction):
 
     def apply(self, strings):
         self.assert_str('string', strings)
-        return strings.str.upper()
+        return TextKernel.upper(strings)
 
 
 class Lower(VectorizedFunction):
@@ -126,7 +128,7 @@ class Lower(VectorizedFunction):
 
     def apply(self, strings):
         self.assert_str('string', strings)
-        return strings.str.lower()
+        return TextKernel.lower(strings)
 
 
 class Length(VectorizedFunction):
@@ -145,7 +147,7 @@ class Length(VectorizedFunction):
 
     def apply(self, strings):
         self.assert_str('string', strings)
-        return strings.str.len()
+        return TextKernel.length(strings)
 
 
 class Extract(VectorizedFunction):
@@ -168,6 +170,7 @@ class Extract(VectorizedFunction):
             EXTRACT(t.text, '\\|([^|\\.]+)') AS title
     """
     name = 'EXTRACT'
+    distinct_values = True
 
     def apply(self, strings, pattern, group=1):
         self.assert_str('string', strings)
@@ -182,7 +185,7 @@ class Extract(VectorizedFunction):
             raise OdhQLExecutionException('Invalid parameter: group can not be smaller than 1')
 
         try:
-            res = strings.str.extract(pattern)
+            res = strings.str.extract(Pattern.compile(pattern))
 
             if isinstance(res, pd.Series) and group > 1:
                 raise OdhQLExecutionException('Error in regular expression: Only 1 group')
@@ -219,7 +222,9 @@ class StartsWith(VectorizedFunction):
     def apply(self, strings, start):
         self.assert_str('string', strings)
         self.assert_str('start', start)
-        return strings.str.startswith(start)
+        if isinstance(start, pd.Series):
+            return strings.str.startswith(start)
+        return Pattern.prefix(start).matches(strings)
 
 
 class EndsWith(VectorizedFunction):
@@ -242,7 +247,9 @@ class EndsWith(VectorizedFunction):
     def apply(self, strings, end):
         self.assert_str('string', strings)
         self.assert_str('end', end)
-        return strings.str.endswith(end)
+        if isinstance(end, pd.Series):
+            return strings.str.endswith(end)
+        return Pattern.suffix(end).matches(strings)
 
 
 class Get(VectorizedFunction):
@@ -291,7 +298,7 @@ class Contains(VectorizedFunction):
         self.assert_value('pattern', pattern)
 
         self.assert_bool('match_case', match_case)
-        return strings.str.contains(pattern, match_case)
+        return Pattern.search(pattern, match_case).matches(strings)
 
 
 class Replace(VectorizedFunction):
@@ -310,6 +317,7 @@ class Replace(VectorizedFunction):
             REPLACE(ODH12.strasse, 'str.', 'strasse') AS strasse
     """
     name = 'REPLACE'
+    distinct_values = True
 
     def apply(self, strings, pattern, replace, match_case=True):
         self.assert_str('string', strings)
@@ -319,7 +327,10 @@ class Replace(VectorizedFunction):
 
         self.assert_str('replace', replace)
         self.assert_bool('match_case', match_case)
-        return strings.str.replace(pattern, replace, case=match_case)
+        if len(pattern) == 1 and match_case:
+            # single characters are replaced literally (same as Series.str.replace)
+            return Pattern(Pattern.SUBSTRING, pattern).sub(strings, replace)
+        return Pattern.search(pattern, match_case).sub(strings, replace)
 
 
 class Repeat(VectorizedFunction):
@@ -340,7 +351,9 @@ class Repeat(VectorizedFunction):
     def apply(self, strings, times):
         self.assert_str('string', strings)
         self.assert_int('times', times)
-        return strings.str.repeat(times)
+        if isinstance(times, pd.Series):
+            return strings.str.repeat(times)
+        return TextKernel.repeat(strings, times)
 
 
 class Pad(VectorizedFunction):
@@ -363,7 +376,7 @@ class Pad(VectorizedFunction):
         self.assert_str('string', strings)
         self.assert_in('side', side, ['left', 'right', 'both'])
         self.assert_int('width', width)
-        return strings.str.pad(width, side)
+        return TextKernel.pad(strings, width, side)
 
 
 class Count(VectorizedFunction):
@@ -386,7 +399,7 @@ class Count(VectorizedFunction):
         self.assert_regex('pattern', pattern)
         self.assert_value('pattern', pattern)
 
-        return strings.str.count(pattern)
+        return Pattern.search(pattern).count(strings)
 
 
 class Substring(VectorizedFunction):
@@ -420,7 +433,7 @@ class Substring(VectorizedFunction):
         if length < 1:
             raise OdhQLExecutionException('Invalid length: Must be at least 1')
 
-        return strings.str.slice(start - 1, start - 1 + length if length else None)
+        return TextKernel.slice(strings, start - 1, start - 1 + length if length else None)
 
 
 class ToChar(VectorizedFunction):
@@ -438,6 +451,7 @@ class ToChar(VectorizedFunction):
          TO_CHAR(TO_DATE(ODH30.baubeginn, '%d%m%Y'), '%Y-%m-%d') AS baubeginn
     """
     name = 'TO_CHAR'
+    distinct_values = True
 
     def apply(self, values, format=None):
         with self.errorhandler('Unable to convert to string ({exception})'):
@@ -462,6 +476,7 @@ class XPath(VectorizedFunction):
          XPATH(t.description, '//tr[1]/td[2]/text()') AS abschnitt
     """
     name = 'XPATH'
+    distinct_values = True
 
     def apply(self, values, path):
         self.assert_str('values', values)
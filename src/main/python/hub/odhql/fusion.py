@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+"""
+Fused filter kernels for the OdhQL interpreter. Comparisons of numeric columns and literals combined by AND/OR are
+compiled into a single expression, which is evaluated block by block: All intermediate results fit into the CPU cache
+and no series are created for them.
+"""
+
+import numpy as np
+
+import hub.odhql.ast as ast
+
+
+class FusedFilter(object):
+    """
+    Compiled filter consisting of comparisons (=, !=, <, <=, >, >=) of fields and numeric literals only, combined by
+    AND/OR. Whether the fields are numeric is only known when the filter is evaluated.
+    """
+
+    # number of rows evaluated at once, small enough for the intermediate results of a few comparisons to stay in the
+    # CPU cache
+    BLOCK_SIZE = 8192
+
+    OPERATORS = {
+        ast.BinaryCondition.Operator.equals: np.equal,
+        ast.BinaryCondition.Operator.not_equals: np.not_equal,
+        ast.BinaryCondition.Operator.less: np.less,
+        ast.BinaryCondition.Operator.less_or_equal: np.less_equal,
+        ast.BinaryCondition.Operator.greater: np.greater,
+        ast.BinaryCondition.Operator.greater_or_equal: np.greater_equal,
+    }
+
+    NUMBERS = (int, long, float, np.integer, np.floating)
+
+    def __init__(self, tree, fields):
+        """
+        :param tree: ('compare', ufunc, left, right) with operands ('field', index) or ('literal', value), or
+                     ('and', [trees]) / ('or', [trees])
+        :param fields: Fields referenced by the tree (by index)
+        :type fields: list of hub.odhql.ast.Field
+        """
+        self.tree = tree
+        self.fields = fields
+
+    @classmethod
+    def compile(cls, conditions, conjunction=True):
+        """
+        :param conditions: Conditions combined by AND (conjunction) or OR
+        :return: Filter for all conditions or None if any of them can not be fused
+        :rtype: FusedFilter
+        """
+        fields = {}  # key -> (index, field)
+        tree = cls._compile(ast.FilterCombination(conditions) if conjunction else ast.FilterAlternative(conditions),
+                            fields)
+        if tree is None:
+            return None
+        return cls(tree, [field for _, field in sorted(fields.values())])
+
+    @classmethod
+    def _compile(cls, condition, fields):
+        if isinstance(condition, (ast.FilterCombination, ast.FilterAlternative)):
+            children = [cls._compile(c, fields) for c in condition.conditions]
+            if not children or None in children:
+                return None
+            return 'and' if isinstance(condition, ast.FilterCombination) else 'or', children
+
+        if isinstance(condition, ast.BinaryCondition) and condition.operator in cls.OPERATORS:
+            left, right = cls._operand(condition.left, fields), cls._operand(condition.right, fields)
+            if left and right and 'field' in (left[0], right[0]):
+                return 'compare', cls.OPERATORS[condition.operator], left, right
+
+        return None
+
+    @classmethod
+    def _operand(cls, expression, fields):
+        if isinstance(expression, ast.Field):
+            index, _ = fields.setdefault(expression.key(), (len(fields), expression))
+            return 'field', index
+        if (isinstance(expression, ast.LiteralExpression) and isinstance(expression.value, cls.NUMBERS) and
+                not isinstance(expression.value, bool)):
+            return 'literal', expression.value
+        return None
+
+    def evaluate(self, columns):
+        """
+        :param columns: Values of the fields (same order as self.fields)
+        :type columns: list of numpy.ndarray
+        :return: Mask of the rows matching the filter or None if a column is not numeric
+        :rtype: numpy.ndarray(dtype=numpy.bool_)
+        """
+        if any(c.dtype.kind not in 'iuf' for c in columns):
+            return None
+
+        n = len(columns[0])
+        mask = np.empty(n, dtype=np.bool_)
+        with np.errstate(invalid='ignore'):  # comparisons with NaN (NULL) are false
+            for start in xrange(0, n, self.BLOCK_SIZE):
+                stop = min(start + self.BLOCK_SIZE, n)
+                self._evaluate(self.tree, [c[start:stop] for c in columns], mask[start:stop])
+        return mask
+
+    def _evaluate(self, tree, columns, out):
+        """ Evaluates a (sub-)tree for a block of rows, the result is written to out. """
+        kind = tree[0]
+        if kind == 'compare':
+            _, ufunc, left, right = tree
+            ufunc(self._value(left, columns), self._value(right, columns), out=out)
+            return out
+
+        children = tree[1]
+        combine = np.logical_and if kind == 'and' else np.logical_or
+        self._evaluate(children[0], columns, out)
+        if len(children) > 1:
+            tmp = np.empty_like(out)
+            for child in children[1:]:
+                combine(out, self._evaluate(child, columns, tmp), out=out)
+        return out
+
+    @staticmethod
+    def _value(operand, columns):
+        return columns[operand[1]] if operand[0] == 'field' else operand[1]
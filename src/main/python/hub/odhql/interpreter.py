@@ -7,19 +7,80 @@ separately.
 """
 
 import collections
+import copy
+import datetime as dt
 import itertools
+import time
 
 import pandas as pd
 import numpy as np
 import re
 
-from hub.structures.frame import OdhType, OdhSeries, OdhFrame
+from hub.structures.frame import OdhType, OdhSeries, OdhFrame, ConstantColumn
 import hub.odhql.parser as parser
+import hub.odhql.plan as plan
+from hub.odhql.explain import ExplainNode, Profiler, NullProfiler, PlanDescriber
+import hub.odhql.explain as explain
+from hub.odhql.join import HashJoin, JoinOrder
+from hub.odhql.aggregate import Grouping, Aggregate, distinct_rows
+from hub.odhql.pattern import Pattern
+from hub.odhql.fusion import FusedFilter
+from hub.odhql.selection import Selection
 import hub.odhql.functions as functions
 from hub.odhql.exceptions import OdhQLExecutionException
 # import profilehooks
 
 
+class ExpressionMemo(object):
+    """
+    Results of the common subexpressions of a query by frame, so that they are evaluated only once. Only valid during
+    the execution of a single query.
+    """
+
+    def __init__(self, keys=()):
+        """
+        :param keys: Structural keys of the expressions to remember
+        :type keys: set
+        """
+        self.keys = keys
+        # id(df) -> (df, {key: series}, (parent df, mask) or None)
+        # the frames are kept so that their ids can not be reused during the execution
+        self._frames = {}
+
+    def get(self, df, key):
+        """
+        :return: The result of an expression on a frame or None if it hasn't been evaluated yet
+        :rtype: OdhSeries
+        """
+        if key not in self.keys:
+            return None
+
+        entry = self._frames.get(id(df))
+        if entry is None:
+            return None
+
+        _, results, parent = entry
+        if key not in results and parent:
+            series = self.get(parent[0], key)
+            if isinstance(series, ConstantColumn):
+                results[key] = series.resize(np.count_nonzero(parent[1]))
+            elif series is not None:
+                results[key] = series[parent[1]].reset_index(drop=True)
+        return results.get(key)
+
+    def put(self, df, key, series):
+        if key in self.keys:
+            self._frames.setdefault(id(df), (df, {}, None))[1][key] = series
+
+    def derive(self, df, filtered, mask):
+        """
+        Makes the results for a frame available for a subset of its rows (results are filtered on demand)
+        :param filtered: df[mask]
+        """
+        if self.keys and id(df) in self._frames:
+            self._frames[id(filtered)] = (filtered, {}, (df, mask))
+
+
 class OdhQLInterpreter(object):
     """ Interpreter for the ODQHL query language. """
 
@@ -28,12 +89,36 @@ class OdhQLInterpreter(object):
 
     parser = parser.OdhQLParser()
 
-    def __init__(self, source_dfs):
+    plans = plan.PlanCache()
+
+    # number of source rows per batch for execute_chunked
+    CHUNK_SIZE = 50000
+
+    # conditions of AND/OR at least this expensive (see hub.odhql.plan.CostVisitor) are only evaluated for the
+    # remaining rows, if these are at most this fraction of all rows
+    SHORT_CIRCUIT_COST = plan.CostVisitor.FUNCTION
+    SHORT_CIRCUIT_RATIO = 0.5
+
+    # seed of the random selection of TABLESAMPLE without REPEATABLE, i.e. a query always uses the same sample
+    SAMPLE_SEED = 0
+
+    # number of rows of the samples used for previews of large data sources (see sample_rows)
+    PREVIEW_SAMPLE_ROWS = 10000
+
+    def __init__(self, source_dfs, sample_rows=None):
         """
         :param source_dfs: DataFrames required by the underlying OdhQL query.
         :type source_dfs: dict
+        :param sample_rows: If given, data sources with more rows are sampled as if TABLESAMPLE (sample_rows ROWS) was
+                            specified (e.g. for previews). Explicit TABLESAMPLE clauses take precedence.
         """
         self.source_dfs = {alias.lower(): df for alias, df in source_dfs.iteritems()}
+        self.sample_rows = sample_rows
+        # whether data sources were sampled because of sample_rows, i.e. results are based on a sample
+        self.sampled = False
+        self.memo = ExpressionMemo()
+        # measures the steps of the query for EXPLAIN ANALYZE
+        self.profiler = NullProfiler()
 
     @classmethod
     def _assert_crs(cls, series, name=None):
@@ -52,30 +137,36 @@ class OdhQLInterpreter(object):
         return '{}.{}'.format(prefix.lower(), name.lower())
 
     @classmethod
-    def _ensure_unique_fields(cls, query):
+    def compile(cls, query):
         """
-        Renames SELECT fields so that they are unique by adding a number (starting from 2) for duplicates
-        :param query: hub.odhql.parser.Query
-        :rtype: None
+        Creates the execution plan for a query. Plans for query strings are cached, i.e. a statement is parsed and
+        analysed only once.
+        :type query: str or parsed query object or hub.odhql.plan.QueryPlan
+        :rtype: hub.odhql.plan.QueryPlan
         """
-        seen = collections.defaultdict(int)
-        for f in query.fields:
-            n = seen[f.alias] = seen[f.alias] + 1
-            f.alias = '{}{}'.format(f.alias, bool(n - 1) * str(n))
+        if isinstance(query, plan.QueryPlan):
+            return query
+        if isinstance(query, basestring):
+            key = cls.plans.normalize(query, cls.parser.strip_comments)
+            return cls.plans.get(key, lambda: plan.QueryPlan(cls.parser.parse(query)))
+        # planning modifies the tree (constant folding, unique aliases), the caller's tree is left untouched
+        return plan.QueryPlan(copy.deepcopy(query))
 
     @classmethod
     def parse_sources(cls, query):
         """
-        Parses the data sources (tables) used in the query
-        :param query:
+        Parses the data sources (tables) used in the query. The query is only parsed, not planned, i.e. semantic
+        errors (e.g. of GROUP BY) are not detected.
+        :type query: str or parsed query object or hub.odhql.plan.QueryPlan
         :return: The name and ids of the data sources
         :rtype: dict[name] -> id
         """
-        if isinstance(query, basestring):
-            query = cls.parser.parse(query)
-
-        data_sources = itertools.chain(*[q.data_sources for q in query.queries]) if isinstance(query, parser.Union) \
-            else query.data_sources
+        if isinstance(query, plan.QueryPlan):
+            data_sources = query.data_sources
+        else:
+            if isinstance(query, basestring):
+                query = cls.parser.parse(query)
+            data_sources = plan.QueryPlan.data_sources_of(query)
 
         file_groups = {}
         transformations = {}
@@ -95,183 +186,371 @@ class OdhQLInterpreter(object):
     def execute(self, query):
         """
         Executes an OdhQL query
-        :type query: str or parsed query object
-        :return: Resulting DataFrame of the query
+        :type query: str or parsed query object or hub.odhql.plan.QueryPlan
+        :return: Resulting DataFrame of the query, for EXPLAIN (ANALYZE) the report (see ExplainNode.to_df)
         :rtype: :py:class: OdhFrame
         """
-        if isinstance(query, basestring):
-            query = self.parser.parse(query)
-        return self._interpret(query)
+        query_plan = self.compile(query)
+        if query_plan.explain:
+            return self.explain(query_plan).to_df()
+        return self._interpret(query_plan.root)[0]
 
-    def _interpret(self, query):
+    def explain(self, query, analyze=None):
         """
-        High-level interpretation control-flow
-        :param query: :py:class: hub.parser.Union or py:class: hub.parser.Query
-        :return: Resulting DataFrame
-        :rtype: :py:class: OdhFrame
+        Reports the steps of a query (EXPLAIN). If analyzing, the query is executed and each step reports its wall
+        time, the number of rows it received and produced, the size of its result and the number of cache hits
+        (EXPLAIN ANALYZE).
+        :type query: str or parsed query object or hub.odhql.plan.QueryPlan
+        :param analyze: Whether to execute the query. Defaults to whether the statement starts with EXPLAIN ANALYZE.
+        :return: Root of the tree, its cache hits are those of the plan
+        :rtype: hub.odhql.explain.ExplainNode
         """
-        is_union = isinstance(query, parser.Union)
-
-        if is_union:
-            # top-level object produced by the parser is *always* a Union object even if it's a single query
-            # if it's a "real" UNION we need to sort (ORDER) at the end, otherwise propagate Union.order to Query.order
-            if len(query.queries) == 1:
-                setattr(query.queries[0], 'order', query.order)
-                query.order = None
-
-            df = self._interpret_union(query.queries)
-            colnames = df.columns.tolist()
-
-        else:
-            self._ensure_unique_fields(query)
+        start = time.time()
+        query_plan = self.compile(query)
+        if analyze is None:
+            analyze = query_plan.explain == plan.QueryPlan.ANALYZE
+
+        root = ExplainNode('Statement', 'EXPLAIN ANALYZE' if analyze else 'EXPLAIN')
+        if not analyze:
+            PlanDescriber.describe(query_plan.root, root)
+            return root
+
+        interpreter = copy.copy(self)
+        interpreter.memo = ExpressionMemo()
+        interpreter.profiler = Profiler(root)
+        df, _ = interpreter._interpret(query_plan.root)
+
+        root.record(df, cache_hits=query_plan.cache_hits)
+        root.time = time.time() - start
+        return root
+
+    def execute_window(self, query, start, count):
+        """
+        Executes an OdhQL query, but only evaluates the requested rows of the result (e.g. a page of a preview) as if
+        LIMIT count OFFSET start was added to the query.
+        :type query: str or parsed query object or hub.odhql.plan.QueryPlan
+        :param start: Index of the first row
+        :param count: Number of rows
+        :return: Resulting DataFrame containing the requested rows and the number of rows of the complete result
+        :rtype: (OdhFrame, int)
+        """
+        query_plan = self.compile(query)
+        if query_plan.explain:
+            df = self.explain(query_plan).to_df()
+            return df.iloc[start:start + count], len(df)
 
-            # prepare
-            dfs = self._load(query)
+        node = query_plan.root
+        df, total = self._interpret(node.windowed(start, count))
 
-            # build one big/joined dataframe (FROM, JOIN)
-            df = self._interpret_data_sources(dfs, query.data_sources)
+        total = max(0, total - node.offset)
+        if node.limit is not None:
+            total = min(total, node.limit)
+        return df, total
 
-            # filter selected rows (WHERE)
-            if query.filter_definitions:
-                mask = self._interpret_filter(df, query.filter_definitions)
-                df = df[mask]
+    def execute_chunked(self, query, chunk_size=None):
+        """
+        Executes an OdhQL query in batches of source rows, i.e. the complete intermediate dataframes never need to be
+        held in memory. This is only possible for streamable queries (see hub.odhql.plan.SelectPlan.streamable),
+        otherwise the result is computed at once and returned as a single chunk.
+        :type query: str or parsed query object or hub.odhql.plan.QueryPlan
+        :param chunk_size: Number of source rows per batch
+        :return: Generator of resulting DataFrames. Empty chunks are skipped, but there is always at least one.
+        """
+        query_plan = self.compile(query)
+        node = query_plan.root
+        if query_plan.explain or not getattr(node, 'streamable', False):
+            yield self.execute(query_plan)
+            return
+
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        (alias, source), = self._load(node).items()
+
+        empty = True
+        # at least one (possibly empty) batch to get the columns
+        for start in xrange(0, max(len(source), 1), chunk_size):
+            df, colnames, _ = self._interpret_select(node, {alias: source.iloc[start:start + chunk_size]})
+            if len(df) or (empty and start + chunk_size >= len(source)):
+                empty = False
+                yield df[colnames]
+
+    def _interpret(self, node):
+        """
+        High-level interpretation control-flow
+        :param node: :py:class: hub.odhql.plan.UnionPlan or :py:class: hub.odhql.plan.SelectPlan
+        :return: Resulting DataFrame and the number of rows it would have without LIMIT/OFFSET
+        :rtype: (OdhFrame, int)
+        """
+        if isinstance(node, plan.UnionPlan):
+            with self.profiler.node('Union') as step:
+                df, total = self._interpret_union(node.queries)
+                colnames = df.columns.tolist()
+                step.record(df, len(df))
 
-            # select requested fields from filtered dataframe
-            if df.shape[0]:
+        else:
+            with self.profiler.node('Select') as step:
+                df, colnames, total = self._interpret_select(node, self._load(node))
+                step.record(df)
+
+        rows = None
+        if node.order:
+            with self.profiler.node('Sort', explain.describe_order(node.order), len(df)) as step:
+                rows = self._interpret_order(df, node.order, colnames, node.stop)
+                step.record(rows)
+
+        if node.is_windowed and not getattr(node, 'slice_early', False):
+            with self.profiler.node('Limit', explain.describe_window(node)) as step:
+                all_rows = np.arange(len(df)) if rows is None else rows
+                rows = all_rows[node.offset:node.stop]
+                step.record(rows, len(all_rows))
+
+        # final column selection, only these columns are reordered
+        df = df[colnames]
+        return (df if rows is None else df.iloc[rows]), total
+
+    def _interpret_select(self, node, dfs):
+        """
+        Interprets a single query (everything but ORDER BY)
+        :type node: hub.odhql.plan.SelectPlan
+        :param dfs: Prepared dataframes, result of self._load()
+        :return: Resulting DataFrame, which also contains the non-selected columns, the names of the selected
+                 columns and the number of rows without LIMIT/OFFSET
+        :rtype: (OdhFrame, list, int)
+        """
+        query = node.query
+        self.memo = ExpressionMemo(node.common)
+        dfs = {alias: Selection.of(df) for alias, df in dfs.iteritems()}
+
+        # filter source rows before joining them (WHERE, single-table conditions only)
+        for alias, conditions in node.pushed.iteritems():
+            with self.profiler.node('Filter', explain.describe_conditions(alias, conditions), len(dfs[alias])) as step:
+                mask = self._interpret_filter(dfs[alias], parser.FilterCombination(conditions))
+                dfs[alias] = self._filter(dfs[alias], mask)
+                step.record(dfs[alias])
+
+        # build one big/joined dataframe (FROM, JOIN), starting with the most selective joins
+        data_sources = query.data_sources
+        if node.join_predicates:
+            data_sources = JoinOrder.reorder(data_sources, node.join_predicates, dfs)
+        df = self._interpret_data_sources(dfs, data_sources)
+
+        # filter selected rows (WHERE, remaining conditions)
+        if node.residual:
+            with self.profiler.node('Filter', explain.describe_conditions(None, node.residual), len(df)) as step:
+                mask = self._interpret_filter(df, parser.FilterCombination(node.residual))
+                df = self._filter(df, mask)
+                step.record(df)
+
+        # one row per group (GROUP BY, aggregate functions)
+        if node.grouped:
+            with self.profiler.node('Aggregate', explain.describe_grouping(node), len(df)) as step:
+                df = self._interpret_grouping(df, node)
+                step.record(df)
+
+        # without ORDER BY, only the requested rows need to be evaluated (LIMIT, OFFSET)
+        total = len(df)
+        if node.slice_early:
+            with self.profiler.node('Limit', explain.describe_window(node), len(df)) as step:
+                mask = np.zeros(len(df), np.bool_)
+                mask[node.offset:node.stop] = True
+                df = self._filter(df, mask)
+                step.record(df)
+
+        # select requested fields from filtered rows, only now the values are gathered
+        with self.profiler.node('Project', explain.describe_fields(query.fields), len(df)) as step:
+            if len(df):
                 cols = [self._interpret_field(df, f) for f in query.fields]
                 colnames = [c.name for c in cols]
-                addtl_colnames = set(df.columns.tolist()) - set(colnames)
-                # add non-selected cols to dataframe as well to allow ORDER BY later
-                addtl_cols = [df[c].reset_index(drop=True) for c in addtl_colnames]
-                all_cols = cols + addtl_cols
-                df = OdhSeries.concat(all_cols, axis=1, copy=False).__finalize__(df)
+                # add non-selected cols used by ORDER BY as well
+                addtl_colnames = collections.OrderedDict.fromkeys(self._order_columns(node.order))
+                addtl_cols = [df[c] for c in addtl_colnames if c in df and c not in colnames]
+                name = df.name
+                df = OdhSeries.concat(cols + addtl_cols, axis=1, copy=False)
+                df.name = name
 
             else:
                 colnames = [getattr(f, 'alias', None) or f.name for f in query.fields]
                 df = OdhFrame(columns=colnames)
+            step.record(df)
 
-        if getattr(query, 'order', None):
-            self._interpret_order(df, query.order, colnames)
+        # remove duplicate rows (DISTINCT) before sorting, so that fewer rows need to be sorted
+        if node.distinct:
+            with self.profiler.node('Distinct', explain.describe_fields(query.fields), len(df)) as step:
+                rows = distinct_rows([df[c].values for c in colnames], len(df))
+                if len(rows) < len(df):
+                    df = df.iloc[rows]
+                total = len(df)
+                step.record(df)
 
-        # final column selection
-        return df[colnames]
+        self.memo = ExpressionMemo()
+        return df, colnames, total
 
-    def _load(self, query):
+    def _interpret_grouping(self, df, node):
+        """
+        Groups the rows and computes the aggregate functions. The grouped fields are columns of the resulting
+        frame, the results of the aggregates and other grouped expressions are provided through the memo.
+        :type df: hub.odhql.selection.Selection
+        :type node: hub.odhql.plan.SelectPlan
+        :return: A row for each group
+        :rtype: hub.odhql.selection.Selection
         """
-        Load dataframes and prepare them (prefix) for querying
-        :type query: hub.odhql.parser.Query
+        keys = [self._interpret_field(df, e) for e in node.group_by]
+        grouping = Grouping.of([k.values for k in keys], len(df))
+        first = grouping.first
+
+        columns = collections.OrderedDict()
+        results = {}
+        for expression, series in zip(node.group_by, keys):
+            values = series.iloc[first].reset_index(drop=True)
+            if isinstance(expression, parser.Field):
+                columns[self._make_name(expression.prefix, expression.name)] = values
+            else:
+                results[expression.key()] = values
+
+        for key, aggregate in node.aggregates.iteritems():
+            values = self._interpret_field(df, aggregate.arg) if aggregate.arg else None
+            results[key] = Aggregate(aggregate.name, aggregate.distinct).compute(grouping, values)
+
+        grouped = OdhFrame(columns, index=np.arange(grouping.size))
+        grouped.name = df.name
+        grouped = Selection.of(grouped)
+
+        self.memo = ExpressionMemo(node.common | node.grouping_keys)
+        for key, values in results.iteritems():
+            self.memo.put(grouped, key, values)
+        return grouped
+
+    def _load(self, node):
+        """
+        Load dataframes and prepare them (prefix) for querying. Only columns referenced by the query are loaded and
+        data sources used more than once (self joins) are loaded only once.
+        :type node: hub.odhql.plan.SelectPlan
         :return: Renamed/prepared dataframes
         :rtype: dict[alias] -> DataFrame
         """
-        dfs = {ds.alias: self.source_dfs[ds.name.lower()].copy() for ds in query.data_sources}
-        for alias, df in dfs.items():
-            df.rename(columns={name: self._make_name(alias, name) for name in df.columns}, inplace=True)
+        used = node.columns
+
+        aliases_by_source = collections.defaultdict(list)
+        samples = {}
+        for ds in node.query.data_sources:
+            aliases_by_source[ds.name.lower()].append(ds.alias)
+            samples[ds.alias] = ds.sample
+
+        dfs = {}
+        for name, aliases in aliases_by_source.iteritems():
+            source = self.source_dfs[name]
+            with self.profiler.node('Load', explain.describe_source(name, aliases), len(source)) as step:
+                needed = set(itertools.chain(*[used.get(alias.lower(), ()) for alias in aliases]))
+                columns = [c for c in source.columns if c.lower() in needed]
+                if len(columns) < len(source.columns):
+                    source = source[columns]
+
+                for alias in aliases:
+                    # shallow copy: the data is shared with the source (and between aliases), only the names differ
+                    df = source.copy(deep=False)
+                    df.columns = [self._make_name(alias, c) for c in source.columns]
+                    dfs[alias] = self._sample(df.__finalize__(source, method='rename'), alias, samples[alias])
+                step.record(source)
 
         return dfs
 
+    def _sample(self, df, alias, sample):
+        """
+        Selects a random sample of the rows of a data source (TABLESAMPLE). The selection only depends on the number of
+        rows and the seed, i.e. it is the same each time the query is executed. Without TABLESAMPLE, data sources with
+        more than self.sample_rows rows are sampled as well.
+        :type df: OdhFrame
+        :type sample: hub.odhql.ast.TableSample
+        :return: The sampled rows, in the order of the data source
+        :rtype: OdhFrame
+        """
+        if sample is None:
+            if self.sample_rows is None or len(df) <= self.sample_rows:
+                return df
+            sample = parser.TableSample(self.sample_rows, parser.TableSample.Unit.rows)
+            self.sampled = True
+
+        size = sample.size
+        if sample.unit == parser.TableSample.Unit.percent:
+            size = int(round(len(df) * sample.size / 100.0))
+        if size >= len(df):
+            return df
+
+        with self.profiler.node('Sample', explain.describe_sample(alias, sample), len(df)) as step:
+            seed = self.SAMPLE_SEED if sample.seed is None else sample.seed
+            random = np.random.RandomState(seed % 2 ** 32)
+            if size * 4 <= len(df):
+                # small sample: draw positions until there are enough distinct ones, no random key per row needed
+                rows = np.unique(random.randint(0, len(df), size))
+                while len(rows) < size:
+                    rows = np.unique(np.concatenate([rows, random.randint(0, len(df), size - len(rows))]))
+            else:
+                # the rows with the smallest random keys
+                rows = np.sort(np.argpartition(random.random_sample(len(df)), size)[:size])
+            df = df.iloc[rows]
+            df.index = np.arange(len(df))
+            step.record(df)
+        return df
+
     def _interpret_union(self, queries):
         """
         Process a :py:class: hub.odhql.parser.Union object
-        :type queries: list of :py:class: hub.odhql.parser.Query
-        :rtype: DataFrame
+        :type queries: list of :py:class: hub.odhql.plan.SelectPlan
+        :return: Combined DataFrame and the total number of rows of the queries without LIMIT/OFFSET
+        :rtype: (DataFrame, int)
         """
-        if len({len(q.fields) for q in queries}) > 1:
+        if len({len(q.query.fields) for q in queries}) > 1:
             raise OdhQLExecutionException('The number of selected fields for each query must match exactly.')
 
-        merged = None
-        coltypes = {}
-        columns = []
-
         # 1. interpret the queries
         # 2. rename all columns to str(index) to have matching names
         # 3. Convert CRS if geometries present
-        # 4. concatenate dataframes (append)
-        for df in (self._interpret(query) for query in queries):
-            if merged is None:
-                merged = df
-                columns = merged.columns.tolist()
-                coltypes = [df[c].odh_type for c in df.columns]
-                merged.rename(columns={col: str(i) for i, col in enumerate(df)}, inplace=True)
-            else:
-                for i, c in enumerate(df.columns):
-                    type_left, type_right = coltypes[i], df[c].odh_type
-                    if type_left != type_right:
-                        raise OdhQLExecutionException('UNION: Type mismatch for column {} ({}). '
-                                                      'Expected "{}" got "{}" instead'
-                                                      .format(i + 1, columns[i], type_left.name, type_right.name))
-
-                old = df.copy()
-                df.rename(columns={col: str(i) for i, col in enumerate(df)}, inplace=True)
-
-                for i, (old, new) in enumerate(zip(columns, old.columns.tolist())):
-                    colname = str(i)
-                    s_new = df[str(colname)]
-                    if s_new.odh_type == OdhType.GEOMETRY:
-                        s_old = merged[str(colname)]
-                        self._assert_crs(s_old, old)
-                        self._assert_crs(s_new, new)
-                        df[str(colname)] = s_new.to_crs(s_old.crs)
-
-                merged = merged.append(df, ignore_index=True)
-
+        # 4. concatenate dataframes
+        results = [self._interpret(query) for query in queries]
+        total = sum(rows for _, rows in results)
+        dfs = [df for df, _ in results]
+
+        first = dfs[0]
+        columns = first.columns.tolist()
+        coltypes = [first[c].odh_type for c in first.columns]
+
+        for df in dfs[1:]:
+            for i, c in enumerate(df.columns):
+                type_left, type_right = coltypes[i], df[c].odh_type
+                if type_left != type_right:
+                    raise OdhQLExecutionException('UNION: Type mismatch for column {} ({}). '
+                                                  'Expected "{}" got "{}" instead'
+                                                  .format(i + 1, columns[i], type_left.name, type_right.name))
+
+            for i, (old, new) in enumerate(zip(first.columns.tolist(), df.columns.tolist())):
+                if coltypes[i] == OdhType.GEOMETRY:
+                    s_old, s_new = first[old], df[new]
+                    self._assert_crs(s_old, old)
+                    self._assert_crs(s_new, new)
+                    df[new] = s_new.to_crs(s_old.crs)
+
+        for df in dfs:
+            df.rename(columns={col: str(i) for i, col in enumerate(df)}, inplace=True)
+
+        merged = pd.concat(dfs, ignore_index=True) if len(dfs) > 1 else first
         merged.rename(columns={str(i): col for i, col in enumerate(columns)}, inplace=True)
-        return merged
+        return merged, total
 
     def _interpret_data_sources(self, dfs, data_sources):
         """
         Loads the necesessary dataframe(s) from the given source frames and performs joins if given multiple
         :param dfs: Prepared dataframes, result of self._load()
         :param data_sources: Ordered list of :py:class: hub.odhql.parser.DataSource
-        :return: (Joined) DataFrame
+        :return: (Joined) rows, see hub.odhql.selection.Selection
         """
 
-        class JoinVisitor(object):
-
-            def __init__(self):
-                self.prefixes = set()
-
-            def visit(self, o):
-                if isinstance(o, parser.Field):
-                    self.prefixes.add(o.prefix)
-
         aliases_left = []  # aliases (table prefixes) currently contained in `df`
         df = None  # make flake8/pylint happy
         for ds in data_sources:
             if isinstance(ds, parser.JoinedDataSource):
-                cond = ds.condition
-
-                names_left = []
-                names_right = []
-                for c in cond.conditions if isinstance(cond, parser.JoinConditionList) else (cond,):
-                    jvl = JoinVisitor()
-                    c.left.accept(jvl)
-                    left, right = (c.left, c.right) if jvl.prefixes.issubset(aliases_left) else (c.right, c.left)
-
-                    jvr = JoinVisitor()
-                    right.accept(jvr)
-                    prefix_right = next(iter(jvr.prefixes))
-                    if len(jvr.prefixes) > 1 or prefix_right not in dfs:
-                        raise OdhQLExecutionException('JOIN: Table {} does not exist'.format(prefix_right))
-
-                    df_right = dfs[prefix_right]
-
-                    if isinstance(left, parser.Field):
-                        names_left.append(self._make_name(left.prefix, left.name))
-                    else:
-                        df['__temp'] = self._interpret_field(df, c.left)
-                        names_left.append('__temp')
-
-                    if isinstance(right, parser.Field):
-                        names_right.append(self._make_name(right.prefix, right.name))
-                    else:
-                        df_right['__temp'] = self._interpret_field(df_right, c.right)
-                        names_right.append('__temp')
-
-                try:
-                    df = df.merge(df_right, how=ds.join_type.name, left_on=names_left, right_on=names_right,
-                                  suffixes=('', 'r'), copy=False)
-                except KeyError as e:
-                    raise OdhQLExecutionException('JOIN: Column "{}" does not exist'.format(e.message))
+                with self.profiler.node('Join', explain.describe_join(ds)) as step:
+                    joined, prefix_right = self._interpret_join(dfs, df, aliases_left, ds)
+                    step.record(joined, len(df) + len(dfs[prefix_right]))
+                df = joined
                 aliases_left.append(prefix_right)
 
             elif isinstance(ds, parser.DataSource):
@@ -283,86 +562,227 @@ class OdhQLInterpreter(object):
 
         return df
 
+    def _interpret_join(self, dfs, df, aliases_left, ds):
+        """
+        Joins a data source to the rows joined so far
+        :param aliases_left: Aliases (table prefixes) contained in `df`
+        :type ds: hub.odhql.parser.JoinedDataSource
+        :return: Joined rows and the alias of the joined data source
+        """
+        cond = ds.condition
+
+        keys_left = []
+        keys_right = []
+        for c in cond.conditions if isinstance(cond, parser.JoinConditionList) else (cond,):
+            jvl = plan.PrefixVisitor()
+            c.left.accept(jvl)
+            left, right = (c.left, c.right) if jvl.prefixes.issubset(aliases_left) else (c.right, c.left)
+
+            jvr = plan.PrefixVisitor()
+            right.accept(jvr)
+            prefix_right = next(iter(jvr.prefixes))
+            if len(jvr.prefixes) > 1 or prefix_right not in dfs:
+                raise OdhQLExecutionException('JOIN: Table {} does not exist'.format(prefix_right))
+
+            df_right = dfs[prefix_right]
+            keys_left.append(self._interpret_join_key(df, left))
+            keys_right.append(self._interpret_join_key(df_right, right))
+
+        return HashJoin.join(df, df_right, keys_left, keys_right, ds.join_type.name), prefix_right
+
+    def _interpret_join_key(self, df, expression):
+        """
+        Evaluates one side of a join condition without adding it to the dataframe
+        :type expression: Field or Function or Expression
+        :rtype: numpy.ndarray
+        """
+        if isinstance(expression, parser.Field):
+            name = self._make_name(expression.prefix, expression.name)
+            try:
+                return df[name].values
+            except KeyError:
+                raise OdhQLExecutionException('JOIN: Column "{}" does not exist'.format(name))
+
+        return self._interpret_field(df, expression).values
+
     def _interpret_field(self, df, field, expand=True):
         """
         Selects a field from the dataframe
-        :type df: pandas.core.frame.DataFrame
+        :type df: hub.odhql.selection.Selection
         :type field: AliasedField or AliasedFunction or Function or Expression or Field
         :type expand: bool
         :return: Series or single value if expand=False
         """
+        if not expand and isinstance(field, parser.LiteralExpression):
+            return field.value
+
+        column = self._interpret_column(df, field)
+        return column.materialize() if isinstance(column, ConstantColumn) else column
+
+    def _interpret_column(self, df, field):
+        """
+        Like _interpret_field, but literals and functions of constant arguments are not expanded to the length of
+        the dataframe.
+        :rtype: OdhSeries or ConstantColumn
+        """
         alias = getattr(field, 'alias', None)
 
         if isinstance(field, parser.Field):
             alias = alias or field.name
             name = self._make_name(field.prefix, field.name)
             try:
-                series = df[name].copy()
+                series = df[name]
             except KeyError:
                 raise OdhQLExecutionException('Column "{}" does not exist'.format(name))
 
         elif isinstance(field, parser.LiteralExpression):
-            value = field.value
-
-            if not expand:
-                return value
-
-            if not isinstance(value, pd.Series):
-                value = np.full(len(df), value, dtype=object if isinstance(value, basestring) else type(value))
-
-            series = OdhSeries(value, name=alias)
+            if not isinstance(field.value, pd.Series):
+                return ConstantColumn.of(field.value, len(df), alias)
+            series = field.value
 
         elif isinstance(field, parser.Function):
-            args = [self._interpret_field(df, arg, expand=False) for arg in field.args]
-            series = functions.execute(field.name, len(df), args)
+            with self.profiler.node('Function', field.name.upper(), len(df)) as step:
+                key = field.key() if self.memo.keys else None
+                series = self.memo.get(df, key)
+                cached = series is not None
+                if not cached:
+                    series = self._interpret_function(df, field)
+                    self.memo.put(df, key, series)
+                step.record(series, cache_hits=int(cached))
+
+        elif isinstance(field, parser.AggregateFunction):
+            series = self.memo.get(df, field.key())
+            if series is None:
+                raise OdhQLExecutionException('{}: Aggregate functions are only allowed in the selected fields'
+                                              .format(field.name))
 
         elif isinstance(field, parser.AliasedExpression):
-            series = self._interpret_field(df, field.expression)
+            series = self._interpret_column(df, field.expression)
 
         elif isinstance(field, parser.CaseExpression):
-            odh_type = None
-            series = None
-            affected = np.zeros(len(df), bool)
-            for i, rule in enumerate(field.rules):
-                mask = self._interpret_filter(df, rule.condition) if rule.condition else np.array([True], bool)
-                if not mask.any():
-                    continue
-                mask = ~affected & mask
-                if not mask.any():
-                    continue
-
-                affected |= mask
-                slice = self._interpret_field(df[mask], rule.expression)
-                if odh_type is None:
-                    odh_type = slice.odh_type
-                    series = np.full(len(df), np.nan, dtype=odh_type.dtypes[0])
-                elif odh_type is not slice.odh_type:
-                    raise OdhQLExecutionException('CASE: Type mismatch in CASE #{}'.format(i + 1))
-                series[mask] = slice
+            key = field.key() if self.memo.keys else None
+            series = self.memo.get(df, key)
             if series is None:
-                series = np.full(len(df), np.nan, dtype=object)
-            series = OdhSeries(series)
+                series = self._interpret_case(df, field)
+                self.memo.put(df, key, series)
         else:
             assert False, 'Unknown field type "{}"'.format(type(field))
 
-        series = OdhSeries(series.reset_index(drop=True), name=alias)
+        if isinstance(series, ConstantColumn):
+            return series.resize(len(series), alias)
+
+        # all series have a default index (see hub.odhql.selection.Selection), no need to reset it
+        return OdhSeries(series, name=alias)
+
+    def _interpret_function(self, df, function):
+        """
+        Evaluates a function. If all arguments are constant (literals or functions of literals) and the function is
+        not positional, it is evaluated for a single row only.
+        :type function: hub.odhql.parser.Function
+        :rtype: OdhSeries or ConstantColumn
+        """
+        args = [arg.value if isinstance(arg, parser.LiteralExpression) else self._interpret_column(df, arg)
+                for arg in function.args]
+
+        if args and not functions.is_positional(function.name) and \
+                not any(isinstance(arg, pd.Series) for arg in args):
+            result = functions.execute(function.name, 1,
+                                       [arg.series if isinstance(arg, ConstantColumn) else arg for arg in args])
+            if isinstance(result, pd.Series) and len(result) == 1:
+                return ConstantColumn(OdhSeries(result), len(df))
+
+        args = [arg.materialize() if isinstance(arg, ConstantColumn) else arg for arg in args]
+        return functions.execute(function.name, len(df), args)
+
+    def _interpret_case(self, df, field):
+        """
+        Evaluates a CASE expression: The conditions are evaluated as masks, each THEN/ELSE expression only for the
+        rows it applies to. The dtype of the results is kept unless some rows remain NULL (no ELSE).
+        :type df: hub.odhql.selection.Selection
+        :type field: hub.odhql.parser.CaseExpression
+        :rtype: OdhSeries
+        """
+        n = len(df)
+        affected = np.zeros(n, np.bool_)
+        parts = []  # (mask, values)
+        odh_type = None
+        crs = None
+        for i, rule in enumerate(field.rules):
+            if affected.all():
+                break
+
+            mask = ~affected
+            if rule.condition:
+                mask &= self._interpret_filter(df, rule.condition)
+            count = np.count_nonzero(mask)
+            if not count:
+                continue
+            affected |= mask
+
+            expression = rule.expression
+            if isinstance(expression, parser.LiteralExpression) and expression.value is None:
+                continue  # rows stay NULL
+
+            values = self._interpret_column(df if count == n else self._filter(df, mask), expression)
+            if isinstance(values, ConstantColumn):
+                values = values.series  # a single row is assigned to all rows of the mask
+
+            if odh_type is None:
+                odh_type, crs = values.odh_type, getattr(values, 'crs', None)
+            elif odh_type is not values.odh_type:
+                raise OdhQLExecutionException('CASE: Type mismatch in CASE #{}'.format(i + 1))
+            parts.append((mask, values.values))
+
+        if not parts:
+            return OdhSeries(np.full(n, np.nan, dtype=object))
+
+        dtype = np.result_type(*[part.dtype for _, part in parts])
+        if sum(np.count_nonzero(mask) for mask, _ in parts) < n:
+            # some rows are NULL (no matching rule or THEN NULL)
+            if dtype.kind == 'M':
+                series = np.full(n, np.datetime64('NaT'), dtype=dtype)
+            else:
+                series = np.full(n, np.nan, dtype=np.result_type(dtype, np.float_) if dtype.kind in 'iuf' else object)
+        else:
+            series = np.empty(n, dtype=dtype)
+
+        for mask, values in parts:
+            series[mask] = values
+
+        series = OdhSeries(series)
+        series.crs = crs or {}
         return series
 
+    def _filter(self, df, mask):
+        """
+        Selects the rows matching a mask without copying any values. Results of common subexpressions are carried
+        over.
+        :type df: hub.odhql.selection.Selection
+        :type mask: numpy.ndarray(dtype=numpy.bool_)
+        :rtype: hub.odhql.selection.Selection
+        """
+        filtered = df.select(mask)
+        self.memo.derive(df, filtered, mask)
+        return filtered
+
     def _interpret_filter(self, df, filter_):
         """
         Recursively interprets a filter condition and returns a mask matching the shape of a series
         :param filter_: Subclass of hub.odhql.parser.FilterListBase
         :return: numpy.ndarray(dtype=numpy.bool_)
         """
-        if isinstance(filter_, parser.FilterAlternative):
-            mask = np.logical_or.reduce([self._interpret_filter(df, c) for c in filter_.conditions])
-
-        elif isinstance(filter_, parser.FilterCombination):
-            mask = np.logical_and.reduce([self._interpret_filter(df, c) for c in filter_.conditions])
+        if isinstance(filter_, (parser.FilterCombination, parser.FilterAlternative)):
+            mask = self._interpret_conditions(df, filter_)
 
         elif isinstance(filter_, parser.BinaryCondition):
-            left = self._interpret_field(df, filter_.left)
-            right = self._interpret_field(df, filter_.right)
+            left = self._interpret_column(df, filter_.left)
+            right = self._interpret_column(df, filter_.right)
+
+            # compare against a scalar if possible
+            if isinstance(left, ConstantColumn):
+                left = left.materialize()
+            if isinstance(right, ConstantColumn):
+                right = right.value if self._comparable(left, right.value) else right.materialize()
 
             if filter_.operator == parser.BinaryCondition.Operator.equals:
                 mask = left == right
@@ -377,16 +797,15 @@ class OdhQLInterpreter(object):
             elif filter_.operator == parser.BinaryCondition.Operator.less_or_equal:
                 mask = left <= right
             elif filter_.operator == parser.BinaryCondition.Operator.like:
-                mask = left.str.contains(str(right[0]))
+                mask = Pattern.like(unicode(self._first(right))).matches(left, na=False).values
             elif filter_.operator == parser.BinaryCondition.Operator.not_like:
-                mask = ~left.str.contains(str(right[0]))
+                mask = ~Pattern.like(unicode(self._first(right))).matches(left, na=True).values
             else:
                 assert False, 'Unknown operator "{}"'.format(filter_.operator)
 
         elif isinstance(filter_, parser.InCondition):
-            in_list = pd.concat([self._interpret_field(df, el) for el in filter_.in_list], axis=1, copy=False).T
             left = self._interpret_field(df, filter_.left)
-            mask = np.logical_or.reduce(left == in_list)
+            mask = self._interpret_in(df, left, filter_.in_list)
 
         elif isinstance(filter_, parser.IsNullCondition):
             left = self._interpret_field(df, filter_.field)
@@ -405,21 +824,148 @@ class OdhQLInterpreter(object):
 
         return mask
 
-    def _interpret_order(self, df, orders, colnames):
+    @staticmethod
+    def _comparable(series, value):
+        """
+        :return: Whether pandas can compare the series with the value as a scalar. NULL and e.g. strings compared to
+                 numbers are instead compared against the expanded column, which never matches.
+        """
+        if value is None:
+            return False
+        if series.dtype.kind in 'biufc':
+            return isinstance(value, (int, long, float, bool, np.number))
+        if series.dtype.kind == 'M':
+            return isinstance(value, (basestring, dt.datetime, np.datetime64))
+        return True
+
+    @staticmethod
+    def _first(values):
+        """ :return: First value of a series, the value itself for single values """
+        return values[0] if isinstance(values, pd.Series) else values
+
+    def _interpret_conditions(self, df, filter_):
+        """
+        Interprets conditions combined by AND (OR) from left to right. Later conditions are only evaluated for rows
+        which haven't been excluded (included) yet, if only a few of these rows are left and the condition is
+        expensive enough to make filtering the dataframe worthwhile.
+        :type filter_: hub.odhql.parser.FilterCombination or hub.odhql.parser.FilterAlternative
+        :return: numpy.ndarray(dtype=numpy.bool_)
+        """
+        conjunction = isinstance(filter_, parser.FilterCombination)
+        mask, conditions = self._interpret_fused(df, filter_.conditions, conjunction)
+        for condition in conditions:
+            if mask is None:
+                mask = np.array(self._interpret_filter(df, condition), dtype=np.bool_)
+                continue
+
+            # rows whose result still depends on this condition
+            pending = mask if conjunction else ~mask
+            count = np.count_nonzero(pending)
+            if not count:
+                break
+
+            cost, positional = plan.CostVisitor.estimate(condition)
+            if positional or cost < self.SHORT_CIRCUIT_COST or count > len(df) * self.SHORT_CIRCUIT_RATIO:
+                result = self._interpret_filter(df, condition)
+                mask = (mask & result) if conjunction else (mask | result)
+            else:
+                pending = pending.copy()
+                mask[pending] = self._interpret_filter(self._filter(df, pending), condition)
+
+        return mask
+
+    def _interpret_fused(self, df, conditions, conjunction):
+        """
+        Evaluates the numeric comparisons among the conditions of an AND/OR at once (see hub.odhql.fusion).
+        :return: Mask for the fused conditions (None if there are none) and the remaining conditions
+        :rtype: (numpy.ndarray, list)
+        """
+        fusable = [c for c in conditions if FusedFilter.compile([c]) is not None]
+        fused = FusedFilter.compile(fusable, conjunction) if len(fusable) > 1 or len(conditions) == 1 else None
+        if fused is None or not len(df):
+            return None, conditions
+
+        mask = fused.evaluate([self._interpret_field(df, field).values for field in fused.fields])
+        if mask is None:
+            return None, conditions
+        return mask, [c for c in conditions if c not in fusable]
+
+    def _interpret_in(self, df, left, in_list):
+        """
+        Checks which values of a series are contained in a list (IN). Literals are looked up in a hash set, other
+        expressions are compared row by row.
+        :type left: OdhSeries
+        :param in_list: List of expressions
+        :return: numpy.ndarray(dtype=numpy.bool_)
+        """
+        literals = [el.value for el in in_list if isinstance(el, parser.LiteralExpression) and el.value is not None]
+        others = [el for el in in_list if not isinstance(el, parser.LiteralExpression)]
+
+        if left.dtype.kind == 'M':
+            # strings are only converted to dates when comparing directly
+            literals, others = [], [el for el in in_list if getattr(el, 'value', True) is not None]
+
+        mask = left.isin(literals).values if literals else np.zeros(len(left), np.bool_)
+        for el in others:
+            mask |= (left == self._interpret_field(df, el)).values
+        return mask
+
+    def _interpret_order(self, df, orders, colnames, stop=None):
         """
-        Sorts the dataframe (ORDER BY) *in place*
+        Determines the order of the rows (ORDER BY). Only the ORDER BY columns are sorted: Each of them is factorized
+        into integer codes in sort order and the permutation is computed from these codes (stable, NULL last).
         :param df: DataFrame to sort
         :param orders: List of OrderByPosition or OrderByAlias or OrderBy
         :param colnames: Column names selected by the user. Required for order by bounds check since the DataFrame
                          also contains non-selected columns (specifically for sorting purposes actually)
-        :return: Sorted DataFrame
+        :param stop: Optional number of rows needed (LIMIT + OFFSET). The following rows may be missing in the result.
+        :return: Positions of the rows in sorted order
+        :rtype: numpy.ndarray
+        """
+        cols = self._order_columns(orders, colnames)
+        ascending = [order.direction == parser.OrderBy.Direction.ascending for order in orders]
+
+        try:
+            series = [df[c] for c in cols]
+        except KeyError as e:
+            raise OdhQLExecutionException('ORDER BY: Column with the name "{}" does not exist'.format(e.message))
+
+        rows = np.arange(len(df))
+        if stop is not None and stop < len(df):
+            mask = self._top_candidates(series[0], ascending[0], stop)
+            if mask is not None:
+                rows = rows[mask]
+
+        keys = []
+        for col, s, asc in zip(cols, series, ascending):
+            try:
+                codes, uniques = pd.factorize(s.values[rows], sort=True)
+            except TypeError:
+                raise OdhQLExecutionException('ORDER BY: Column "{}" can not be sorted'.format(col))
+            null = codes < 0
+            if not asc:
+                codes = len(uniques) - 1 - codes
+            codes[null] = len(uniques)
+            keys.append(codes)
+
+        # np.lexsort sorts by the last key first
+        return rows[np.lexsort(keys[::-1])]
+
+    def _order_columns(self, orders, colnames=None):
+        """
+        :param orders: List of OrderByPosition or OrderByAlias or OrderBy
+        :param colnames: Column names selected by the user. If omitted, only the non-selected columns are returned
+                         (OrderBy on a field of a data source).
+        :return: Names of the columns to sort by
+        :rtype: list
         """
         cols = []
-        ascending = []
-        for i, order in enumerate(orders):
+        for order in orders or []:
             field = order.field
 
             if isinstance(field, parser.OrderByPosition):
+                if colnames is None:
+                    continue
                 try:
                     cols.append(colnames[field.position - 1])
                 except IndexError:
@@ -430,15 +976,50 @@ class OdhQLInterpreter(object):
             elif isinstance(field, parser.Field):
                 cols.append(self._make_name(field.prefix, field.name))
             elif isinstance(field, parser.OrderByAlias):
-                cols.append(field.alias)
+                if colnames is not None:
+                    cols.append(field.alias)
             else:
                 assert False, 'Unknown order by type "{}"'.format(type(field))
 
             assert order.direction in (parser.OrderBy.Direction.ascending, parser.OrderBy.Direction.descending)
-            ascending.append(True if order.direction == parser.OrderBy.Direction.ascending else False)
+
+        return cols
+
+    @classmethod
+    def _top_candidates(cls, series, ascending, n):
+        """
+        Determines the rows which may be among the first n rows after sorting by a series using a partial selection
+        instead of sorting. Rows tied with the n-th row are included (they may be in a different order according to
+        the remaining ORDER BY columns).
+        :type series: pandas.Series
+        :type ascending: bool
+        :type n: int
+        :return: Boolean mask or None if all rows might be needed
+        :rtype: numpy.ndarray
+        """
+        values = series.values
+        if values.dtype.kind in 'iub':
+            keys = values.astype(np.int64)
+            valid = np.ones(len(keys), np.bool_)
+        elif values.dtype.kind == 'M':
+            keys = values.view(np.int64)
+            valid = ~pd.isnull(values)
+        else:
+            keys = values
+            valid = ~pd.isnull(values)
+
+        # nulls are sorted last in either direction
+        candidates = keys[valid]
+        if len(candidates) <= n:
+            return None
 
         try:
-            df.sort(cols, ascending=ascending, inplace=True)
-            return df
-        except KeyError as e:
-            raise OdhQLExecutionException('ORDER BY: Column with the name "{}" does not exist'.format(e.message))
+            if ascending:
+                kth = np.partition(candidates, n - 1)[n - 1]
+                mask = keys <= kth
+            else:
+                kth = np.partition(candidates, len(candidates) - n)[len(candidates) - n]
+                mask = keys >= kth
+        except (TypeError, ValueError):
+            return None  # e.g. partition not supported for this type
+        return np.asarray(mask, np.bool_) & valid
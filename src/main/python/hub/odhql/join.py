@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+"""
+Hash join for the OdhQL interpreter. Join keys are factorized into integer codes and the matching row pairs are
+computed as index arrays, the columns of both sides are only gathered when they are used (see
+hub.odhql.selection).
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+import hub.odhql.ast as ast
+
+logger = logging.getLogger(__name__)
+
+
+class HashJoin(object):
+    """
+    Equi-join of two selections. Unlike DataFrame.merge, NULL keys never match (SQL semantics) and the order of
+    the left rows is preserved (right rows for right joins).
+    """
+
+    @classmethod
+    def join(cls, left, right, left_keys, right_keys, how='inner'):
+        """
+        :type left: hub.odhql.selection.Selection
+        :type right: hub.odhql.selection.Selection
+        :param left_keys: Key values of the left rows (one array per key column)
+        :type left_keys: list of numpy.ndarray
+        :param right_keys: Key values of the right rows, same length as left_keys
+        :type right_keys: list of numpy.ndarray
+        :param how: inner, left, right or outer
+        :return: Selection of the joined rows with the columns of both sides. No values are copied.
+        :rtype: hub.odhql.selection.Selection
+        """
+        left_codes, right_codes = cls.factorize(left_keys, right_keys)
+        left_indexer, right_indexer = cls.indexers(left_codes, right_codes, how)
+        return left.take(left_indexer).join(right.take(right_indexer))
+
+    @classmethod
+    def factorize(cls, left_keys, right_keys):
+        """
+        Maps the keys of both sides to common integer codes. Multiple key columns are combined into a single code.
+        :return: Codes for the left and the right rows, -1 for keys containing NULL
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        n = len(left_keys[0])
+        codes = None
+        for left_values, right_values in zip(left_keys, right_keys):
+            key_codes, uniques = pd.factorize(np.concatenate([np.asarray(left_values), np.asarray(right_values)]))
+            if codes is None:
+                codes = key_codes
+            else:
+                # combine with the previous columns, re-factorize to keep the codes small
+                missing = (codes < 0) | (key_codes < 0)
+                codes = pd.factorize(codes * len(uniques) + key_codes)[0]
+                codes[missing] = -1
+
+        return codes[:n], codes[n:]
+
+    @classmethod
+    def indexers(cls, left_codes, right_codes, how='inner'):
+        """
+        Computes the row pairs of the join.
+        :return: Row positions of the left and the right frame, -1 if there is no matching row (outer joins)
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        if how == 'right':
+            right_indexer, left_indexer = cls.indexers(right_codes, left_codes, 'left')
+            return left_indexer, right_indexer
+
+        if how == 'inner' and len(left_codes) < len(right_codes):
+            # build on the smaller side, then restore the order of the left rows
+            right_indexer, left_indexer = cls._probe(right_codes, left_codes)
+            order = np.argsort(left_indexer, kind='mergesort')
+            return left_indexer[order], right_indexer[order]
+
+        left_indexer, right_indexer = cls._probe(left_codes, right_codes, keep_unmatched=how != 'inner')
+
+        if how == 'outer':
+            unmatched = np.ones(len(right_codes), np.bool_)
+            unmatched[right_indexer[right_indexer >= 0]] = False
+            unmatched = np.flatnonzero(unmatched)
+            left_indexer = np.concatenate([left_indexer, np.full(len(unmatched), -1, np.int64)])
+            right_indexer = np.concatenate([right_indexer, unmatched])
+
+        return left_indexer, right_indexer
+
+    @classmethod
+    def _probe(cls, probe_codes, build_codes, keep_unmatched=False):
+        """
+        Looks up the rows of the build side for each row of the probe side. The "hash table" consists of the build
+        rows ordered by code and the position of the first row for each code.
+        :param keep_unmatched: Whether probe rows without a match are returned (paired with -1)
+        :return: Row positions of the probe side (in order) and the matching rows of the build side
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        size = max(probe_codes.max() if len(probe_codes) else -1, build_codes.max() if len(build_codes) else -1) + 2
+
+        # shift by one, so that NULL keys (-1) get their own (empty) bucket
+        build_rows = np.argsort(build_codes, kind='mergesort')
+        counts = np.bincount(build_codes + 1, minlength=size)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        counts[0] = 0
+
+        matches = counts[probe_codes + 1]
+        unmatched = matches == 0
+        repeats = np.where(unmatched, 1, matches) if keep_unmatched else matches
+
+        probe_indexer = np.repeat(np.arange(len(probe_codes), dtype=np.int64), repeats)
+
+        # position of each output row within the group of its probe row
+        offsets = np.arange(len(probe_indexer), dtype=np.int64) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        positions = np.repeat(starts[probe_codes + 1], repeats) + offsets
+
+        missing = np.repeat(unmatched, repeats)
+        positions[missing] = 0
+        build_indexer = build_rows[positions] if len(build_rows) else np.zeros(len(positions), np.int64)
+        build_indexer[missing] = -1
+
+        return probe_indexer, build_indexer
+
+
+class JoinOrder(object):
+    """
+    Chooses the order of inner joins, so that the intermediate results stay small. The size of a join is estimated
+    from the number of rows of both sides and the number of distinct values of the join keys:
+    |A join B| = |A| * |B| / max(distinct(A.key), distinct(B.key))
+    """
+
+    # max. number of rows used to estimate the number of distinct values of a column
+    SAMPLE_SIZE = 10000
+
+    @classmethod
+    def distinct(cls, values):
+        """
+        Estimates the number of distinct values. Large columns are sampled: If (almost) all values of the sample are
+        distinct, the column is assumed to be unique, otherwise the sample is assumed to contain all values.
+        :type values: numpy.ndarray
+        :rtype: int
+        """
+        n = len(values)
+        sample = values[::n // cls.SAMPLE_SIZE] if n > cls.SAMPLE_SIZE else values
+        try:
+            d = len(pd.unique(sample))
+        except TypeError:  # unhashable values, e.g. geometries
+            return n
+        return d * n // len(sample) if n > len(sample) and d > 0.9 * len(sample) else d
+
+    @classmethod
+    def reorder(cls, data_sources, predicates, dfs):
+        """
+        Greedily builds a join order starting from each data source, always joining the data source next which
+        yields the smallest intermediate result. The best of these orders is used if it is estimated to be cheaper
+        (sum of the intermediate result sizes) than the given order.
+        :param data_sources: Data sources of a query (inner joins only)
+        :param predicates: Conditions of the joins, see hub.odhql.plan.SelectPlan._join_predicates
+        :param dfs: Prepared dataframes by alias
+        :return: Data sources in the order in which they should be joined
+        :rtype: list of hub.odhql.ast.DataSource
+        """
+        aliases = [ds.alias for ds in data_sources]
+        rows = {alias: len(dfs[alias]) for alias in aliases}
+
+        distinct = {}
+        for p in predicates:
+            for alias in p.aliases:
+                expression = p.side(alias)
+                name = '{}.{}'.format(alias.lower(), getattr(expression, 'name', '').lower())
+                if isinstance(expression, ast.Field) and name in dfs[alias]:
+                    distinct[p, alias] = max(cls.distinct(dfs[alias][name].values), 1)
+                else:
+                    distinct[p, alias] = max(rows[alias], 1)  # unknown, assume unique values
+
+        def applicable(joined, alias):
+            return [p for p in predicates if alias in p.aliases and p.aliases - {alias} <= joined]
+
+        def extend(joined, size, alias):
+            """ :return: Estimated size after joining `alias` to `joined` or None if there is no condition """
+            conditions = applicable(joined, alias)
+            if not conditions:
+                return None
+
+            result = size * rows[alias]
+            for p in conditions:
+                other, = p.aliases - {alias}
+                result /= max(min(distinct[p, other], size), min(distinct[p, alias], rows[alias]), 1)
+            return result
+
+        def cost(order):
+            joined, size, total = {order[0]}, float(rows[order[0]]), 0.0
+            for alias in order[1:]:
+                size = extend(joined, size, alias)
+                if size is None:
+                    return None
+                joined.add(alias)
+                total += size
+            return total
+
+        given_cost = cost(aliases)
+        best, best_cost = aliases, given_cost
+        for first in aliases:
+            order, joined, size = [first], {first}, float(rows[first])
+            while len(order) < len(aliases):
+                candidates = [(extend(joined, size, alias), i, alias) for i, alias in enumerate(aliases)
+                              if alias not in joined]
+                candidates = [c for c in candidates if c[0] is not None]
+                if not candidates:
+                    break
+                size, _, alias = min(candidates)
+                order.append(alias)
+                joined.add(alias)
+
+            order_cost = cost(order) if len(order) == len(aliases) else None
+            if order_cost is not None and (best_cost is None or order_cost < best_cost):
+                best, best_cost = order, order_cost
+
+        logger.debug('Join order %s (estimated cost %s, given order %s: %s)', best, best_cost, aliases, given_cost)
+        if best == aliases:
+            return data_sources
+
+        names = {ds.alias: ds.name for ds in data_sources}
+        reordered = [ast.DataSource(names[best[0]], best[0])]
+        for i, alias in enumerate(best[1:], 1):
+            conditions = [p.condition for p in applicable(set(best[:i]), alias)]
+            reordered.append(ast.JoinedDataSource(names[alias], alias, ast.JoinedDataSource.JoinType.inner,
+                                                  ast.JoinConditionList(conditions)))
+        return reordered
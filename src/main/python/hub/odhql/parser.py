@@ -14,7 +14,8 @@ from pyparsing import delimitedList
 from hub.odhql.ast import LiteralExpression, Field, CaseRule, CaseExpression, AliasedExpression, Function
 from hub.odhql.ast import BinaryCondition, InCondition, IsNullCondition, PredicateCondition, FilterCombination
 from hub.odhql.ast import FilterAlternative, DataSource, JoinCondition, JoinConditionList, JoinedDataSource
-from hub.odhql.ast import OrderByPosition, OrderByAlias, OrderBy, Query, Union
+from hub.odhql.ast import OrderByPosition, OrderByAlias, OrderBy, Query, Union, Explain, AggregateFunction
+from hub.odhql.ast import TableSample
 from opendatahub.utils.doc import DocMixin
 
 
@@ -34,25 +35,30 @@ class OdhQLParser(DocMixin):
     Description in BNF (as used by the diagram generator at http://bottlecaps.de/rr/ui):
 
     ---------------------------------------------------------------------------
-    UnionQuery ::= Query ( "union" Query )* ( OrderByList )?
-    Query ::= FieldSelectionList DataSourceSelectionList ( FilterList )?
+    Statement ::= ( "explain" ( "analyze" )? )? UnionQuery
+    UnionQuery ::= Query ( "union" Query )* ( OrderByList )? ( "limit" Integer )? ( "offset" Integer )?
+    Query ::= FieldSelectionList DataSourceSelectionList ( FilterList )? ( GroupByList )?
 
-    FieldSelectionList ::= "select" FieldSelection ( "," FieldSelection )*
+    FieldSelectionList ::= "select" ( "distinct" )? FieldSelection ( "," FieldSelection )*
     FieldSelection ::= Field | Expression "as" Alias
 
     CaseExpression ::= "case" ( "when" Condition "then" Expression )+  ( "else" Expression )? "end"
 
-    Expression ::= Function | LiteralExpression | Field | CaseExpression
+    Expression ::= Function | AggregateFunction | LiteralExpression | Field | CaseExpression
 
     Function ::= Identifier "(" ( FunctionArgumentList )? ")"
     FunctionArgumentList ::= Expression ( ( "," Expression )* )?
 
+    AggregateFunction ::= ( "count" | "sum" | "min" | "max" | "avg" ) "(" ( "*" | ( "distinct" )? Expression ) ")"
+
     Field ::= DataSourceNameOrAlias "." FieldName
 
     DataSourceNameOrAlias ::= DataSourceName | Alias
 
-    DataSourceSelectionList ::= "from" DataSourceName ( "as"? Alias )? ( JoinDefinition )*
-    JoinDefinition ::= ("left" | "right" | "full" )? "join" DataSourceName ( "as"? Alias )? "on" JoinCondition
+    DataSourceSelectionList ::= "from" DataSourceName ( "as"? Alias )? ( TableSample )? ( JoinDefinition )*
+    JoinDefinition ::= ("left" | "right" | "full" )? "join" DataSourceName ( "as"? Alias )? ( TableSample )? "on"
+                       JoinCondition
+    TableSample ::= "tablesample" "(" Number ( "rows" | "percent" ) ")" ( "repeatable" "(" Integer ")" )?
     JoinCondition ::= SingleJoinCondition | "(" SingleJoinCondition ( "and" SingleJoinCondition )* ")"
     SingleJoinCondition ::= Expression "=" Expression
 
@@ -68,6 +74,8 @@ class OdhQLParser(DocMixin):
     IsNullCondition ::= Field "is" ( "not" )? Null
     PredicateCondition ::= ( "not" )? Function
 
+    GroupByList ::= "group" "by" Expression ( "," Expression )*
+
     OrderByList ::= "order" "by" OrderByField ( "," OrderByField )*
     OrderByField ::= ( Field | Alias | Position) ( "asc" | "desc" )?
     Integer ::= ( "0" | "1" | "2" | "3" | "4" | "5" | "6" | "7" | "8" | "9" )+
@@ -104,18 +112,23 @@ class OdhQLParser(DocMixin):
 
     Eine Abfrage besteht aus folgenden Teilen:
 
-    * Eine Liste von Feldern oder Ausdrücken, welche im Resultat erscheinen sollen
+    * Eine Liste von Feldern oder Ausdrücken, welche im Resultat erscheinen sollen. Mit `SELECT DISTINCT` werden
+      doppelte Zeilen entfernt.
 
     * Eine Liste von Datenquellen
 
     * Optional eine Liste von Filter-Ausdrücken
 
+    * Optional eine Gruppierungs-Klausel
+
     * Optional eine Sortier-Klausel
 
+    * Optional eine Beschränkung der Anzahl Zeilen
+
     Gross- und Kleinschreibung wird nicht beachtet.
 
-    Mehrere Abfragen können kombiniert werden mithilfe von Union. In diesem Fall ist nur eine Sortier-Klausel am Ende
-    der kombinierten Abfrage erlaubt.
+    Mehrere Abfragen können kombiniert werden mithilfe von Union. In diesem Fall ist nur eine Sortier-Klausel und
+    Beschränkung am Ende der kombinierten Abfrage erlaubt.
 
     .. code:: sql
 
@@ -217,6 +230,15 @@ class OdhQLParser(DocMixin):
                 FROM ODH12 AS employees
                 FULL JOIN ODH13 AS employers ON employees.employer_id = employers.id
 
+    Mit `TABLESAMPLE` wird nur eine Stichprobe der Zeilen einer Datenquelle verwendet, entweder eine feste Anzahl
+    Zeilen (`ROWS`) oder ein Anteil (`PERCENT`). Die Zeilen werden zufällig, aber reproduzierbar ausgewählt: Dieselbe
+    Abfrage liefert immer dieselben Zeilen. Mit `REPEATABLE` kann eine andere Stichprobe gewählt werden.
+
+    .. code:: sql
+
+        FROM ODH12 AS employees TABLESAMPLE (1000 ROWS)
+        JOIN ODH13 AS employers TABLESAMPLE (10 PERCENT) REPEATABLE (42) ON employees.employer_id = employers.id
+
     Filter
     ------
 
@@ -232,8 +254,13 @@ class OdhQLParser(DocMixin):
         <, >, <=, >=, =, !=
             Vergleicht zwei Ausdrücke miteinander.
         `like`, `not like`
-            Prüft ob ein Ausdruck einem Muster entspricht. Verwendet wird dazu ein Regulärer Ausdruck mit
-            `Python Syntax <https://docs.python.org/2/library/re.html#regular-expression-syntax>`_.
+            Prüft ob ein Ausdruck einem Muster entspricht (SQL-Syntax). Das Muster muss auf den ganzen Text passen:
+            `%` steht für eine beliebige Zeichenfolge, `_` für genau ein Zeichen. Mit einem Backslash ('\')
+            können `%`, `_` und '\' selbst gesucht werden. Für Reguläre Ausdrücke steht die Funktion CONTAINS zur
+            Verfügung.
+            .. code:: sql
+
+                name LIKE 'Z_rich%'
         Prädikat
             Eine Funktion, welche ein boolsches Resultat liefert kann direkt als Bedingung verwendet werden.
 
@@ -244,6 +271,35 @@ class OdhQLParser(DocMixin):
         WHERE t.a IS NOT NULL
           AND (t.b IN (1, 2, 3) OR t.b > 20)
 
+    Gruppierung (Group By)
+    ----------------------
+
+    Mit `GROUP BY` werden alle Zeilen mit den gleichen Werten der angegebenen Felder oder Ausdrücke zu einer Zeile
+    zusammengefasst. Felder, welche nicht gruppiert werden, können nur in Aggregat-Funktionen verwendet werden:
+
+        COUNT(*)
+            Anzahl Zeilen
+
+        COUNT(Ausdruck), COUNT(DISTINCT Ausdruck)
+            Anzahl Werte, welche nicht NULL sind bzw. Anzahl verschiedener Werte
+
+        SUM(Ausdruck), AVG(Ausdruck)
+            Summe bzw. Durchschnitt (nur für Zahlen)
+
+        MIN(Ausdruck), MAX(Ausdruck)
+            Kleinster bzw. grösster Wert
+
+    NULL-Werte werden ignoriert. Mit `DISTINCT` werden gleiche Werte nur einmal berücksichtigt. Werden
+    Aggregat-Funktionen ohne `GROUP BY` verwendet, so besteht das Resultat aus einer einzigen Zeile. In
+    Filter-Ausdrücken sind Aggregat-Funktionen nicht erlaubt.
+
+    .. code:: sql
+
+        SELECT t.gemeinde, COUNT(*) AS anzahl, AVG(t.einwohner) AS einwohner
+        FROM ODH4 AS t
+        WHERE t.jahr = 2015
+        GROUP BY t.gemeinde
+
     Sortier-Klausel
     ---------------
 
@@ -253,6 +309,17 @@ class OdhQLParser(DocMixin):
 
         ORDER BY 1, ODH4.name DESC, surname ASC
 
+    Beschränkung (Limit)
+    --------------------
+
+    Mit `LIMIT` kann die Anzahl Zeilen im Resultat beschränkt werden, mit `OFFSET` werden die ersten Zeilen
+    übersprungen. Beide sind optional. Ohne Sortier-Klausel ist nicht festgelegt, welche Zeilen geliefert werden.
+
+    .. code:: sql
+
+        ORDER BY ODH4.name
+        LIMIT 10 OFFSET 20
+
     Union
     -----
 
@@ -264,6 +331,19 @@ class OdhQLParser(DocMixin):
 
     Als Feld-Namen werden im Resultat die Feld-Namen der ersten Abfrage verwendet.
 
+    Explain
+    -------
+
+    Wird einer Abfrage `EXPLAIN` vorangestellt, so wird anstelle des Resultats beschrieben, in welchen Schritten die
+    Abfrage ausgeführt wird (Laden der Datenquellen, Joins, Filter, Funktionen, Union und Sortierung). Mit
+    `EXPLAIN ANALYZE` wird die Abfrage ausgeführt und für jeden Schritt die benötigte Zeit, die Anzahl Zeilen vorher und
+    nachher, die Grösse des Resultats in Bytes sowie die Anzahl Cache-Treffer angegeben.
+
+    .. code:: sql
+
+        EXPLAIN ANALYZE
+        SELECT t.name FROM ODH4 AS t WHERE t.name LIKE 'Z%'
+
     Datentypen
     ==========
 
@@ -343,7 +423,12 @@ class OdhQLParser(DocMixin):
 
         function = Forward()
 
-        expression <<= (literal_expression | case_expression | field | function)
+        # aggregate functions take a single argument: COUNT(a, b) is the function COUNT
+        aggregate_function = ((CK('count') | CK('sum') | CK('min') | CK('max') | CK('avg'))('name') + '(' +
+                              (Literal('*')('star') | Optional(CK('distinct'))('distinct') + expression('arg')) + ')')
+        aggregate_function.setParseAction(AggregateFunction.parse)
+
+        expression <<= (literal_expression | case_expression | field | aggregate_function | function)
 
         aliased_expression = (field('field') + Optional(alias)) | (expression('expression') + alias)
         aliased_expression.setParseAction(AliasedExpression.parse)
@@ -379,9 +464,14 @@ class OdhQLParser(DocMixin):
         # 'as' is optional here in sql - let's do that too
         data_source_alias_blacklist = NotAny(
             CK('join') | CK('left') | CK('right') | CK('full') | CK('inner') | CK('outer') | CK(
-                'on') | CK('where') | CK('union') | CK('order'))
+                'on') | CK('where') | CK('group') | CK('union') | CK('order') | CK('limit') | CK('offset') |
+            CK('tablesample'))
+        table_sample = (Suppress(CK('tablesample')) + Suppress('(') + Combine(Word(nums) + Optional('.' + Word(nums)))(
+            'size') + (CK('rows') | CK('percent'))('unit') + Suppress(')') +
+            Optional(Suppress(CK('repeatable')) + Suppress('(') + Word(nums)('seed') + Suppress(')')))
+        table_sample.setParseAction(TableSample.parse)
         data_source = (identifier('name') + Optional(data_source_alias_blacklist + Optional(CK('as')) +
-                                                     identifier('alias')))
+                                                     identifier('alias')) + Optional(table_sample('sample')))
         data_source.setParseAction(DataSource.parse)
 
         join_single_condition = expression('left') + '=' + expression('right')
@@ -410,21 +500,29 @@ class OdhQLParser(DocMixin):
         order_by_field = (order_by_field_equiv('field') + Optional(Or([CK('asc'), CK('desc')]))('direction'))
         order_by_field.setParseAction(OrderBy.parse)
 
-        field_declaration_list = Suppress(CK('select')) + delimitedList(aliased_expression)
+        field_declaration_list = delimitedList(aliased_expression)
         data_source_declaration = Suppress(CK('from')) + data_source + ZeroOrMore(join)
         filter_declaration = Suppress(CK('where')) + filter_alternative.copy()('conditions')
         order_by_declaration = (Suppress(CK('order') + CK('by')) + delimitedList(order_by_field, delim=',')('fields'))
         order_by_declaration.setParseAction(Query.parse_order_by)
+        group_by_declaration = Suppress(CK('group') + CK('by')) + Group(delimitedList(expression))
 
-        query = (field_declaration_list('fields') + data_source_declaration('datasources') +
-                 Optional(filter_declaration('filter')))
+        query = (Suppress(CK('select')) + Optional(CK('distinct'))('distinct') + field_declaration_list('fields') +
+                 data_source_declaration('datasources') +
+                 Optional(filter_declaration('filter')) + Optional(group_by_declaration('group')))
         query.setParseAction(Query.parse)
 
+        limit_declaration = Suppress(CK('limit')) + Word(nums)('limit')
+        offset_declaration = Suppress(CK('offset')) + Word(nums)('offset')
+
         union_query = (delimitedList(query, delim=CK('union'))('queries') + Optional(order_by_declaration)('sort') +
-                       StringEnd())
+                       Optional(limit_declaration) + Optional(offset_declaration) + StringEnd())
         union_query.setParseAction(Union.parse)
 
-        cls.grammar = union_query
+        explain = Suppress(CK('explain')) + Optional(CK('analyze'))('analyze') + union_query('statement')
+        explain.setParseAction(Explain.parse)
+
+        cls.grammar = explain | union_query
 
         return cls.grammar
 
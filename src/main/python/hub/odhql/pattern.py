@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+"""
+Text patterns for the OdhQL interpreter and string functions: SQL LIKE patterns and regular expressions. Patterns
+without metacharacters are matched using plain string operations (equality, prefix, suffix or substring search),
+compiled regular expressions are cached.
+"""
+
+import collections
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from hub.structures.frame import OdhSeries
+
+
+class Pattern(object):
+    """ Compiled text pattern. Use the factory methods (like, search, prefix, suffix) to create one. """
+
+    EQUALS = 'equals'
+    PREFIX = 'prefix'
+    SUFFIX = 'suffix'
+    SUBSTRING = 'substring'
+    REGEX = 'regex'
+
+    # max. number of compiled regular expressions kept in the process-wide cache
+    CACHE_SIZE = 256
+
+    _regexes = collections.OrderedDict()
+    _lock = threading.Lock()
+
+    REGEX_META_RE = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+    # wildcards of LIKE patterns
+    ANY_STRING = ('%',)
+    ANY_CHAR = ('_',)
+    LIKE_TOKEN_RE = re.compile(r'\\(.)|(%)|(_)|([^\\%_]+)|(\\)$', re.DOTALL)
+
+    def __init__(self, kind, text=None, regex=None, case=True):
+        """
+        :param kind: Pattern.EQUALS, PREFIX, SUFFIX, SUBSTRING or REGEX
+        :param text: Text to look for (all kinds but REGEX)
+        :param regex: Compiled regular expression (REGEX only). Matches if found anywhere (re.search).
+        :param case: Whether the case of the text matters
+        """
+        self.kind = kind
+        self.case = case
+        self.text = text if case or text is None else text.lower()
+        self.regex = regex
+
+    @classmethod
+    def compile(cls, pattern, flags=0):
+        """
+        Compiles a regular expression. The most recently used expressions are cached (LRU).
+        :rtype: re.RegexObject
+        """
+        key = (pattern, flags)
+        with cls._lock:
+            regex = cls._regexes.pop(key, None)
+            if regex is not None:
+                cls._regexes[key] = regex
+                return regex
+
+        regex = re.compile(pattern, flags)
+        with cls._lock:
+            cls._regexes[key] = regex
+            while len(cls._regexes) > cls.CACHE_SIZE:
+                cls._regexes.popitem(last=False)
+        return regex
+
+    @classmethod
+    def like(cls, pattern):
+        """
+        SQL LIKE pattern, which has to match the whole text: % stands for any number of characters, _ for exactly one
+        character. Use a backslash to match a literal %, _ or \\.
+        :rtype: Pattern
+        """
+        parts = []  # literal texts and the wildcards ANY_STRING, ANY_CHAR
+        for escaped, percent, underscore, text, backslash in cls.LIKE_TOKEN_RE.findall(pattern):
+            if percent or underscore:
+                parts.append(cls.ANY_STRING if percent else cls.ANY_CHAR)
+            elif parts and isinstance(parts[-1], basestring):
+                parts[-1] += escaped or text or backslash
+            else:
+                parts.append(escaped or text or backslash)
+
+        literals = [p for p in parts if isinstance(p, basestring)]
+        if cls.ANY_CHAR not in parts and len(literals) <= 1:
+            text = literals[0] if literals else ''
+            kind = {(): cls.EQUALS, (True,): cls.EQUALS, (False,): cls.PREFIX, (True, False): cls.PREFIX,
+                    (False, True): cls.SUFFIX, (False, True, False): cls.SUBSTRING}.get(
+                tuple(isinstance(p, basestring) for p in parts))
+            if kind:
+                return cls(kind, text)
+
+        regex = ''.join('.*' if p == cls.ANY_STRING else '.' if p == cls.ANY_CHAR else re.escape(p) for p in parts)
+        return cls(cls.REGEX, regex=cls.compile('^{}\\Z'.format(regex), re.DOTALL))
+
+    @classmethod
+    def search(cls, pattern, case=True):
+        """
+        Regular expression, which matches if it is found anywhere in the text.
+        :param case: Whether the case of the text matters
+        :rtype: Pattern
+        """
+        if not cls.REGEX_META_RE.search(pattern):
+            return cls(cls.SUBSTRING, pattern, case=case)
+        if pattern.startswith('^') and not cls.REGEX_META_RE.search(pattern[1:]):
+            return cls(cls.PREFIX, pattern[1:], case=case)
+        return cls(cls.REGEX, regex=cls.compile(pattern, 0 if case else re.IGNORECASE), case=case)
+
+    @classmethod
+    def prefix(cls, text):
+        """ :rtype: Pattern """
+        return cls(cls.PREFIX, text)
+
+    @classmethod
+    def suffix(cls, text):
+        """ :rtype: Pattern """
+        return cls(cls.SUFFIX, text)
+
+    @property
+    def is_literal(self):
+        return self.kind != self.REGEX
+
+    def _prepare(self, value):
+        return value if self.case else value.lower()
+
+    def match(self, value):
+        """
+        :type value: unicode
+        :rtype: bool
+        """
+        if self.kind == self.REGEX:
+            return self.regex.search(value) is not None
+
+        value = self._prepare(value)
+        if self.kind == self.EQUALS:
+            return value == self.text
+        elif self.kind == self.PREFIX:
+            return value.startswith(self.text)
+        elif self.kind == self.SUFFIX:
+            return value.endswith(self.text)
+        return self.text in value
+
+    def matches(self, strings, na=np.nan):
+        """
+        :type strings: pandas.Series
+        :param na: Result for NULL values
+        :return: Whether each value matches the pattern
+        :rtype: OdhSeries
+        """
+        return self.map(strings, self.match, np.bool_, na)
+
+    def count(self, strings):
+        """
+        :return: Number of (non-overlapping) occurrences in each value
+        :rtype: OdhSeries
+        """
+        if self.kind == self.SUBSTRING and self.text:
+            return self.map(strings, lambda v: self._prepare(v).count(self.text), np.int64)
+        regex = self.to_regex()
+        return self.map(strings, lambda v: len(regex.findall(v)), np.int64)
+
+    def sub(self, strings, replace):
+        """
+        Replaces all occurrences in each value. Backreferences in `replace` are only supported for regular
+        expressions, for the other kinds it is inserted literally.
+        :rtype: OdhSeries
+        """
+        if self.kind == self.REGEX:
+            return self.map(strings, lambda v: self.regex.sub(replace, v), object)
+        if self.case:
+            return self.map(strings, lambda v: v.replace(self.text, replace), object)
+        regex = self.to_regex()
+        return self.map(strings, lambda v: regex.sub(lambda m: replace, v), object)
+
+    def to_regex(self):
+        """
+        :return: Regular expression equivalent to the pattern
+        :rtype: re.RegexObject
+        """
+        if self.kind == self.REGEX:
+            return self.regex
+
+        source = {self.EQUALS: '^{}\\Z', self.PREFIX: '^{}', self.SUFFIX: '{}\\Z'}.get(self.kind, '{}')
+        return self.compile(source.format(re.escape(self.text)), 0 if self.case else re.IGNORECASE)
+
+    @staticmethod
+    def map(strings, func, dtype, na=np.nan):
+        """
+        Applies a function to each value which is not NULL.
+        :type strings: pandas.Series
+        :param dtype: dtype of the results
+        :param na: Result for NULL values. If it is NaN, the result has dtype object (unless dtype is a float type).
+        :rtype: OdhSeries
+        """
+        values = strings.values
+        valid = pd.notnull(values)
+        if valid.all():
+            if dtype is object:
+                result = np.empty(len(values), dtype=object)
+                result[:] = [func(v) for v in values]
+            else:
+                result = np.fromiter((func(v) for v in values), dtype=dtype, count=len(values))
+        else:
+            null_dtype = object if pd.isnull(na) and np.dtype(dtype).kind != 'f' else dtype
+            result = np.full(len(values), na, dtype=null_dtype)
+            result[valid] = [func(v) for v in values[valid]]
+        return OdhSeries(result, index=strings.index)
@@ -0,0 +1,752 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+"""
+Execution plans for ODHQL statements. A plan is built once from the AST produced by the parser and contains everything
+the interpreter can determine without looking at the data (referenced columns, filters to push down, ...). Plans do not
+depend on the data and can therefore be cached and executed any number of times.
+"""
+
+import collections
+import copy
+import itertools
+import operator
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+import hub.odhql.ast as ast
+import hub.odhql.functions as functions
+from hub.odhql.exceptions import OdhQLExecutionException
+
+
+class PrefixVisitor(object):
+    """ Collects the table prefixes and columns referenced by an AST (sub-)tree. """
+
+    def __init__(self):
+        self.prefixes = set()
+        self.columns = collections.defaultdict(set)
+        self.positional = False
+
+    def visit(self, o):
+        if isinstance(o, ast.Field):
+            self.prefixes.add(o.prefix)
+            self.columns[o.prefix.lower()].add(o.name.lower())
+        elif isinstance(o, ast.Function):
+            self.positional |= functions.is_positional(o.name)
+
+
+class ExpressionVisitor(object):
+    """ Counts the occurrences of structurally identical function calls and CASE expressions. """
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.nodes = {}
+
+    def visit(self, o):
+        if isinstance(o, (ast.Function, ast.CaseExpression)):
+            key = o.key()
+            self.counts[key] += 1
+            self.nodes.setdefault(key, o)
+
+
+class AggregateVisitor(object):
+    """ Collects the (structurally distinct) aggregate function calls of an AST (sub-)tree. """
+
+    def __init__(self):
+        self.aggregates = collections.OrderedDict()
+
+    def visit(self, o):
+        if isinstance(o, ast.AggregateFunction):
+            self.aggregates.setdefault(o.key(), o)
+
+    @classmethod
+    def collect(cls, *nodes):
+        """
+        :return: Aggregate function calls by structural key
+        :rtype: collections.OrderedDict
+        """
+        visitor = cls()
+        for node in nodes:
+            if node is not None:
+                node.accept(visitor)
+        return visitor.aggregates
+
+
+class CostVisitor(object):
+    """ Estimates the relative cost of evaluating an AST (sub-)tree per row. """
+
+    FUNCTION = 10
+    CASE = 5
+    LIKE = 5
+    CONDITION = 1
+
+    def __init__(self):
+        self.cost = 0
+        self.positional = False
+
+    def visit(self, o):
+        if isinstance(o, ast.Function):
+            self.cost += self.FUNCTION
+            self.positional |= functions.is_positional(o.name)
+        elif isinstance(o, ast.CaseExpression):
+            self.cost += self.CASE
+        elif isinstance(o, ast.BinaryCondition) and o.operator in (ast.BinaryCondition.Operator.like,
+                                                                   ast.BinaryCondition.Operator.not_like):
+            self.cost += self.LIKE
+        elif isinstance(o, (ast.BinaryCondition, ast.InCondition, ast.IsNullCondition, ast.PredicateCondition)):
+            self.cost += self.CONDITION
+
+    @classmethod
+    def estimate(cls, node):
+        """
+        :return: Cost of the node and whether it contains positional functions
+        :rtype: (int, bool)
+        """
+        visitor = cls()
+        node.accept(visitor)
+        return visitor.cost, visitor.positional
+
+    @classmethod
+    def order(cls, conditions):
+        """
+        Sorts conditions combined by AND or OR (recursively) so that the cheapest ones are evaluated first. Their
+        order does not matter for the result.
+        :type conditions: list
+        :rtype: list
+        """
+        for c in conditions:
+            if isinstance(c, ast.FilterListBase):
+                c.conditions = cls.order(c.conditions)
+        return sorted(conditions, key=lambda c: cls.estimate(c)[0])
+
+
+class ConstantFolder(object):
+    """
+    Evaluates the literal-only parts of a query once while planning instead of for every row: Function calls with only
+    literal arguments are replaced by their result, conditions between literals by a constant TRUE or FALSE and filter
+    lists/CASE rules are simplified accordingly.
+
+    Anything which can not be evaluated safely (errors, nulls, types without a literal representation, comparisons
+    between different types) is left alone and evaluated during execution as usual.
+    """
+
+    OPERATORS = {
+        ast.BinaryCondition.Operator.equals: operator.eq,
+        ast.BinaryCondition.Operator.not_equals: operator.ne,
+        ast.BinaryCondition.Operator.less: operator.lt,
+        ast.BinaryCondition.Operator.less_or_equal: operator.le,
+        ast.BinaryCondition.Operator.greater: operator.gt,
+        ast.BinaryCondition.Operator.greater_or_equal: operator.ge,
+    }
+
+    # results of these types are folded into plain python values, other numeric types keep their numpy type so that
+    # the type of the expanded column stays the same (e.g. INTEGER instead of BIGINT)
+    NATIVE_DTYPES = np.dtype(np.int64), np.dtype(np.float64), np.dtype(np.bool_)
+
+    @classmethod
+    def constant(cls, value):
+        """ :return: Condition which is always true or always false """
+        return ast.PredicateCondition(ast.LiteralExpression(bool(value)), False)
+
+    @classmethod
+    def truth(cls, condition):
+        """ :return: True or False for constant conditions, None otherwise """
+        if (isinstance(condition, ast.PredicateCondition) and isinstance(condition.predicate, ast.LiteralExpression)
+                and isinstance(condition.predicate.value, bool)):
+            return condition.predicate.value != bool(condition.invert)
+
+    @classmethod
+    def fold_query(cls, query):
+        """
+        Folds all expressions and conditions of a query *in place*
+        :type query: hub.odhql.ast.Query
+        """
+        for f in query.fields:
+            f.expression = cls.fold_expression(f.expression)
+
+        for ds in query.data_sources:
+            if isinstance(ds, ast.JoinedDataSource):
+                cond = ds.condition
+                for c in cond.conditions if isinstance(cond, ast.JoinConditionList) else (cond,):
+                    c.left, c.right = cls.fold_expression(c.left), cls.fold_expression(c.right)
+
+        if query.filter_definitions is not None:
+            filter_ = cls.fold_condition(query.filter_definitions)
+            if cls.truth(filter_) is True:
+                query.filter_definitions = None
+            else:
+                query.filter_definitions = filter_ if isinstance(filter_, ast.FilterListBase) else \
+                    ast.FilterCombination([filter_])
+
+    @classmethod
+    def fold_expression(cls, expression):
+        """
+        :return: The folded expression (may be the same object)
+        """
+        if isinstance(expression, ast.Function):
+            expression.args = [cls.fold_expression(arg) for arg in expression.args]
+            if (all(isinstance(arg, ast.LiteralExpression) for arg in expression.args)
+                    and not functions.is_positional(expression.name)):
+                return cls._evaluate(expression)
+
+        elif isinstance(expression, ast.CaseExpression):
+            rules = []
+            for rule in expression.rules:
+                condition = cls.fold_condition(rule.condition) if rule.condition else None
+                truth = cls.truth(condition) if condition else True
+                if truth is False:
+                    continue
+                rules.append(ast.CaseRule(None if truth else condition, cls.fold_expression(rule.expression)))
+                if truth:
+                    break  # never get past this rule
+
+            if len(rules) == 1 and rules[0].condition is None:
+                return rules[0].expression
+            expression.rules = rules
+
+        return expression
+
+    @classmethod
+    def fold_condition(cls, condition):
+        """
+        :return: The folded condition (may be the same object)
+        """
+        if isinstance(condition, ast.FilterListBase):
+            # TRUE has no effect in an AND combination and decides an OR alternative, FALSE the other way around
+            neutral = isinstance(condition, ast.FilterCombination)
+            conditions = [c for c in (cls.fold_condition(c) for c in condition.conditions)
+                          if cls.truth(c) is not neutral]
+            if any(cls.truth(c) is (not neutral) for c in conditions):
+                return cls.constant(not neutral)
+            if not conditions:
+                return cls.constant(neutral)
+            condition.conditions = conditions
+
+        elif isinstance(condition, ast.BinaryCondition):
+            condition.left = cls.fold_expression(condition.left)
+            condition.right = cls.fold_expression(condition.right)
+            op = cls.OPERATORS.get(condition.operator)
+            if op and cls._comparable(condition.left, condition.right):
+                return cls.constant(op(condition.left.value, condition.right.value))
+
+        elif isinstance(condition, ast.InCondition):
+            condition.left = cls.fold_expression(condition.left)
+            condition.in_list = [cls.fold_expression(item) for item in condition.in_list]
+            if all(cls._comparable(condition.left, item) for item in condition.in_list):
+                found = any(condition.left.value == item.value for item in condition.in_list)
+                return cls.constant(found != bool(condition.invert))
+
+        elif isinstance(condition, ast.PredicateCondition):
+            condition.predicate = cls.fold_expression(condition.predicate)
+            predicate = condition.predicate
+            if isinstance(predicate, ast.LiteralExpression) and isinstance(predicate.value, (bool, np.bool_)):
+                return cls.constant(bool(predicate.value) != bool(condition.invert))
+
+        return condition
+
+    @classmethod
+    def _comparable(cls, left, right):
+        """ :return: True if both sides are literals which compare the same way in python as in a column """
+        if not (isinstance(left, ast.LiteralExpression) and isinstance(right, ast.LiteralExpression)):
+            return False
+
+        a, b = left.value, right.value
+        if isinstance(a, basestring) and isinstance(b, basestring):
+            return True
+        numbers = (int, long, float, np.integer, np.floating)
+        return isinstance(a, numbers) and isinstance(b, numbers) and not isinstance(a, bool) and not isinstance(b, bool)
+
+    @classmethod
+    def _evaluate(cls, function):
+        """
+        Executes a function with literal arguments for a single row
+        :type function: hub.odhql.ast.Function
+        :return: LiteralExpression with the result or the function itself if it can't be folded
+        """
+        try:
+            result = functions.execute(function.name, 1, [arg.value for arg in function.args])
+        except Exception:
+            return function  # report errors when actually executing the query
+
+        if not isinstance(result, pd.Series) or len(result) != 1:
+            return function
+
+        value = result.iat[0]
+        if result.dtype == np.object_ and isinstance(value, basestring):
+            return ast.LiteralExpression(value)
+        if result.dtype in cls.NATIVE_DTYPES:
+            return ast.LiteralExpression(value.item())
+        if issubclass(result.dtype.type, (np.integer, np.floating)) and not pd.isnull(value):
+            return ast.LiteralExpression(value)
+        return function
+
+
+class PlanNode(object):
+    """ Base class for plans producing a result (queries and unions). """
+
+    order = None  # ORDER BY
+    limit = None  # LIMIT, None for all rows
+    offset = 0  # OFFSET
+
+    @property
+    def stop(self):
+        """ :return: Index of the first row after the requested ones or None for all rows """
+        return self.offset + self.limit if self.limit is not None else None
+
+    @property
+    def is_windowed(self):
+        """ :return: True if only some of the rows are requested (LIMIT/OFFSET) """
+        return self.limit is not None or self.offset > 0
+
+    def windowed(self, offset, limit):
+        """
+        Creates a copy of the plan which only returns a part (window) of the current result
+        :param offset: Number of rows of the current result to skip
+        :param limit: Maximum number of rows or None
+        :rtype: PlanNode
+        """
+        node = copy.copy(self)
+        node.offset = self.offset + offset
+        node.limit = limit
+        if self.limit is not None:
+            node.limit = max(0, self.limit - offset if limit is None else min(self.limit - offset, limit))
+        return node
+
+
+class SelectPlan(PlanNode):
+    """ Plan for a single query (SELECT ... FROM ... WHERE ...). """
+
+    def __init__(self, query, order=None, limit=None, offset=0):
+        """
+        :type query: hub.odhql.ast.Query
+        :param order: ORDER BY clause of the query, if any
+        :type order: list
+        :param limit: LIMIT of the query, if any
+        :param offset: OFFSET of the query
+        """
+        ConstantFolder.fold_query(query)
+        self._ensure_unique_fields(query)
+        self._check_samples(query)
+
+        self.query = query
+        self.order = order or None
+        self.limit = limit
+        self.offset = offset
+
+        visitor = PrefixVisitor()
+        query.accept(visitor)
+        for o in self.order or []:
+            o.accept(visitor)
+        self.columns = visitor.columns
+        self.positional = visitor.positional
+
+        self.group_by = query.group_by
+        self.aggregates = self._check_grouping(query, self.group_by)
+        self.grouped = bool(self.group_by or self.aggregates)
+        self.distinct = query.distinct
+
+        self.pushed, self.residual = self._split_filter(query)
+        self.pushed = {alias: CostVisitor.order(conditions) for alias, conditions in self.pushed.iteritems()}
+        self.residual = CostVisitor.order(self.residual)
+        self.common = self._common_expressions(query)
+        self.join_predicates = self._join_predicates(query)
+
+    @property
+    def streamable(self):
+        """
+        True if the query can be executed on batches of source rows and produce the same result as if it was executed
+        on all rows at once: It must have a single data source (no joins), no ORDER BY, LIMIT/OFFSET or positional
+        functions. Aggregates need all rows of a group, DISTINCT all rows of the result.
+        """
+        return (len(self.query.data_sources) == 1 and not self.order and not self.is_windowed and
+                not self.positional and not self.grouped and not self.distinct)
+
+    @property
+    def slice_early(self):
+        """
+        True if LIMIT/OFFSET can be applied before selecting the fields, i.e. only the requested rows need to be
+        evaluated. With DISTINCT, the rows are only known after removing the duplicates.
+        """
+        return self.is_windowed and not self.order and not self.positional and not self.distinct
+
+    @classmethod
+    def _ensure_unique_fields(cls, query):
+        """
+        Renames SELECT fields so that they are unique by adding a number (starting from 2) for duplicates
+        :param query: hub.odhql.parser.Query
+        :rtype: None
+        """
+        seen = collections.defaultdict(int)
+        for f in query.fields:
+            n = seen[f.alias] = seen[f.alias] + 1
+            f.alias = '{}{}'.format(f.alias, bool(n - 1) * str(n))
+
+    @classmethod
+    def _check_samples(cls, query):
+        """
+        Makes sure the sizes of the samples (TABLESAMPLE) are whole numbers of rows or percentages up to 100.
+        :type query: hub.odhql.ast.Query
+        """
+        for ds in query.data_sources:
+            sample = ds.sample
+            if sample is None:
+                continue
+            if sample.unit == ast.TableSample.Unit.rows and not isinstance(sample.size, (int, long)):
+                raise OdhQLExecutionException('TABLESAMPLE: The number of rows of "{}" must be an integer'
+                                              .format(ds.alias))
+            if sample.unit == ast.TableSample.Unit.percent and sample.size > 100:
+                raise OdhQLExecutionException('TABLESAMPLE: The percentage of "{}" must be between 0 and 100'
+                                              .format(ds.alias))
+
+    @property
+    def grouping_keys(self):
+        """
+        :return: Structural keys of the expressions which are evaluated by grouping (aggregates and GROUP BY
+                 expressions other than fields)
+        :rtype: set
+        """
+        keys = {e.key() for e in self.group_by if not isinstance(e, ast.Field)}
+        return keys | set(self.aggregates)
+
+    @classmethod
+    def _check_grouping(cls, query, group_by):
+        """
+        Makes sure aggregate functions are only used in the selected fields (not nested) and that these only reference
+        columns which are grouped or aggregated.
+        :type query: hub.odhql.ast.Query
+        :return: Aggregate function calls in the selected fields by structural key
+        :rtype: collections.OrderedDict
+        """
+        conditions = [ds.condition for ds in query.data_sources if isinstance(ds, ast.JoinedDataSource)]
+        if AggregateVisitor.collect(query.filter_definitions, *conditions):
+            raise OdhQLExecutionException('Aggregate functions are not allowed in WHERE or JOIN conditions')
+        if AggregateVisitor.collect(*group_by):
+            raise OdhQLExecutionException('GROUP BY: Aggregate functions are not allowed')
+
+        aggregates = AggregateVisitor.collect(*query.fields)
+        for aggregate in aggregates.itervalues():
+            if aggregate.arg and AggregateVisitor.collect(aggregate.arg):
+                raise OdhQLExecutionException('{}: Aggregate functions can not be nested'.format(aggregate.name))
+
+        if group_by or aggregates:
+            keys = {e.key() for e in group_by}
+            ungrouped = list(itertools.chain(*[cls._ungrouped_fields(f.expression, keys) for f in query.fields]))
+            if ungrouped:
+                raise OdhQLExecutionException('GROUP BY: Column "{}.{}" must be grouped or used in an aggregate '
+                                              'function'.format(ungrouped[0].prefix, ungrouped[0].name))
+        return aggregates
+
+    @classmethod
+    def _ungrouped_fields(cls, node, keys):
+        """
+        :param keys: Structural keys of the GROUP BY expressions
+        :return: Fields referenced outside of aggregate functions and grouped expressions
+        :rtype: list of hub.odhql.ast.Field
+        """
+        if isinstance(node, ast.AggregateFunction) or node.key() in keys:
+            return []
+        if isinstance(node, ast.Field):
+            return [node]
+
+        if isinstance(node, ast.Function):
+            children = node.args
+        elif isinstance(node, ast.CaseExpression):
+            children = node.rules
+        elif isinstance(node, ast.CaseRule):
+            children = [node.condition, node.expression]
+        elif isinstance(node, ast.FilterListBase):
+            children = node.conditions
+        elif isinstance(node, ast.BinaryCondition):
+            children = [node.left, node.right]
+        elif isinstance(node, ast.InCondition):
+            children = [node.left] + node.in_list
+        elif isinstance(node, ast.IsNullCondition):
+            children = [node.field]
+        elif isinstance(node, ast.PredicateCondition):
+            children = [node.predicate]
+        else:
+            children = []
+        return list(itertools.chain(*[cls._ungrouped_fields(c, keys) for c in children if c is not None]))
+
+    @classmethod
+    def _common_expressions(cls, query):
+        """
+        Determines the expressions which are used more than once in the query and should therefore only be evaluated
+        once per frame. Expressions using positional functions are excluded: Their results can not be carried over
+        to a filtered frame.
+        :type query: hub.odhql.parser.Query
+        :return: Structural keys of the common expressions
+        :rtype: set
+        """
+        visitor = ExpressionVisitor()
+        query.accept(visitor)
+
+        common = set()
+        for key, n in visitor.counts.iteritems():
+            if n > 1:
+                prefixes = PrefixVisitor()
+                visitor.nodes[key].accept(prefixes)
+                if not prefixes.positional:
+                    common.add(key)
+        return common
+
+    @classmethod
+    def _conjuncts(cls, filter_):
+        """
+        Flattens a filter into a list of conditions which all need to be met (i.e. are joined by AND)
+        :param filter_: Subclass of hub.odhql.parser.FilterListBase or a single condition
+        :rtype: list
+        """
+        if isinstance(filter_, ast.FilterAlternative) and len(filter_.conditions) == 1:
+            return cls._conjuncts(filter_.conditions[0])
+        elif isinstance(filter_, ast.FilterCombination):
+            return list(itertools.chain(*[cls._conjuncts(c) for c in filter_.conditions]))
+        return [filter_]
+
+    @classmethod
+    def _split_filter(cls, query):
+        """
+        Splits the WHERE clause of a query into conditions which can be evaluated on a single data source before
+        joining and conditions which have to be evaluated on the joined dataframe.
+
+        Conditions on data sources which may be filled up with nulls by an outer join are never pushed down, as
+        filtering them before the join would yield null-extended rows instead of removing them. Conditions without
+        any column (e.g. a constant FALSE) are evaluated on the first data source which can't be null-extended.
+        :type query: hub.odhql.parser.Query
+        :return: Pushed down conditions by data source alias and the remaining conditions
+        :rtype: (dict[alias] -> list, list)
+        """
+        if not query.filter_definitions:
+            return {}, []
+
+        aliases = {}
+        nullable = set()
+        JoinType = ast.JoinedDataSource.JoinType
+        for ds in query.data_sources:
+            if isinstance(ds, ast.JoinedDataSource):
+                if ds.join_type in (JoinType.left, JoinType.outer):
+                    nullable.add(ds.alias.lower())
+                if ds.join_type in (JoinType.right, JoinType.outer):
+                    nullable.update(aliases)
+            aliases[ds.alias.lower()] = ds.alias
+        not_nullable = [ds.alias.lower() for ds in query.data_sources if ds.alias.lower() not in nullable]
+
+        pushed = collections.defaultdict(list)
+        residual = []
+        for condition in cls._conjuncts(query.filter_definitions):
+            visitor = PrefixVisitor()
+            condition.accept(visitor)
+            prefixes = {p.lower() for p in visitor.prefixes}
+
+            if not prefixes and not_nullable:
+                prefixes = {not_nullable[0]}
+
+            if len(prefixes) == 1 and not visitor.positional:
+                prefix = next(iter(prefixes))
+                if prefix in aliases and prefix not in nullable:
+                    pushed[aliases[prefix]].append(condition)
+                    continue
+            residual.append(condition)
+
+        return dict(pushed), residual
+
+    @classmethod
+    def _join_predicates(cls, query):
+        """
+        Collects the conditions of the joins if the order of the joins may be changed (see hub.odhql.join.JoinOrder):
+        There must be at least three data sources, all joins must be inner joins and each side of a condition has to
+        reference exactly one (different) data source.
+        :type query: hub.odhql.parser.Query
+        :return: Conditions of all joins or None if the joins have to be executed in the given order
+        :rtype: list of JoinPredicate
+        """
+        if len(query.data_sources) < 3:
+            return None
+
+        predicates = []
+        for ds in query.data_sources[1:]:
+            if ds.join_type != ast.JoinedDataSource.JoinType.inner:
+                return None
+
+            cond = ds.condition
+            for c in cond.conditions if isinstance(cond, ast.JoinConditionList) else (cond,):
+                predicate = JoinPredicate(c)
+                if predicate.positional or len(predicate.left) != 1 or len(predicate.right) != 1 or \
+                        predicate.left == predicate.right:
+                    return None
+                predicates.append(predicate)
+
+        return predicates
+
+
+class JoinPredicate(object):
+    """ Single condition (equality) of an inner join and the data sources referenced by its sides. """
+
+    def __init__(self, condition):
+        """
+        :type condition: hub.odhql.ast.JoinCondition
+        """
+        self.condition = condition
+        self.positional = False
+
+        sides = []
+        for expression in (condition.left, condition.right):
+            visitor = PrefixVisitor()
+            expression.accept(visitor)
+            self.positional |= visitor.positional
+            sides.append(frozenset(visitor.prefixes))
+        self.left, self.right = sides
+        self.aliases = self.left | self.right
+
+    def side(self, alias):
+        """
+        :return: The expression of the side referencing the given data source
+        """
+        return self.condition.left if alias in self.left else self.condition.right
+
+    def __repr__(self):
+        return '<JoinPredicate {}>'.format(self.condition)
+
+
+class UnionPlan(PlanNode):
+    """ Plan for multiple queries combined with UNION. """
+
+    def __init__(self, union):
+        """
+        :type union: hub.odhql.ast.Union
+        """
+        self.order = union.order or None
+        self.limit = union.limit
+        self.offset = union.offset
+        self.queries = self._limit_queries([SelectPlan(q) for q in union.queries])
+
+    def _limit_queries(self, queries):
+        """
+        Without ORDER BY no query needs to return more rows than the union as a whole
+        :type queries: list of SelectPlan
+        """
+        if self.stop is None or self.order:
+            return queries
+        return [q.windowed(0, self.stop) for q in queries]
+
+    def windowed(self, offset, limit):
+        node = super(UnionPlan, self).windowed(offset, limit)
+        node.queries = node._limit_queries(node.queries)
+        return node
+
+
+class QueryPlan(object):
+    """ Plan for a complete ODHQL statement. """
+
+    PLAN = 'plan'  # EXPLAIN
+    ANALYZE = 'analyze'  # EXPLAIN ANALYZE
+
+    def __init__(self, statement):
+        """
+        :param statement: Parsed statement
+        :type statement: hub.odhql.ast.Union or hub.odhql.ast.Query or hub.odhql.ast.Explain
+        """
+        self.cache_hits = 0  # number of times the plan was taken from the cache (see PlanCache.get)
+
+        # EXPLAIN (ANALYZE): plan the statement as usual, the interpreter reports on it instead of returning its result
+        self.explain = None
+        if isinstance(statement, ast.Explain):
+            self.explain = self.ANALYZE if statement.analyze else self.PLAN
+            statement = statement.statement
+
+        self.statement = statement
+        self.data_sources = self.data_sources_of(statement)
+
+        if isinstance(statement, ast.Union):
+            # the parser only produces a Union for a single query if it is sorted - this ORDER BY belongs to the query
+            if len(statement.queries) == 1:
+                self.root = SelectPlan(statement.queries[0], statement.order, statement.limit, statement.offset)
+            else:
+                self.root = UnionPlan(statement)
+        else:
+            self.root = SelectPlan(statement)
+
+    @staticmethod
+    def data_sources_of(statement):
+        """
+        :param statement: Parsed statement, which does not need to be valid beyond its syntax
+        :type statement: hub.odhql.ast.Union or hub.odhql.ast.Query or hub.odhql.ast.Explain
+        :return: Data sources of all queries of the statement
+        :rtype: list of hub.odhql.ast.DataSource
+        """
+        if isinstance(statement, ast.Explain):
+            statement = statement.statement
+        if isinstance(statement, ast.Union):
+            return list(itertools.chain(*[q.data_sources for q in statement.queries]))
+        return list(statement.data_sources)
+
+
+class PlanCache(object):
+    """
+    Thread-safe in-process cache for query plans with LRU eviction. Plans are keyed by their normalized query text,
+    i.e. comments and formatting do not matter.
+    """
+
+    TOKEN_RE = re.compile(r'(\'(?:[^\'\\]|\\.)*\'|"(?:[^"\\]|\\.)*")|\s+')
+
+    def __init__(self, size=128):
+        """
+        :param size: Maximum number of plans to keep
+        :type size: int
+        """
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+
+        self._plans = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def normalize(cls, text, strip_comments=None):
+        """
+        Collapses whitespace outside of quoted strings
+        :param strip_comments: Optional function removing comments from the text
+        :rtype: unicode
+        """
+        if strip_comments:
+            text = strip_comments(text)
+        return cls.TOKEN_RE.sub(lambda m: m.group(1) or ' ', text).strip()
+
+    def get(self, key, build):
+        """
+        Returns the cached plan for a key. On a miss the plan is built and added to the cache. On a hit, the hit is
+        counted in QueryPlan.cache_hits (under the lock, plans are shared between threads).
+        :param key: Normalized query text
+        :param build: Function creating the plan if there is none
+        :rtype: QueryPlan
+        """
+        with self._lock:
+            plan = self._plans.pop(key, None)
+            if plan is not None:
+                self._plans[key] = plan
+                self.hits += 1
+                plan.cache_hits += 1
+                return plan
+
+        # build outside of the lock, parsing takes a while. Invalid statements raise and are not cached
+        plan = build()
+
+        with self._lock:
+            self.misses += 1
+            self._plans[key] = plan
+            while len(self._plans) > self.size:
+                self._plans.popitem(last=False)
+
+        return plan
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._plans)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+"""
+Late materialization for the OdhQL interpreter: Filters and joins only determine which rows of the source frames are
+selected, the values of a column are gathered when the column is accessed.
+"""
+
+import numpy as np
+import pandas.core.common as com
+
+from hub.structures.frame import OdhFrame, OdhSeries
+
+
+class Selection(object):
+    """
+    Rows of one or more (joined) data frames. The rows of each frame are given by their positions, -1 stands for a
+    row filled with NULL (outer joins). Supports the parts of the DataFrame interface used by the interpreter.
+    """
+
+    def __init__(self, parts, name=None):
+        """
+        :param parts: Data frames and the positions of their selected rows (None: all rows, in order). All position
+                      arrays have the same length.
+        :type parts: list of (OdhFrame, numpy.ndarray)
+        :param name: Name of the selection (see OdhFrame.name)
+        """
+        self.parts = parts
+        self.name = name
+        self._lookup = {}
+        for i, (df, _) in enumerate(parts):
+            for c in df.columns:
+                self._lookup.setdefault(c, i)
+        self._cache = {}
+
+    @classmethod
+    def of(cls, df):
+        """
+        :return: Selection of all rows of a data frame
+        :rtype: Selection
+        """
+        return cls([(df, None)], getattr(df, 'name', None))
+
+    def __len__(self):
+        df, rows = self.parts[0]
+        return len(df) if rows is None else len(rows)
+
+    def __contains__(self, name):
+        return name in self._lookup
+
+    def __getitem__(self, name):
+        """
+        Gathers the values of a column. The result must not be modified, it is cached and may share its data with
+        the source frame.
+        :rtype: OdhSeries
+        """
+        series = self._cache.get(name)
+        if series is None:
+            df, rows = self.parts[self._lookup[name]]
+            source = df[name]
+            if rows is None:
+                series = OdhSeries(source.values, name=name).__finalize__(source)
+            else:
+                series = OdhSeries(com.take_1d(source.values, rows), name=name).__finalize__(source)
+                series._odh_type = None  # NULL rows may have changed the dtype
+            self._cache[name] = series
+        return series
+
+    @property
+    def columns(self):
+        return [c for df, _ in self.parts for c in df.columns]
+
+    @property
+    def shape(self):
+        return len(self), len(self._lookup)
+
+    def select(self, mask):
+        """
+        :param mask: Rows to keep
+        :type mask: numpy.ndarray(dtype=numpy.bool_)
+        :rtype: Selection
+        """
+        return self.take(np.flatnonzero(mask))
+
+    def take(self, indexer):
+        """
+        :param indexer: Positions of the rows to keep (may be repeated), -1 for a row filled with NULL
+        :type indexer: numpy.ndarray
+        :rtype: Selection
+        """
+        indexer = np.asarray(indexer, dtype=np.int64)
+        parts = [(df, indexer if rows is None else com.take_1d(rows, indexer, fill_value=-1))
+                 for df, rows in self.parts]
+        return Selection(parts, self.name)
+
+    def join(self, other):
+        """
+        :param other: Selection with the same number of rows
+        :return: Selection containing the columns of both selections, row by row
+        :rtype: Selection
+        """
+        return Selection(self.parts + other.parts, self.name)
+
+    def materialize(self, columns=None):
+        """
+        :param columns: Columns to gather, all if omitted
+        :rtype: OdhFrame
+        """
+        columns = self.columns if columns is None else columns
+        if columns:
+            df = OdhSeries.concat([self[c] for c in columns], axis=1, copy=False)
+        else:
+            df = OdhFrame(index=np.arange(len(self)))
+        df.name = self.name
+        return df
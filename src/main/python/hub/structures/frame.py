@@ -434,6 +434,65 @@ class OdhSeries(pd.Series):
         return s
 
 
+class ConstantColumn(object):
+    """
+    Column containing the same value in every row, e.g. a literal. Only a single row is stored, the column is
+    expanded to its full length when it is materialized.
+    """
+
+    def __init__(self, series, length, name=None):
+        """
+        :param series: Series with a single row containing the value (determines dtype, odh_type and crs)
+        :type series: OdhSeries
+        :param length: Number of rows of the column
+        :param name: Name of the column, defaults to the name of the series
+        """
+        self.series = series
+        self.length = length
+        self.name = series.name if name is None else name
+
+    @classmethod
+    def of(cls, value, length, name=None):
+        """
+        :param value: Literal value
+        :rtype: ConstantColumn
+        """
+        if value is None or isinstance(value, (basestring, dt.datetime, shapely.geometry.base.BaseGeometry)):
+            # object series are typed by their values (NULL is TEXT), datetimes are converted by pandas
+            values = np.array([value], dtype=object)
+        else:
+            values = np.array([value])  # keeps numpy types, e.g. int32
+        return cls(OdhSeries(values, name=name), length, name)
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def value(self):
+        return self.series.iat[0]
+
+    @property
+    def odh_type(self):
+        return self.series.odh_type
+
+    def resize(self, length, name=None):
+        """
+        :return: Column with the same value, but a different number of rows (and name)
+        :rtype: ConstantColumn
+        """
+        return ConstantColumn(self.series, length, self.name if name is None else name)
+
+    def materialize(self):
+        """
+        :return: Series containing the value in each row
+        :rtype: OdhSeries
+        """
+        series = self.series.iloc[np.zeros(self.length, dtype=np.int64)]
+        series.index = np.arange(self.length)
+        series.name = self.name
+        return series
+
+
 class EmptyGeometryMarker(shapely.geometry.Point):
     """ Replacement for empty geometry values - certain file formats don't handle those well at all. """
 
@@ -6,16 +6,22 @@
 from __future__ import unicode_literals
 
 import logging
+import threading
 import traceback
 import time
 
+import mock
 import pandas as pd
 
+from hub.odhql import functions, parser
 from hub.odhql.exceptions import OdhQLExecutionException
 from hub.tests.testutils import TestBase
 from hub.structures.file import File
+from hub.structures.frame import OdhType
 from hub.odhql.parser import OdhQLParser
 from hub.odhql.interpreter import OdhQLInterpreter
+from hub.odhql.join import JoinOrder
+from hub.odhql.plan import PlanCache
 
 logger = logging.getLogger(__name__)
 
@@ -126,6 +132,13 @@ class TestInterpreter(TestInterpreterBase):
         self.assertEqual(df['name'][0], 'The Boss')
         self.assertListEqual(df['name'][1:].tolist(), self.employees.Prename[1:].tolist())
 
+    def test_select_case_types(self):
+        df = self.execute('SELECT CASE WHEN e.id < 3 THEN e.id WHEN e.id < 6 THEN 10 ELSE LEN(e.surname) END AS x, '
+                          'CASE WHEN e.id < 3 THEN e.id WHEN e.id > 7 THEN NULL END AS y FROM employee AS e')
+        self.assertListEqual(df.x.tolist(), [0, 1, 2, 10, 10, 10, 8, 4, 6, 11])
+        self.assertEqual(df.x.dtype.kind, 'i')
+        self.assertListEqual(df.y.fillna(-1).tolist(), [0, 1, 2] + [-1] * 7)
+
     def test_alias(self):
         df = self.execute('SELECT e.id, E.surname FROM employee AS e')
         self.assertListEqual(df.columns.tolist(), ['id', 'surname'])
@@ -184,6 +197,16 @@ class TestInterpreter(TestInterpreterBase):
         df = self.execute('SELECT c.age FROM child AS c WHERE c.age IS NOT NULL')
         self.assertFalse(pd.isnull(df.age).any())
 
+    def test_where_equals_null(self):
+        self.assertEqual(0, len(self.execute('SELECT e.id FROM employee AS e WHERE e.boss = NULL')))
+        self.assertEqual(0, len(self.execute('SELECT e.id FROM employee AS e WHERE NULL = e.boss')))
+        self.assertEqual(len(self.employees), len(self.execute('SELECT e.id FROM employee AS e WHERE e.boss != NULL')))
+
+    def test_where_int_string(self):
+        self.assertEqual(0, len(self.execute('SELECT e.id FROM employee AS e WHERE e.id = \'abc\'')))
+        self.assertEqual(0, len(self.execute('SELECT e.id FROM employee AS e WHERE e.id > \'abc\'')))
+        self.assertEqual(len(self.employees), len(self.execute('SELECT e.id FROM employee AS e WHERE e.id != \'abc\'')))
+
     def test_where_in(self):
         df = self.execute('SELECT c.surname FROM child as c WHERE c.surname IN (\'Holzmann\', \'Oster\')')
         self.assertIn('Holzmann', df.surname.tolist())
@@ -195,18 +218,44 @@ class TestInterpreter(TestInterpreterBase):
         self.assertNotIn('Holzmann', df.surname.tolist())
         self.assertNotIn('Oster', df.surname.tolist())
 
+    def test_where_in_mixed(self):
+        # e.boss contains NULL (float), literals and expressions may be mixed
+        df = self.execute('SELECT e.id FROM employee AS e WHERE e.boss IN (1.0, 7, NULL)')
+        self.assertListEqual(df.id.tolist(), [4, 5, 8])
+
+        df = self.execute('SELECT e.id FROM employee AS e WHERE e.id IN (1.0, LEN(e.prename))')
+        self.assertListEqual(df.id.tolist(), [1, 4, 6])
+
+        df = self.execute('SELECT e.id FROM employee AS e WHERE e.boss NOT IN (0, 1, 2)')
+        self.assertListEqual(df.id.tolist(), [0, 6, 8, 9])
+
     def test_where_like(self):
-        df = self.execute('SELECT c.surname FROM child as c WHERE c.surname LIKE \'^H.*\'')
+        df = self.execute('SELECT c.surname FROM child as c WHERE c.surname LIKE \'H%\'')
         self.assertNotIn(False, [s.startswith('H') for s in df.surname])
 
+        df = self.execute('SELECT e.prename FROM employee AS e WHERE e.prename LIKE \'_n%a\'')
+        self.assertListEqual(df.prename.tolist(), [p for p in self.employees.Prename
+                                                   if len(p) > 2 and p[1] == 'n' and p.endswith('a')])
+
     def test_where_not_like(self):
-        df = self.execute('SELECT c.surname FROM child as c WHERE c.surname NOT LIKE \'^H.*\'')
+        df = self.execute('SELECT c.surname FROM child as c WHERE c.surname NOT LIKE \'H%\'')
         self.assertNotIn(False, [not s.startswith('H') for s in df.surname])
 
     def test_join(self):
         df = self.execute('SELECT c.prename, e.prename AS parent FROM child AS c JOIN employee AS e ON c.parent = e.id')
         self.assertEqual(len(df), len(self.children))
 
+    def test_join_where(self):
+        df = self.execute('SELECT c.prename, e.prename AS parent FROM child AS c JOIN employee AS e ON c.parent = e.id '
+                          'WHERE e.surname = \'Koertig\' AND c.age > 20 AND c.prename != e.prename')
+        self.assertListEqual(df.prename.tolist(), ['Matthias'])
+        self.assertListEqual(df.parent.tolist(), [' Eric '])
+
+    def test_left_join_where_null(self):
+        df = self.execute('SELECT e.prename FROM employee AS e LEFT JOIN child AS c ON c.parent = e.id '
+                          'WHERE c.id IS NULL')
+        self.assertListEqual(df.prename.tolist(), ['Markus', 'Christina'])
+
     def test_self_join(self):
         df = self.execute('SELECT e.prename, ee.prename AS boss '
                           'FROM employee AS e JOIN employee AS ee ON e.boss = ee.id')
@@ -214,6 +263,13 @@ class TestInterpreter(TestInterpreterBase):
             [self.employees.iloc[e.Boss].Prename for i, e in self.employees.iterrows() if not pd.isnull(e.Boss)],
             df.boss.tolist())
 
+    def test_self_join_load(self):
+        query = self.parser.parse('SELECT e.prename FROM employee AS e JOIN employee AS ee ON e.boss = ee.id')
+        dfs = self.interpreter._load(self.interpreter.compile(query).root)
+        self.assertListEqual(dfs['e'].columns.tolist(), ['e.id', 'e.prename', 'e.boss'])
+        self.assertListEqual(dfs['ee'].columns.tolist(), ['ee.id', 'ee.prename', 'ee.boss'])
+        self.assertListEqual(self.employees.columns.tolist(), ['Id', 'Prename', 'Surname', 'Boss'])
+
     def test_multi_join(self):
         self.execute('SELECT e.prename, ee.prename AS boss, c.prename AS childname, bc.prename AS bosses_child '
                      'FROM employee AS e '
@@ -227,11 +283,67 @@ class TestInterpreter(TestInterpreterBase):
             'AND e.id = c.parent)')
         self.assertEqual(len(df), len(self.children))
 
+    def test_join_expression_keys(self):
+        df = self.execute('SELECT c.prename, e.prename AS parent FROM child AS c JOIN employee AS e '
+                          'ON (TRIM(LOWER(c.surname)) = TRIM(LOWER(e.surname)) AND CAST(c.parent, \'TEXT\') = '
+                          'CAST(e.id, \'TEXT\'))')
+        self.assertEqual(len(df), len(self.children))
+        self.assertListEqual(self.children.columns.tolist(), ['Id', 'Parent', 'Prename', 'Surname', 'Age'])
+        self.assertListEqual(self.employees.columns.tolist(), ['Id', 'Prename', 'Surname', 'Boss'])
+
+    def test_outer_joins(self):
+        # NULL never matches (e.boss of the first employee)
+        df = self.execute('SELECT e.id, ee.id AS boss FROM employee AS e FULL JOIN employee AS ee ON e.boss = ee.id '
+                          'WHERE ee.id IS NULL OR e.id IS NULL')
+        self.assertListEqual(df.id.fillna(-1).tolist(), [0, -1, -1, -1, -1])
+        self.assertListEqual(df.boss.fillna(-1).tolist(), [-1, 3, 6, 8, 9])
+
+        df = self.execute('SELECT e.id, c.id AS child FROM child AS c RIGHT JOIN employee AS e ON c.parent = e.id')
+        self.assertListEqual(df.id.tolist(), [0, 0, 1, 2, 2, 3, 4, 5, 6, 7, 8, 9])
+        self.assertListEqual(df.child.fillna(-1).tolist(), [0, 1, 9, 4, 5, -1, 6, -1, 2, 7, 8, 3])
+
+    def test_results_are_copies(self):
+        df = self.execute('SELECT e.id, e.prename FROM employee AS e')
+        df['id'].values[0] = 99
+        df['prename'].values[0] = 'foo'
+        self.assertEqual(self.employees.Id[0], 0)
+        self.assertEqual(self.employees.Prename[0], 'Dieter ')
+
+        df = self.execute('SELECT e.id, c.age FROM employee AS e LEFT JOIN child AS c ON c.parent = e.id '
+                          'WHERE e.id > 4')
+        self.assertListEqual(df.id.tolist(), [5, 6, 7, 8, 9])
+        self.assertListEqual(df.age.fillna(-1).tolist(), [-1, 19, 17, 3, 22])
+
+    def test_join_order(self):
+        query = ('SELECT c.prename, e.prename AS parent, b.prename AS boss FROM child AS c '
+                 'JOIN employee AS e ON c.parent = e.id JOIN employee AS b ON e.boss = b.id')
+        node = self.interpreter.compile(query).root
+        dfs = self.interpreter._load(node)
+        self.assertListEqual([ds.alias for ds in JoinOrder.reorder(node.query.data_sources, node.join_predicates, dfs)],
+                             ['c', 'e', 'b'])
+
+        dfs['b'] = dfs['b'][dfs['b']['b.id'] == 7]
+        reordered = JoinOrder.reorder(node.query.data_sources, node.join_predicates, dfs)
+        self.assertSetEqual({ds.alias for ds in reordered[:2]}, {'b', 'e'})
+
+        df = self.execute(query + ' WHERE b.id = 7')
+        self.assertListEqual(df.prename.tolist(), ['Marko'])
+        self.assertListEqual(df.boss.tolist(), ['Ines'])
+
     def test_union(self):
         df = self.execute('SELECT e.prename FROM employee AS e UNION SELECT c.prename FROM child AS c')
         self.assertListEqual(df.prename.tolist(),
                              [p for p in self.employees.Prename.tolist() + self.children.Prename.tolist()])
 
+    def test_union_many(self):
+        queries = ['SELECT e.id, e.prename FROM employee AS e WHERE e.id = {}'.format(i) for i in range(10)]
+        df = self.execute(' UNION '.join(queries[::-1]))
+        self.assertListEqual(df.id.tolist(), range(10)[::-1])
+        self.assertListEqual(df.prename.tolist(), self.employees.Prename.tolist()[::-1])
+
+        self.assertRaises(OdhQLExecutionException,
+                          lambda: self.execute(' UNION '.join(queries + ['SELECT c.id, c.foo FROM child AS c'])))
+
     def test_order_desc(self):
         df = self.execute('SELECT e.prename FROM employee AS e ORDER BY e.prename DESC')
         self.assertListEqual(df.prename.tolist(), sorted(self.employees.Prename.tolist())[::-1])
@@ -240,6 +352,13 @@ class TestInterpreter(TestInterpreterBase):
         df = self.execute('SELECT e.prename FROM employee AS e ORDER BY e.prename ASC')
         self.assertListEqual(df.prename.tolist(), sorted(self.employees.Prename.tolist()))
 
+    def test_order_non_selected(self):
+        # stable, ties keep their original order
+        df = self.execute('SELECT c.prename FROM child AS c ORDER BY c.surname DESC')
+        self.assertListEqual(df.columns.tolist(), ['prename'])
+        self.assertListEqual(df.prename.tolist(), ['Sabrina', 'Andrea', 'Matthias', 'Karolin', 'Katrin', 'Mike',
+                                                   'Annett', 'Lisa', 'Melanie', 'Marko'])
+
     def test_order_positional(self):
         df = self.execute('SELECT e.prename FROM employee AS e ORDER BY 1 ASC')
         self.assertListEqual(df.prename.tolist(), sorted(self.employees.Prename.tolist()))
@@ -255,6 +374,263 @@ class TestInterpreter(TestInterpreterBase):
         self.assertDictEqual(file_groups, {'odh12': 12, 'odh88': 88})
         self.assertDictEqual(transformations, {'trf14': 14})
 
+    def test_plan_cache(self):
+        query = 'SELECT e.prename FROM employee AS e WHERE e.id < 3 ORDER BY 1 DESC'
+        plan = self.interpreter.compile(query)
+        self.assertIs(plan, self.interpreter.compile('-- formatting and comments do not matter\n'
+                                                     'SELECT   e.prename\nFROM employee AS e\n'
+                                                     'WHERE e.id < 3 ORDER BY 1 DESC'))
+        self.assertIsNot(plan, self.interpreter.compile(query.replace('3', "'3 '")))
+
+        # cached plans must not be modified by executing them
+        for _ in range(2):
+            self.assertListEqual(self.execute(query).prename.tolist(), ['Dieter ', ' Lukas', ' Eric '])
+
+    def test_compile_keeps_ast(self):
+        query = self.parser.parse('SELECT e.id, e.id, UPPER(\'a\') AS a FROM employee AS e WHERE e.id < LEN(\'ab\')')
+        before = repr(query)
+        self.interpreter.compile(query)
+        self.assertEqual(before, repr(query))
+        self.assertListEqual([f.alias for f in query.fields], ['id', 'id', 'a'])
+
+    def test_plan_cache_eviction(self):
+        cache = PlanCache(size=2)
+        for key in ('a', 'b', 'a', 'c'):
+            cache.get(key, lambda: mock.Mock(cache_hits=0))
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 3, 2))
+        self.assertListEqual(cache._plans.keys(), ['a', 'c'])
+        self.assertEqual(cache.get('a', None).cache_hits, 2)
+
+    def test_plan_cache_hits(self):
+        cache = PlanCache()
+        query_plan = cache.get('a', lambda: mock.Mock(cache_hits=0))
+        threads = [threading.Thread(target=lambda: [cache.get('a', None) for _ in range(100)]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(query_plan.cache_hits, 800)
+
+    def test_common_subexpressions(self):
+        with mock.patch.object(functions, 'execute', wraps=functions.execute) as execute:
+            df = self.execute('SELECT UPPER(TRIM(e.prename)) AS upper, '
+                              'CASE WHEN UPPER(TRIM(e.prename)) = \'ANNA\' THEN LOWER(TRIM(e.prename)) '
+                              'ELSE UPPER(TRIM(e.prename)) END AS mixed '
+                              'FROM employee AS e JOIN child AS c ON c.parent = e.id '
+                              'WHERE UPPER(TRIM(e.prename)) LIKE \'AN%\' AND c.prename != e.prename')
+        self.assertListEqual(df.upper.tolist(), ['ANNA', 'ANNETT'])
+        self.assertListEqual(df.mixed.tolist(), ['anna', 'ANNETT'])
+        # TRIM + UPPER on the source frame (WHERE) and on the joined frame (SELECT, CASE), LOWER for THEN
+        self.assertEqual(execute.call_count, 5)
+
+    def test_short_circuit(self):
+        for condition in ('UPPER(e.prename) = \'MARKUS\' AND e.id = 3',
+                          'e.id != 3 OR (UPPER(e.prename) = \'MARKUS\' AND e.boss = 0)'):
+            with mock.patch.object(functions, 'execute', wraps=functions.execute) as execute:
+                df = self.execute('SELECT e.prename FROM employee AS e WHERE ' + condition)
+            self.assertEqual(execute.call_args[0][:2], ('UPPER', 1))
+
+        self.assertListEqual(df.prename.tolist(), self.employees.Prename.tolist())
+
+    def test_constant_folding(self):
+        query = ('SELECT CONCAT(\'a\', \'b\') AS ab, CAST(\'5\', \'INTEGER\') AS five, '
+                 'CASE WHEN 1 = 0 THEN \'x\' WHEN 2 > 1 THEN e.prename ELSE \'y\' END AS prename '
+                 'FROM employee AS e WHERE 1 = 1 AND (e.id < 2 OR \'a\' = \'b\')')
+        fields = self.interpreter.compile(query).root.query.fields
+        self.assertIsInstance(fields[0].expression, parser.LiteralExpression)
+        self.assertIsInstance(fields[1].expression, parser.LiteralExpression)
+        self.assertIsInstance(fields[2].expression, parser.Field)
+
+        df = self.execute(query)
+        self.assertListEqual(df.ab.tolist(), ['ab', 'ab'])
+        self.assertListEqual(df.five.tolist(), [5, 5])
+        self.assertIs(df.five.odh_type, OdhType.INTEGER)
+        self.assertListEqual(df.prename.tolist(), ['Dieter ', ' Lukas'])
+
+        df = self.execute('SELECT e.prename FROM employee AS e JOIN child AS c ON c.parent = e.id WHERE 1 IN (2, 3)')
+        self.assertListEqual(df.columns.tolist(), ['prename'])
+        self.assertEqual(len(df), 0)
+
+    def test_fused_filter(self):
+        df = self.execute('SELECT e.id FROM employee AS e WHERE e.id > 1 AND e.boss < 5 AND (e.boss = 0 OR e.id >= 6)')
+        self.assertListEqual(df.id.tolist(), [2, 3, 6, 7])
+
+        # NULL (NaN) is never less than anything, non-numeric columns are compared the usual way
+        df = self.execute('SELECT e.id FROM employee AS e WHERE e.boss < 1 AND e.id < 5.5 AND e.prename != \'Anna\'')
+        self.assertListEqual(df.id.tolist(), [1, 2, 3])
+        df = self.execute('SELECT e.id FROM employee AS e WHERE e.boss <= 0 OR e.surname = \'Aachen\'')
+        self.assertListEqual(df.id.tolist(), [1, 2, 3, 8])
+
+    def test_constant_columns(self):
+        df = self.execute('SELECT e.id, \'CH\' AS country, TO_DATE(\'2015-02-01\', \'%Y-%m-%d\') AS date, '
+                          'TO_CHAR(TO_DATE(\'2015-02-01\', \'%Y-%m-%d\'), \'%Y\') AS year '
+                          'FROM employee AS e WHERE e.id < 3')
+        self.assertListEqual(df.country.tolist(), ['CH'] * 3)
+        self.assertListEqual(df.date.tolist(), [pd.Timestamp('2015-02-01')] * 3)
+        self.assertListEqual(df.year.tolist(), ['2015'] * 3)
+
+        df = self.execute('SELECT NULL AS x, ST_GeomFromText(\'POINT(1 2)\') AS geom, e.id FROM employee AS e '
+                          'WHERE e.id < 3')
+        self.assertEqual(df.x.dtype, object)
+        self.assertEqual(df.x.odh_type, OdhType.TEXT)
+        self.assertTrue(df.x.isnull().all())
+        self.assertEqual(df.geom.odh_type, OdhType.GEOMETRY)
+
+        df = self.execute('SELECT e.id FROM employee AS e '
+                          'WHERE TO_DATE(CONCAT(\'2015-0\', TO_CHAR(e.id)), \'%Y-%m\') > \'2015-02-15\'')
+        self.assertListEqual(df.id.tolist(), [i for i in self.employees.Id if 2 < i < 10])
+
+    def test_explain(self):
+        query = ('SELECT UPPER(e.prename) AS prename, c.age FROM employee AS e JOIN child AS c ON c.parent = e.id '
+                 'WHERE e.id < 5 AND c.age > 3')
+
+        def steps(node):
+            return [(n.operator, n.detail) for n, _ in node.walk()]
+
+        plan = self.interpreter.explain('EXPLAIN ' + query + ' ORDER BY 2')
+        self.assertIsNone(plan.time)
+        self.assertIn(('Join', 'INNER JOIN child AS c'), steps(plan))
+        self.assertIn(('Function', 'UPPER'), steps(plan))
+        self.assertEqual(steps(plan)[-1], ('Sort', '1 key(s)'))
+
+        # same steps when executed
+        report = self.interpreter.explain('EXPLAIN ANALYZE ' + query + ' ORDER BY 2')
+        self.assertListEqual(steps(report)[1:], steps(plan)[1:])
+        self.assertEqual(report.rows_out, len(self.execute(query)))
+        join = next(n for n, _ in report.walk() if n.operator == 'Join')
+        self.assertEqual(join.rows_out, report.rows_out)
+        self.assertGreaterEqual(report.time, join.time)
+
+        df = self.execute('EXPLAIN ANALYZE ' + query + ' UNION SELECT e.prename, CAST(e.id, \'float\') AS age '
+                          'FROM employee AS e')
+        self.assertListEqual(df.operator.tolist()[:3], ['Statement', 'Union', 'Select'])
+        self.assertEqual(df.operator.tolist().count('Select'), 2)
+        self.assertEqual(df.rows_out[1], len(self.employees) + report.rows_out)
+
+    def test_group_by(self):
+        df = self.execute('SELECT e.boss, COUNT(*) AS n, COUNT(c.age) AS ages, SUM(c.age) AS total, AVG(c.age) AS avg, '
+                          'MIN(c.prename) AS first, MAX(c.age) AS oldest, COUNT(DISTINCT c.surname) AS families '
+                          'FROM employee AS e LEFT JOIN child AS c ON c.parent = e.id '
+                          'GROUP BY e.boss ORDER BY e.boss')
+        self.assertListEqual(df.n.tolist(), [4, 2, 1, 1, 1, 1, 2])  # NULL (no boss) last
+        self.assertListEqual(df.ages.tolist(), [2, 1, 1, 1, 1, 1, 2])
+        self.assertListEqual(df.total.tolist(), [27, 32, 17, 19, 22, 3, 19])
+        self.assertListEqual(df.avg.tolist(), [13.5, 32, 17, 19, 22, 3, 9.5])
+        self.assertListEqual(df['first'].tolist(), ['Annett', 'Sabrina', 'Melanie', 'Andrea', 'Lisa', 'Marko',
+                                                    'Katrin'])
+        self.assertListEqual(df.families.tolist(), [2, 1, 1, 1, 1, 1, 1])
+
+        # grouped expressions and expressions of aggregates
+        df = self.execute('SELECT UPPER(TRIM(e.prename)) AS prename, COUNT(*) AS n, '
+                          'CASE WHEN COUNT(*) > 1 THEN \'many\' ELSE \'one\' END AS children '
+                          'FROM employee AS e JOIN child AS c ON c.parent = e.id '
+                          'GROUP BY UPPER(TRIM(e.prename)) ORDER BY 2 DESC, 1 LIMIT 3')
+        self.assertListEqual(df.prename.tolist(), ['DIETER', 'ERIC', 'ANNA'])
+        self.assertListEqual(df.children.tolist(), ['many', 'many', 'one'])
+
+        # without GROUP BY, all rows are a single group
+        df = self.execute('SELECT COUNT(*) AS n, SUM(e.id) AS total FROM employee AS e WHERE e.id > 100')
+        self.assertListEqual(df.n.tolist(), [0])
+        self.assertTrue(pd.isnull(df.total[0]))
+
+        # no rows, no groups
+        df = self.execute('SELECT c.surname, COUNT(*) AS n, SUM(c.age) AS total, AVG(c.age) AS avg, '
+                          'MIN(c.age) AS youngest, COUNT(DISTINCT c.age) AS ages '
+                          'FROM child AS c WHERE c.id > 100 GROUP BY c.surname')
+        self.assertEqual(len(df), 0)
+        self.assertListEqual(df.columns.tolist(), ['surname', 'n', 'total', 'avg', 'youngest', 'ages'])
+
+        for query in ('SELECT e.prename, COUNT(*) AS n FROM employee AS e GROUP BY e.boss',
+                      'SELECT e.id FROM employee AS e WHERE COUNT(*) > 1',
+                      'SELECT SUM(COUNT(*)) AS n FROM employee AS e',
+                      'SELECT SUM(e.prename) AS n FROM employee AS e'):
+            self.assertRaises(OdhQLExecutionException, lambda: self.execute(query))
+
+    def test_distinct(self):
+        df = self.execute('SELECT DISTINCT e.boss, CASE WHEN e.boss IS NULL THEN 1 ELSE 0 END AS chief '
+                          'FROM employee AS e ORDER BY e.boss')
+        bosses = self.execute('SELECT e.boss FROM employee AS e').boss
+        self.assertEqual(len(df), bosses.nunique() + 1)  # NULL is a value of its own
+        self.assertEqual(df.chief.iloc[-1], 1)
+
+        # LIMIT applies to the distinct rows
+        df = self.execute('SELECT DISTINCT e.boss FROM employee AS e LIMIT 2 OFFSET 1')
+        self.assertListEqual(df.boss.tolist(), bosses.drop_duplicates().tolist()[1:3])
+
+        # geometries are compared by value
+        df = self.execute('SELECT DISTINCT CASE WHEN e.id > 3 THEN ST_GeomFromText(\'POINT(1 1)\') '
+                          'ELSE ST_GeomFromText(\'POINT(2 2)\') END AS g FROM employee AS e')
+        self.assertListEqual([g.wkt for g in df.g], ['POINT (2 2)', 'POINT (1 1)'])
+
+    def test_table_sample(self):
+        all_ids = self.execute('SELECT e.id FROM employee AS e').id.tolist()
+
+        ids = self.execute('SELECT e.id FROM employee AS e TABLESAMPLE (3 ROWS)').id.tolist()
+        self.assertEqual(len(ids), 3)
+        self.assertTrue(set(ids) <= set(all_ids))
+        self.assertListEqual(ids, sorted(ids, key=all_ids.index))  # in the order of the source
+        # deterministic, REPEATABLE selects the sample
+        self.assertListEqual(ids, self.execute('SELECT e.id FROM employee AS e TABLESAMPLE (3 ROWS)').id.tolist())
+        query = 'SELECT e.id FROM employee AS e TABLESAMPLE (3 ROWS) REPEATABLE (5)'
+        self.assertListEqual(self.execute(query).id.tolist(), self.execute(query).id.tolist())
+
+        self.assertEqual(len(self.execute('SELECT e.id FROM employee AS e TABLESAMPLE (50 PERCENT)')), len(all_ids) / 2)
+        self.assertListEqual(self.execute('SELECT e.id FROM employee AS e TABLESAMPLE (100 PERCENT)').id.tolist(),
+                             all_ids)
+        self.assertRaises(OdhQLExecutionException,
+                          lambda: self.execute('SELECT e.id FROM employee AS e TABLESAMPLE (150 PERCENT)'))
+
+        # automatic sampling of large sources, e.g. for previews
+        interpreter = OdhQLInterpreter(self.interpreter.source_dfs, sample_rows=4)
+        self.assertFalse(interpreter.sampled)
+        self.assertEqual(len(interpreter.execute('SELECT e.id FROM employee AS e')), 4)
+        self.assertTrue(interpreter.sampled)
+        df = interpreter.execute('SELECT e.id FROM employee AS e TABLESAMPLE (6 ROWS)')
+        self.assertEqual(len(df), 6)
+
+    def test_execute_chunked(self):
+        query = 'SELECT e.id, UPPER(e.prename) AS prename FROM employee AS e WHERE e.boss IN (0, 1)'
+        chunks = list(self.interpreter.execute_chunked(query, chunk_size=3))
+        self.assertGreater(len(chunks), 1)
+        df = pd.concat(chunks, ignore_index=True)
+        self.assertListEqual(df.columns.tolist(), ['id', 'prename'])
+        self.assertListEqual(df.prename.tolist(), self.execute(query).prename.tolist())
+
+        chunks = list(self.interpreter.execute_chunked(query + ' AND e.id > 100', chunk_size=3))
+        self.assertEqual(len(chunks), 1)
+        self.assertListEqual(chunks[0].columns.tolist(), ['id', 'prename'])
+        self.assertEqual(len(chunks[0]), 0)
+
+        # ORDER BY needs all rows
+        chunks = list(self.interpreter.execute_chunked(query + ' ORDER BY 2', chunk_size=3))
+        self.assertEqual(len(chunks), 1)
+        self.assertListEqual(chunks[0].prename.tolist(), self.execute(query + ' ORDER BY 2').prename.tolist())
+
+    def test_limit(self):
+        df = self.execute('SELECT e.id FROM employee AS e WHERE e.id > 1 LIMIT 3 OFFSET 2')
+        self.assertListEqual(df.id.tolist(), [4, 5, 6])
+
+        query = 'SELECT e.prename, c.age FROM employee AS e JOIN child AS c ON c.parent = e.id ORDER BY c.age DESC'
+        expected = self.execute(query)
+        for limit, offset in ((3, 0), (4, 2), (20, 8), (0, 0)):
+            df = self.execute('{} LIMIT {} OFFSET {}'.format(query, limit, offset))
+            self.assertListEqual(df.prename.tolist(), expected.prename.tolist()[offset:offset + limit])
+
+        df = self.execute('SELECT e.prename FROM employee AS e UNION SELECT c.prename FROM child AS c LIMIT 3 OFFSET 9')
+        self.assertListEqual(df.prename.tolist(),
+                             (self.employees.Prename.tolist() + self.children.Prename.tolist())[9:12])
+
+    def test_execute_window(self):
+        query = 'SELECT e.id FROM employee AS e WHERE e.id > 1 ORDER BY 1 LIMIT 5 OFFSET 1'
+        df, total = self.interpreter.execute_window(query, 2, 10)
+        self.assertListEqual(df.id.tolist(), [5, 6, 7])
+        self.assertEqual(total, 5)
+
+        df, total = self.interpreter.execute_window('SELECT e.id FROM employee AS e UNION '
+                                                    'SELECT c.id FROM child AS c', 0, 2)
+        self.assertListEqual(df.id.tolist(), [0, 1])
+        self.assertEqual(total, 20)
+
     def test_dup_colnames(self):
         df = self.execute('SELECT e.prename, e.prename, e.surname AS prename FROM employee AS e')
         self.assertListEqual(df.columns.tolist(), ['prename', 'prename2', 'prename3'])
@@ -304,7 +680,7 @@ class TestInterpreterPerformance(TestInterpreterBase):
         self.assert_time('SELECT e.prename FROM employee AS e WHERE e.prename = \'Julia\'', self.get_time(2))
 
     def test_like(self):
-        self.assert_time('SELECT e.prename FROM employee AS e WHERE e.prename LIKE \'^E.+a\'', self.get_time(3))
+        self.assert_time('SELECT e.prename FROM employee AS e WHERE e.prename LIKE \'E_%a%\'', self.get_time(3))
 
     def test_join(self):
         self.assert_time('SELECT c.prename, e.prename AS parent FROM child AS c JOIN employee AS e ON c.parent = e.id',
@@ -6,6 +6,7 @@ Tests for OdhQL functions.
 Are compared to python equivalents ("known" to operate correctly) instead of fixed/floored values.
 """
 
+import re
 import traceback
 import logging
 
@@ -13,6 +14,7 @@ import pandas as pd
 
 from hub.tests.tests_interpreter import TestInterpreterBase
 from hub.odhql.exceptions import OdhQLExecutionException
+from hub.odhql.functions.core import VectorizedFunction
 
 logger = logging.getLogger(__name__)
 
@@ -77,6 +79,13 @@ class TestStringFunctions(TestInterpreterBase):
         df = self.execute('SELECT REPLACE(e.prename, \'ann\', \'ANN\', False) as replaced FROM employee AS e')
         self.assertTrue(all(['ANN' in n for n in df.replaced.tolist() if 'ann' in n.lower()]))
 
+        # the replacement is literal unless the pattern is a regular expression
+        df = self.execute('SELECT REPLACE(e.prename, \'a\', \'\\\\1\') AS replaced, '
+                          'REPLACE(e.prename, \'AN\', \'\\\\\', False) AS replaced2 FROM employee AS e')
+        self.assertListEqual(df.replaced.tolist(), [n.replace('a', '\\1') for n in self.employees.Prename.tolist()])
+        self.assertListEqual(df.replaced2.tolist(), [re.sub('(?i)an', lambda m: '\\', n)
+                                                     for n in self.employees.Prename.tolist()])
+
     def test_repeat(self):
         df = self.execute('SELECT REPEAT(e.prename, 4) as repeated FROM employee AS e')
         self.assertListEqual(df.repeated.tolist(), [4 * n for n in self.employees.Prename.tolist()])
@@ -102,6 +111,28 @@ class TestStringFunctions(TestInterpreterBase):
                           'as xpath from employee as e')
         self.assertListEqual(df['surname'].tolist(), df['xpath'].tolist())
 
+    def test_text_null(self):
+        df = self.execute('SELECT UPPER(CASE WHEN e.id < 5 THEN e.prename END) AS upper, '
+                          'LEN(CASE WHEN e.id < 5 THEN e.prename END) AS len, '
+                          'CONCAT(e.prename, CASE WHEN e.id < 5 THEN \'!\' END) AS concat FROM employee AS e')
+        expected = [n if i < 5 else None for i, n in zip(self.employees.Id, self.employees.Prename)]
+        self.assertListEqual(df['upper'].where(df['upper'].notnull(), None).tolist(),
+                             [n and n.upper() for n in expected])
+        self.assertListEqual(df['len'].fillna(-1).tolist(), [len(n) if n else -1 for n in expected])
+        self.assertListEqual(df['concat'].notnull().tolist(), [n is not None for n in expected])
+
+    def test_distinct_values(self):
+        statement = ('SELECT XPATH(CONCAT(\'<name>\', c.surname, \'</name>\'), \'/name/text()\') AS xpath, '
+                     'TO_CHAR(c.age) AS age FROM child AS c')
+        ratio, VectorizedFunction.DISTINCT_RATIO = VectorizedFunction.DISTINCT_RATIO, 1.0
+        try:
+            df = self.execute(statement)
+        finally:
+            VectorizedFunction.DISTINCT_RATIO = ratio
+
+        self.assertListEqual(df['xpath'].tolist(), self.children.Surname.tolist())
+        self.assertListEqual(df['age'].tolist(), [unicode(a) for a in self.children.Age])
+
     def test_fails(self):
         statements = (
             'SELECT CONCAT(1, 2) AS test FROM employee AS e',
@@ -3,7 +3,10 @@ from __future__ import unicode_literals
 
 import types
 
+import pandas as pd
+
 from hub.tests.testutils import TestBase
+import hub.odhql.ast as ast
 import hub.odhql.parser as odhql
 
 
@@ -491,6 +494,20 @@ class TestParser(TestBase):
         self.assertEqual('a', order.field.alias)
         self.assertEqual(odhql.OrderBy.Direction.ascending, order.direction)
 
+    def test_limit(self):
+        p = odhql.OdhQLParser()
+
+        result = p.parse('select a.a from a order by a.a limit 10 offset 20')
+        self.assertIsInstance(result, odhql.Union)
+        self.assertEqual((10, 20), (result.limit, result.offset))
+
+        result = p.parse('select a.a from a union select b.a from b limit 5')
+        self.assertEqual(2, len(result.queries))
+        self.assertEqual((5, 0), (result.limit, result.offset))
+
+        self.assertRaises(Exception, lambda: p.parse('select a.a from a limit'))
+        self.assertRaises(Exception, lambda: p.parse('select a.a from a limit -1'))
+
     def test_union(self):
         p = odhql.OdhQLParser()
 
@@ -508,6 +525,94 @@ class TestParser(TestBase):
         self.assertIsInstance(query, odhql.Query)
         self.assertEqual(1, len(query.fields))
 
+    def test_group_by(self):
+        p = odhql.OdhQLParser()
+
+        result = p.parse('select a.x, count(*) as n, sum(distinct a.y) as s, count(a.x, \'b\') as c '
+                         'from a group by a.x, upper(a.z)')
+        self.assertEqual(2, len(result.group_by))
+        self.assertIsInstance(result.group_by[1], odhql.Function)
+
+        aggregates = [f.expression for f in result.fields[1:]]
+        self.assertEqual(('COUNT', None, False), (aggregates[0].name, aggregates[0].arg, aggregates[0].distinct))
+        self.assertEqual(('SUM', True), (aggregates[1].name, aggregates[1].distinct))
+        self.assertIsInstance(aggregates[1].arg, odhql.Field)
+        # with two arguments, COUNT is the string function
+        self.assertIsInstance(aggregates[2], odhql.Function)
+
+        result = p.parse('select count(a.x) as n from a group by a.y')
+        self.assertEqual('a', result.data_sources[0].alias)
+
+        self.assertRaises(Exception, lambda: p.parse('select sum(*) as s from a'))
+        self.assertRaises(Exception, lambda: p.parse('select a.x from a group by'))
+
+    def test_distinct(self):
+        p = odhql.OdhQLParser()
+
+        result = p.parse('select distinct a.x, a.y from a')
+        self.assertTrue(result.distinct)
+        self.assertEqual(2, len(result.fields))
+        self.assertFalse(p.parse('select a.x from a').distinct)
+
+        self.assertRaises(Exception, lambda: p.parse('select distinct from a'))
+
+    def test_table_sample(self):
+        p = odhql.OdhQLParser()
+
+        result = p.parse('select a.x from a tablesample (10 rows) join b as c tablesample (2.5 percent) repeatable (7) '
+                         'on a.x = c.x')
+        sample = result.data_sources[0].sample
+        self.assertEqual((10, odhql.TableSample.Unit.rows, None), (sample.size, sample.unit, sample.seed))
+        sample = result.data_sources[1].sample
+        self.assertEqual('c', result.data_sources[1].alias)
+        self.assertEqual((2.5, odhql.TableSample.Unit.percent, 7), (sample.size, sample.unit, sample.seed))
+
+        self.assertIsNone(p.parse('select a.x from a').data_sources[0].sample)
+        self.assertRaises(Exception, lambda: p.parse('select a.x from a tablesample (10)'))
+
+    def test_keys(self):
+        p = odhql.OdhQLParser()
+        query = ('select a.x, upper(a.y) as y, case when a.z in (1, 2) then \'a\' else null end as z, count(*) as n '
+                 'from a tablesample (10 rows) left join b on (a.x = b.x and a.y = b.y) '
+                 'where a.x is not null and (a.y like \'%a\' or not contains(a.y, \'b\')) group by a.x, a.y, a.z '
+                 'union select b.x, b.y, b.z, 1 as n from b order by 1, y desc, a.x limit 5')
+
+        def walk(node):
+            yield node
+            children = node if isinstance(node, list) else vars(node).values()
+            for child in children:
+                if isinstance(child, (ast.ASTBase, list)):
+                    for n in walk(child):
+                        yield n
+
+        nodes = [n for n in walk(p.parse(query)) if isinstance(n, ast.ASTBase)]
+        self.assertGreater(len({n.__class__ for n in nodes}), 15)
+        for node in nodes:
+            hash(node.key())
+
+        # equal sub-trees have equal keys
+        result = p.parse('select upper(a.y) as y1, upper(a.y) as y2 from a')
+        self.assertEqual(result.fields[0].key(), result.fields[1].key())
+
+        # values which can not be hashed are only equal to themselves
+        literal = odhql.LiteralExpression(pd.Series([1, 2]))
+        hash(literal.key())
+        self.assertNotEqual(literal.key(), odhql.LiteralExpression(pd.Series([1, 2])).key())
+
+    def test_explain(self):
+        p = odhql.OdhQLParser()
+
+        result = p.parse('explain select a.a from a')
+        self.assertIsInstance(result, odhql.Explain)
+        self.assertIsInstance(result.statement, odhql.Query)
+        self.assertFalse(result.analyze)
+
+        result = p.parse('EXPLAIN ANALYZE select a.a from a union select b.a from b order by 1')
+        self.assertIsInstance(result.statement, odhql.Union)
+        self.assertTrue(result.analyze)
+
+        self.assertRaises(Exception, lambda: p.parse('analyze select a.a from a'))
+
     def test_comments(self):
         p = odhql.OdhQLParser()
 
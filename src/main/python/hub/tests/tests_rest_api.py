@@ -68,3 +68,45 @@ class RestApiTests(TestBase):
         self.assertEqual(self.data['name'], result_json['name'])
         self.assertIn('description', result_json)
         self.assertEqual(self.data['description'], result_json['description'])
+
+
+class OdhQLValidationTests(TestBase):
+    def setUp(self):
+        self.user = self.get_test_user()
+
+        self.client = APIClient()
+        self.client.login(username=self.username, password=self.password)
+
+    def parse(self, query):
+        response = self.client.post('/api/v1/parse/', {'params': {'query': query}}, format='json')
+        return response.status_code, json.loads(response.content)
+
+    def create_transformation(self, query):
+        return self.client.post('/api/v1/transformation/', {'name': 'Validation test', 'description': 'test',
+                                                            'transformation': query}, format='json')
+
+    def test_parse_grouping_error(self):
+        status, result = self.parse('SELECT e.prename, COUNT(*) AS n FROM employee AS e GROUP BY e.boss')
+        self.assertEqual(400, status)
+        self.assertEqual('execution', result['type'])
+
+        status, result = self.parse('SELECT e.boss, COUNT(*) AS n FROM employee AS e GROUP BY e.boss')
+        self.assertEqual(200, status)
+        self.assertEqual([{'name': 'employee', 'alias': 'e'}], result['tables'])
+
+    def test_create_transformation_grouping_error(self):
+        response = self.create_transformation('SELECT t.name, COUNT(*) AS n FROM ODH1 AS t GROUP BY t.id')
+        self.assertEqual(400, response.status_code)
+
+    def test_table_sample_out_of_range(self):
+        status, result = self.parse('SELECT e.id FROM employee AS e TABLESAMPLE (150 PERCENT)')
+        self.assertEqual(400, status)
+        self.assertEqual('execution', result['type'])
+
+        response = self.create_transformation('SELECT t.id FROM ODH1 AS t TABLESAMPLE (150 PERCENT)')
+        self.assertEqual(400, response.status_code)
+
+    def test_adhoc_invalid_sample_size(self):
+        response = self.client.post('/api/v1/transformation/adhoc/',
+                                    {'params': {'query': 'SELECT t.id FROM ODH1 AS t', 'sample': 'abc'}}, format='json')
+        self.assertEqual(400, response.status_code)
@@ -4,8 +4,11 @@
 
 from __future__ import unicode_literals
 
-import itertools
+import collections
 import logging
+import Queue
+import sys
+from multiprocessing.pool import ThreadPool
 
 from django.db.models import Q
 from django.utils.text import slugify
@@ -29,31 +32,74 @@ class TransformationUtil(object):
         :param user_id: Optional user id to check for. Note: If None, only public data source are available.
         :return: Resulting data frame.
         """
+        interpreter, query = TransformationUtil._prepare(query, user_id)
+        return interpreter.execute(query)
+
+    @staticmethod
+    def interpret_window(query, start, count, user_id=None, sample_rows=None):
+        """
+        Like interpret, but only the requested rows of the result are evaluated (see OdhQLInterpreter.execute_window).
+        :param query: The query to run.
+        :param start: Index of the first row.
+        :param count: Number of rows.
+        :param user_id: Optional user id to check for. Note: If None, only public data source are available.
+        :param sample_rows: Optional number of rows, larger data sources are sampled (e.g. for fast previews).
+        :return: Data frame with the requested rows, the number of rows of the complete result and whether it is based
+                 on sampled data sources.
+        """
+        interpreter, query = TransformationUtil._prepare(query, user_id, sample_rows)
+        df, total = interpreter.execute_window(query, start, count)
+        return df, total, interpreter.sampled
+
+    @staticmethod
+    def explain(query, user_id=None):
+        """
+        Reports the steps of a query (see OdhQLInterpreter.explain). The query is only executed for EXPLAIN ANALYZE.
+        :param query: The query to explain, usually starting with EXPLAIN (ANALYZE).
+        :param user_id: Optional user id to check for. Note: If None, only public data source are available.
+        :return: Root of the tree of steps (hub.odhql.explain.ExplainNode).
+        """
+        interpreter, query = TransformationUtil._prepare(query, user_id)
+        return interpreter.explain(query)
+
+    @staticmethod
+    def _prepare(query, user_id=None, sample_rows=None):
+        """
+        Fetches the data sources required by the query and checks permissions.
+        :param sample_rows: Optional number of rows, larger data sources are sampled (see OdhQLInterpreter).
+        :return: Interpreter for the query and the compiled query.
+        """
+        query = OdhQLInterpreter.compile(query)
         file_group_ids, transformation_ids = OdhQLInterpreter.parse_sources(query)
 
+        sources = TransformationUtil.file_group_sources(file_group_ids, user_id)
+        dfs = TransformationGraph(transformation_ids.values()).evaluate()
+        sources.update({name: dfs[id] for name, id in transformation_ids.iteritems()})
+
+        return OdhQLInterpreter(sources, sample_rows), query
+
+    @staticmethod
+    def file_group_sources(file_group_ids, user_id=None):
+        """
+        Fetches the data frames of file groups, checking permissions.
+        :param file_group_ids: Ids of the file groups by name used in the query (see OdhQLInterpreter.parse_sources)
+        :param user_id: Optional user id to check for. Note: If None, only public data source are available.
+        :return: Data frames by name, file groups which are not available are missing
+        :rtype: dict
+        """
         permission_filter = (Q(document__private=False) | Q(document__owner=user_id)
                              if user_id else Q(document__private=False))
         fgs = FileGroupModel.objects.filter(Q(id__in=file_group_ids.values()) & permission_filter)
 
         file_group_pairs = [(fg.id, df) for fg in fgs for df in fg.to_file_group().to_df()]
-        transformation_pairs = [(id, TransformationUtil.df_for_transformation(id)) for id in
-                                transformation_ids.values()]
 
         sources = {'odh{}_{}'.format(id, df.name.lower()): df for id, df in file_group_pairs}
 
         # allows for lookup without name -> ODH5 (takes the first df if more than one is present)
         sources.update({'odh{}'.format(id): df for id, df in reversed(file_group_pairs)})
 
-        sources.update({'trf{}'.format(id): df for id, df in reversed(transformation_pairs)})
-
         # limit sources to ones actually referenced in the query
-        sources = {name: sources[name]
-                   for name in itertools.chain(file_group_ids.keys(), transformation_ids.keys())
-                   if name in sources}
-
-        df = OdhQLInterpreter(sources).execute(query)
-
-        return df
+        return {name: sources[name] for name in file_group_ids if name in sources}
 
     @staticmethod
     def df_for_transformation(tf, user_id=None):
@@ -64,31 +110,27 @@ class TransformationUtil(object):
         :return: Resulting data frame.
         """
         if isinstance(tf, TransformationModel):
-            id = tf.id
-            model = tf
-        else:
-            id = tf
-            model = None
-
-        cache_key = ('TRF', id)
-        df = cache.get(cache_key)
-
-        if df is None:
-            if model is None:
-                model = TransformationModel.objects.get(id=id)
-                if model.private and (not user_id or model.owner.id != user_id):
-                    raise OdhQLExecutionException('Fehlende Berechtigung')
-            df = TransformationUtil.interpret(model.transformation, user_id=user_id)
-            df.name = slugify(unicode(model.name))
-
-            timeout = TransformationUtil.get_cache_timeout(id)
-            params = {}
-            if timeout:
-                params['timeout'] = timeout
-
-            cache.set(cache_key, df, **params)
+            return TransformationGraph([tf.id], user_id, models={tf.id: tf}).evaluate()[tf.id]
+        return TransformationGraph([tf], user_id).evaluate()[tf]
 
-        return df
+    @staticmethod
+    def window_for_transformation(tf, start, count, user_id=None):
+        """
+        Like df_for_transformation, but only the requested rows are evaluated (see interpret_window), unless the
+        transformation is cached already. The result is not cached, as it is incomplete.
+        :param tf: Transformation model instance.
+        :param start: Index of the first row.
+        :param count: Number of rows.
+        :param user_id: Optional user id to check for. Note: If None, only public data sources are available.
+        :return: Data frame with the requested rows and the number of rows of the complete result.
+        """
+        df = cache.get(('TRF', tf.id))
+        if df is not None:
+            return df.iloc[start:start + count].reset_index(drop=True), len(df)
+
+        df, total, _ = TransformationUtil.interpret_window(tf.transformation, start, count, user_id=user_id)
+        df.name = slugify(unicode(tf.name))
+        return df, total
 
     @staticmethod
     def invalidate_related_cache(file_groups=set(), transformations=set()):
@@ -173,3 +215,142 @@ class TransformationUtil(object):
                 logging.error('Failed to read related transformations from database - raw query may be written for '
                               'different database')
         return None
+
+
+class TransformationGraph(object):
+    """
+    Dependencies between the transformations required by a request. The graph is built up front, then independent
+    transformations are interpreted concurrently. Each transformation is computed at most once, its result is shared
+    by all transformations using it. Only the interpretation runs on other threads, the database is accessed by the
+    calling thread only.
+    """
+
+    # max. number of transformations interpreted at once
+    WORKERS = 4
+
+    # transformation which is not cached, i.e. needs to be interpreted
+    Node = collections.namedtuple('Node', ('model', 'query', 'sources', 'transformation_ids', 'dependencies',
+                                           'timeout'))
+
+    def __init__(self, ids, user_id=None, models=None):
+        """
+        :param ids: Ids of the transformations to compute
+        :param user_id: Optional user id to check for. Note: The transformations used by these are only available if
+                        public.
+        :param models: Already loaded transformations by id, no permissions are checked for these
+        :type models: dict
+        """
+        self.results = {}  # data frames by id, cached or computed
+        self.nodes = {}
+        self._build(ids, user_id, models or {})
+
+    def _build(self, ids, user_id, models):
+        """
+        Loads the transformations level by level, starting from ids. Cached transformations are leaves, the
+        transformations they use are not needed.
+        """
+        while ids:
+            pending = []
+            for id in ids:
+                if id in self.results or id in self.nodes or id in pending:
+                    continue
+                df = cache.get(('TRF', id))
+                if df is None:
+                    pending.append(id)
+                else:
+                    self.results[id] = df
+
+            loaded = {}
+            if set(pending) - set(models):
+                query_set = TransformationModel.objects.filter(id__in=[id for id in pending if id not in models])
+                loaded = {model.id: model for model in query_set}
+
+            ids = []
+            for id in pending:
+                model = models.get(id)
+                if model is None:
+                    if id not in loaded:
+                        raise TransformationModel.DoesNotExist('Transformation {} does not exist'.format(id))
+                    model = loaded[id]
+                    if model.private and (not user_id or model.owner.id != user_id):
+                        raise OdhQLExecutionException('Fehlende Berechtigung')
+
+                query = OdhQLInterpreter.compile(model.transformation)
+                file_group_ids, transformation_ids = OdhQLInterpreter.parse_sources(query)
+                # taken from the query, the stored relations (referenced_transformations) may be outdated
+                dependencies = set(transformation_ids.values())
+                sources = TransformationUtil.file_group_sources(file_group_ids, user_id)
+                self.nodes[id] = self.Node(model, query, sources, transformation_ids, dependencies,
+                                           TransformationUtil.get_cache_timeout(id))
+                ids.extend(dependencies)
+
+            user_id = None
+            models = {}
+
+    def evaluate(self):
+        """
+        Interprets the transformations which are not cached. A transformation is started as soon as the ones it uses
+        are available.
+        :return: Data frames by transformation id
+        :rtype: dict
+        """
+        remaining = dict(self.nodes)
+        if len(remaining) == 1 and all(d in self.results for d in remaining.values()[0].dependencies):
+            # nothing to do concurrently
+            id = remaining.keys()[0]
+            self._store(id, self.nodes[id], self._interpret(self.nodes[id]))
+            return self.results
+
+        done = Queue.Queue()
+        running = 0
+        pool = None
+        try:
+            while remaining or running:
+                ready = [key for key, node in remaining.iteritems() if node.dependencies <= set(self.results)]
+                if not ready and not running:
+                    raise OdhQLExecutionException('Zyklische Abhängigkeit zwischen Transformationen ({})'.format(
+                        ', '.join('TRF{}'.format(id) for id in sorted(remaining))))
+
+                for id in ready:
+                    pool = pool or ThreadPool(min(self.WORKERS, len(self.nodes)))
+                    pool.apply_async(self._run, (id, remaining.pop(id), done))
+                    running += 1
+
+                id, df, exc_info = done.get()
+                running -= 1
+                if exc_info is not None:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                self._store(id, self.nodes[id], df)
+        except:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            raise
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+        return self.results
+
+    def _run(self, id, node, done):
+        """
+        Interprets a transformation on a worker thread, the result or the error (sys.exc_info()) is put into the queue
+        done.
+        """
+        try:
+            done.put((id, self._interpret(node), None))
+        except Exception:
+            done.put((id, None, sys.exc_info()))
+
+    def _interpret(self, node):
+        sources = dict(node.sources)
+        sources.update({name: self.results[id] for name, id in node.transformation_ids.iteritems()})
+
+        df = OdhQLInterpreter(sources).execute(node.query)
+        df.name = slugify(unicode(node.model.name))
+        return df
+
+    def _store(self, id, node, df):
+        self.results[id] = df
+        params = {'timeout': node.timeout} if node.timeout else {}
+        cache.set(('TRF', id), df, **params)
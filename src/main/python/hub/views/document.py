@@ -92,7 +92,7 @@ class DocumentViewSet(viewsets.ModelViewSet, FilterablePackageListViewSet, Previ
         Gets the data frames for preview.
         :param pk: id of the object.
         :param request: django request
-        :return: dataframes for the object.
+        :return: requested rows of the dataframes for the object (see PreviewMixin.get_preview).
         """
         file_groups = FileGroupModel.objects.filter(
             Q(document__id=pk) & (Q(document__private=False) | Q(document__owner=request.user.id)))
@@ -107,4 +107,4 @@ class DocumentViewSet(viewsets.ModelViewSet, FilterablePackageListViewSet, Previ
             name = unquote(name)
             dfs = [(unique_name, df) for (unique_name, df) in dfs if unique_name == name]
 
-        return dfs
+        return [self.get_preview(request, unique_name, df) for unique_name, df in dfs]
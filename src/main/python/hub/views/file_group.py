@@ -83,4 +83,4 @@ class FileGroupViewSet(viewsets.ModelViewSet, DataDownloadMixin, PreviewMixin):
             name = unquote(name)
             dfs = [(unique_name, df) for (unique_name, df) in dfs if unique_name == name]
 
-        return dfs
+        return [self.get_preview(request, unique_name, df) for unique_name, df in dfs]
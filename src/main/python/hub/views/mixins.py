@@ -204,24 +204,42 @@ class PreviewMixin(viewsets.GenericViewSet):
         :type name: name for the preview
         :return: Response containing the previews.
         """
-        count = int(request.GET.get('count', 3))
-        page = int(request.GET.get('page', 1))
-        start = count * (page - 1)
-
         data = []
-        for (unique_name, df) in self.get_dfs_for_preview(pk, request):
-            slice_ = df.iloc[start:start + count].reset_index(drop=True).as_safe_serializable().fillna('NULL')
+        for unique_name, df, total, sampled in self.get_dfs_for_preview(pk, request):
+            slice_ = df.reset_index(drop=True).as_safe_serializable().fillna('NULL')
             data.extend([{'name': getattr(df, 'name', None),
                           'unique_name': unique_name,
                           'columns': slice_.columns.tolist(),
                           'types': {c: s.odh_type.name for c, s in df.iteritems()},
                           'data': slice_.to_dict(orient='records'),
-                          'count': len(df),
+                          'count': total,
+                          'sampled': sampled,
                           'parent': pk,
                           'url': self.get_preview_view(pk, request),
                           'type': 'preview'}])
         return JsonResponse(data, encoder=json.JSONEncoder, safe=False)
 
+    def get_preview_window(self, request):
+        """
+        Get the rows requested for the preview (page).
+        :param request: django request
+        :return: index of the first row and number of rows
+        """
+        count = int(request.GET.get('count', 3))
+        page = int(request.GET.get('page', 1))
+        return count * (page - 1), count
+
+    def get_preview(self, request, unique_name, df):
+        """
+        Reduces a complete data frame to the rows requested for the preview.
+        :param request: django request
+        :param unique_name: unique name of the data frame
+        :param df: data frame
+        :return: (unique name, requested rows, total number of rows, False as the data frame is not sampled)
+        """
+        start, count = self.get_preview_window(request)
+        return unique_name, df.iloc[start:start + count].reset_index(drop=True), len(df), False
+
     def get_preview_view(self, pk, request):
         """
         Get a view (url) for the specified object.
@@ -237,6 +255,7 @@ class PreviewMixin(viewsets.GenericViewSet):
         Get the data frames for the specified objects.
         :param pk: object id
         :param request: django request
-        :return: data frames for the object.
+        :return: (unique name, data frame, total number of rows, whether the result is based on sampled data) for
+                 the object, the data frame only contains the rows requested by get_preview_window (see get_preview).
         """
         return []
@@ -4,7 +4,6 @@ from __future__ import unicode_literals
 import json
 import inspect
 import logging
-import itertools
 
 from django.utils.datastructures import MultiValueDictKeyError
 from django.views.generic import View
@@ -15,8 +14,9 @@ import docutils.core
 
 from django.views.decorators.cache import cache_page
 
-from hub.odhql import parser
 from hub.odhql.parser import OdhQLParser
+from hub.odhql.interpreter import OdhQLInterpreter
+from hub.odhql.exceptions import OdhQLExecutionException
 from hub.odhql.functions.core import OdhQLFunction
 
 logger = logging.getLogger(__name__)
@@ -31,11 +31,10 @@ class ParseView(View):
             statement = params['query']
             logger.debug('Validating ODHQL query "%s"', statement)
 
-            query = OdhQLParser().parse(statement)
-            query = itertools.chain(*[q.data_sources for q in query.queries]) if \
-                isinstance(query, parser.Union) else query.data_sources
+            # compiling (instead of just parsing) caches the plan for the execution which usually follows
+            query = OdhQLInterpreter.compile(statement)
 
-            data_sources = {'tables': [{'name': table.name, 'alias': table.alias} for table in query]}
+            data_sources = {'tables': [{'name': table.name, 'alias': table.alias} for table in query.data_sources]}
         except ParseException as e:
             return JsonResponse({'error': e.message,
                                  'type': 'parse',
@@ -43,6 +42,11 @@ class ParseView(View):
                                  'lineno': e.lineno,
                                  'col': e.col},
                                 status=HttpResponseBadRequest.status_code)
+        except OdhQLExecutionException as e:
+            # semantic errors detected when planning, e.g. ungrouped fields
+            return JsonResponse({'error': e.message,
+                                 'type': 'execution'},
+                                status=HttpResponseBadRequest.status_code)
         except MultiValueDictKeyError:
             return JsonResponse({'error': 'Es wurde keine ODHQL Abfrage angegeben.',
                                  'type': 'execution'},
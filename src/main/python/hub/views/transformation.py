@@ -63,10 +63,17 @@ class TransformationViewSet(viewsets.ModelViewSet, FilterablePackageListViewSet,
     def _check_template(self, statement):
         try:
             file_group_ids, transformation_ids = OdhQLInterpreter.parse_sources(statement)
-            return False, file_group_ids, transformation_ids
         except OdhQLExecutionException:
+            # data sources which are no OpenDataHub sources (placeholders)
             return True, [], []
 
+        try:
+            # semantic checks, e.g. of GROUP BY
+            OdhQLInterpreter.compile(statement)
+        except OdhQLExecutionException as e:
+            raise ValidationError(e.message)
+        return False, file_group_ids, transformation_ids
+
     def _update_references(self, transformation, file_group_ids, transformation_ids):
         transformation.referenced_file_groups.add(*FileGroupModel.objects.filter(id__in=file_group_ids.values()))
         transformation.referenced_transformations.add(
@@ -139,19 +146,46 @@ class TransformationViewSet(viewsets.ModelViewSet, FilterablePackageListViewSet,
             return reverse('transformationmodel-adhoc', request=request)
 
     def get_dfs_for_preview(self, pk, request):
+        start, count = self.get_preview_window(request)
         if pk is not None:
-            return [('{}{}'.format(settings.TRANSFORMATION_PREFIX, pk),
-                     TransformationUtil.df_for_transformation(self.get_object(), user_id=request.user.id))]
+            df, total = TransformationUtil.window_for_transformation(self.get_object(), start, count,
+                                                                     user_id=request.user.id)
+            return [('{}{}'.format(settings.TRANSFORMATION_PREFIX, pk), df, total, False)]
         else:
             body = json.loads(request.body, encoding=request.encoding)
             params = body['params']
 
             statement = params['query']
-            return [(None, TransformationUtil.interpret(statement, user_id=request.user.id))]
+            df, total, sampled = TransformationUtil.interpret_window(statement, start, count, user_id=request.user.id,
+                                                                     sample_rows=self.get_preview_sample_rows(params))
+            return [(None, df, total, sampled)]
+
+    def get_preview_sample_rows(self, params):
+        """
+        Ad-hoc previews may opt in to sampling large data sources, so that they stay fast regardless of the size of the
+        sources: params.sample is either true (default sample size) or the number of rows. The count of a sampled
+        preview is the number of rows of the sampled result, the preview is marked as sampled.
+        :return: Number of rows of the samples or None
+        """
+        sample = params.get('sample')
+        if not sample:
+            return None
+        if sample is True:
+            return OdhQLInterpreter.PREVIEW_SAMPLE_ROWS
+        try:
+            return max(int(sample), 1)
+        except (TypeError, ValueError):
+            raise ValidationError('Invalid sample size: {}'.format(sample))
 
     @list_route(methods={'post'}, permission_classes=[])
     def adhoc(self, request):
         try:
+            body = json.loads(request.body, encoding=request.encoding)
+            statement = body['params']['query']
+            if OdhQLInterpreter.compile(statement).explain:
+                # EXPLAIN (ANALYZE): the steps of the query instead of a preview of its result
+                report = TransformationUtil.explain(statement, user_id=request.user.id)
+                return JsonResponse({'type': 'explain', 'plan': report.to_dict(), 'text': report.format()})
             return self.preview(request)
         except OdhQLExecutionException as e:
             return JsonResponse({'error': e.message, 'type': 'execution'}, status=HttpResponseBadRequest.status_code)
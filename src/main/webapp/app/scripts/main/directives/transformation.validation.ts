@@ -24,7 +24,8 @@ module odh.main {
                 var def = this.$q.defer();
                 this.TransformationService.parse(viewValue).then((res) => {
                     scope.errorMessage = undefined;
-                    this.TransformationService.preview(viewValue).then(res => {
+                    // sampled: the preview is executed on every change
+                    this.TransformationService.preview(viewValue, null, true).then(res => {
                         scope.previewObject = res;
                     }).catch(res => {
                         scope.previewObject = {msg: 'Vorschau nicht verfügbar.', error: res};
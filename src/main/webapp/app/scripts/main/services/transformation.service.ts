@@ -119,7 +119,7 @@ module odh.main {
             return this.Restangular.oneUrl('transformation', '').get(params);
         }
 
-        public preview(transformation:any, params = null) {
+        public preview(transformation:any, params = null, sample = false) {
             var deferred = this.$q.defer();
             if (typeof transformation === 'object') {
                 if (transformation.type === 'transformation') {
@@ -133,8 +133,8 @@ module odh.main {
             if (typeof transformation === 'string') {
                 this.$http.post(this.UrlService.get('transformation/adhoc'), {
                     params: {
-                        query: transformation
-
+                        query: transformation,
+                        sample: sample
                     }
                 }, {params: params}).then(data => {
                     deferred.resolve(data.data[0]);